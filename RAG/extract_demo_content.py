@@ -1,15 +1,10 @@
-import requests
-from bs4 import BeautifulSoup
 import json
 
 def extract_demo_content():
     """Extract demo content for the AI consulting company"""
-    
-    url = "https://boralio.ai"
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, 'html.parser')
-    
-    # Manual content structure (since it's a simple landing page)
+
+    # Manual content structure (since it's a simple landing page);
+    # use crawler.py to extract real sites
     content_chunks = [
         {
             "title": "Boralio Overview",
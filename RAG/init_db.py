@@ -5,12 +5,21 @@ Usage: python init_db.py
 """
 
 import os
+import sys
 import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from dotenv import load_dotenv
 
+# Load .env before the project modules, which read their settings at import time
 load_dotenv()
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from index_settings import build_vector_index, current_column_type, embedding_column_type, match_function_sql
+from session_store import CREATE_SESSIONS_TABLE_SQL
+from notification_worker import CREATE_OUTBOX_TABLE_SQL
+from kb_sync import ADD_SYNC_COLUMNS_SQL
+
+
 def init_database():
     """Initialize database with pgvector extension and create tables"""
 
@@ -40,40 +49,71 @@ def init_database():
         print()
 
         # Create company_faq table with vector column
+        # (EMBEDDING_STORAGE / EMBEDDING_DIMENSIONS, vector(1536) by default)
         print("📋 Creating company_faq table...")
-        cur.execute("""
+        cur.execute(f"""
             CREATE TABLE IF NOT EXISTS company_faq (
                 id SERIAL PRIMARY KEY,
                 title TEXT NOT NULL,
                 content TEXT NOT NULL,
                 excerpt TEXT,
                 url TEXT,
-                embedding vector(1536),  -- OpenAI text-embedding-3-small dimensions
+                embedding {embedding_column_type()},
                 metadata JSONB,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
         """)
-        print("✅ company_faq table created")
+        column_type = current_column_type(cur)
+        print(f"✅ company_faq table created (embedding {column_type})")
+        if column_type != embedding_column_type():
+            print(f"⚠️  EMBEDDING_STORAGE/EMBEDDING_DIMENSIONS ask for {embedding_column_type()}; "
+                  f"run python RAG/migrate_embeddings.py to convert the existing column")
         print()
 
-        # Create index for vector similarity search
-        print("🔍 Creating vector similarity index...")
+        # Full-text search column for hybrid (keyword + vector) retrieval
+        print("🔤 Adding full-text search column...")
         cur.execute("""
-            CREATE INDEX IF NOT EXISTS company_faq_embedding_idx
+            ALTER TABLE company_faq
+            ADD COLUMN IF NOT EXISTS search_tsv tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(content, '')), 'B')
+            ) STORED;
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS company_faq_search_tsv_idx
             ON company_faq
-            USING ivfflat (embedding vector_cosine_ops)
-            WITH (lists = 100);
+            USING gin (search_tsv);
         """)
-        print("✅ Vector index created")
+        print("✅ Full-text search column and GIN index created")
         print()
 
-        # Create similarity search function
+        # Chunk key + content hash let upload_to_db.py sync incrementally
+        print("🔑 Adding chunk key and content hash columns...")
+        cur.execute(ADD_SYNC_COLUMNS_SQL)
+        print("✅ chunk_key, content_hash and updated_at columns created")
+        print()
+
+        # Create index for vector similarity search, sized from the current row count
+        # (exact scan for small tables; upload_to_db.py rebuilds it after loading)
+        print("🔍 Creating vector similarity index...")
+        settings = build_vector_index(cur)
+        print(f"✅ Vector index settings: {settings}")
+        print()
+
+        # Create similarity search function for the column type actually in place
+        # (an existing table keeps its type; see RAG/migrate_embeddings.py to change it)
         print("⚙️  Creating similarity search function...")
+        cur.execute(match_function_sql(column_type))
+        print("✅ Similarity search function created")
+        print()
+
+        # Create full-text search function (keyword half of hybrid retrieval)
+        print("⚙️  Creating full-text search function...")
         cur.execute("""
-            CREATE OR REPLACE FUNCTION match_company_faq(
-                query_embedding vector(1536),
-                match_threshold float DEFAULT 0.5,
-                match_count int DEFAULT 3
+            CREATE OR REPLACE FUNCTION search_company_faq_text(
+                query_text text,
+                match_count int DEFAULT 10
             )
             RETURNS TABLE (
                 id int,
@@ -82,12 +122,18 @@ def init_database():
                 excerpt text,
                 url text,
                 metadata jsonb,
-                similarity float
+                lexical_rank float,
+                matches_all boolean
             )
-            LANGUAGE plpgsql
+            LANGUAGE sql STABLE
             AS $$
-            BEGIN
-                RETURN QUERY
+                -- Rank on ANY query term so partial keyword matches still count;
+                -- matches_all tells the caller whether every term was found
+                WITH q AS (
+                    SELECT
+                        plainto_tsquery('english', query_text) AS all_terms,
+                        NULLIF(replace(plainto_tsquery('english', query_text)::text, ' & ', ' | '), '')::tsquery AS any_terms
+                )
                 SELECT
                     company_faq.id,
                     company_faq.title,
@@ -95,15 +141,15 @@ def init_database():
                     company_faq.excerpt,
                     company_faq.url,
                     company_faq.metadata,
-                    1 - (company_faq.embedding <=> query_embedding) as similarity
-                FROM company_faq
-                WHERE 1 - (company_faq.embedding <=> query_embedding) > match_threshold
-                ORDER BY company_faq.embedding <=> query_embedding
+                    ts_rank_cd(company_faq.search_tsv, q.any_terms, 32)::float AS lexical_rank,
+                    company_faq.search_tsv @@ q.all_terms AS matches_all
+                FROM company_faq, q
+                WHERE company_faq.search_tsv @@ q.any_terms
+                ORDER BY lexical_rank DESC
                 LIMIT match_count;
-            END;
             $$;
         """)
-        print("✅ Similarity search function created")
+        print("✅ Full-text search function created")
         print()
 
         # Create leads table for tracking qualified leads
@@ -131,6 +177,35 @@ def init_database():
         print("✅ leads table created")
         print()
 
+        # Notification emails are queued with the lead insert and sent by notification_worker.py
+        print("📬 Creating lead_notifications outbox table...")
+        cur.execute(CREATE_OUTBOX_TABLE_SQL)
+        print("✅ lead_notifications table created")
+        print()
+
+        # Transcripts are appended here message by message instead of rewriting
+        # leads.conversation_history (kept only for rows saved by older versions)
+        print("🗒️  Creating conversation_messages table...")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS conversation_messages (
+                id BIGSERIAL PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                seq INT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (session_id, seq)
+            );
+        """)
+        print("✅ conversation_messages table created")
+        print()
+
+        # Conversation state shared by all API workers (SESSION_BACKEND=postgres)
+        print("💬 Creating chat_sessions table...")
+        cur.execute(CREATE_SESSIONS_TABLE_SQL)
+        print("✅ chat_sessions table created")
+        print()
+
         # Check if there's data
         cur.execute("SELECT COUNT(*) FROM company_faq;")
         count = cur.fetchone()[0]
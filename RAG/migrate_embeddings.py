@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Convert company_faq.embedding to another storage mode (dimensions and/or halfvec)
+Usage: python migrate_embeddings.py [--storage halfvec] [--dimensions 512] [--reembed] [--dry-run]
+Defaults come from EMBEDDING_STORAGE / EMBEDDING_DIMENSIONS; set the same values for the API afterwards.
+"""
+
+import os
+import re
+import sys
+import argparse
+import psycopg2
+from dotenv import load_dotenv
+
+# Load .env before the project modules, which read their settings at import time
+load_dotenv()
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from embedding_cache import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL
+from index_settings import (
+    EMBEDDING_STORAGE,
+    INDEX_NAME,
+    build_vector_index,
+    current_column_type,
+    embedding_column_type,
+    match_function_sql,
+)
+
+SIZE_SQL = "SELECT pg_size_pretty(pg_total_relation_size('company_faq'));"
+PGVECTOR_VERSION_SQL = "SELECT extversion FROM pg_extension WHERE extname = 'vector';"
+
+
+def column_dimensions(column_type):
+    return int(re.search(r"\((\d+)\)", column_type).group(1))
+
+
+def conversion_expression(current, target, reembed=False):
+    """USING expression for ALTER COLUMN ... TYPE target, or None when rows must be re-embedded.
+
+    text-embedding-3 vectors can be shortened by keeping the first dimensions and
+    re-normalizing (the same result the API returns for a smaller dimensions value),
+    so reductions and float32 <-> float16 changes happen in place.
+    """
+    current_dimensions = column_dimensions(current)
+    target_dimensions = column_dimensions(target)
+    if reembed or target_dimensions > current_dimensions:
+        return None
+    if target_dimensions < current_dimensions:
+        return f"l2_normalize(subvector(embedding::vector, 1, {target_dimensions}))::{target}"
+    return f"embedding::{target}"
+
+
+def migrate(storage=None, dimensions=None, reembed=False, dry_run=False):
+    """Change the embedding column type, then recreate match_company_faq and the vector index"""
+    database_url = os.getenv("BATCH_DB_URL") or os.getenv("DATABASE_URL")
+    if not database_url:
+        print("❌ BATCH_DB_URL or DATABASE_URL not found in environment variables")
+        return
+
+    target = embedding_column_type(storage, dimensions)
+    conn = psycopg2.connect(database_url)
+    cur = conn.cursor()
+    try:
+        current = current_column_type(cur)
+        if current == target and not reembed:
+            print(f"✅ company_faq.embedding is already {target}, nothing to do")
+            return
+
+        expression = conversion_expression(current, target, reembed)
+        if expression and column_dimensions(target) < column_dimensions(current) and \
+                not EMBEDDING_MODEL.startswith("text-embedding-3"):
+            print(f"⚠️  {EMBEDDING_MODEL} vectors cannot be shortened in place, re-embedding instead")
+            expression = None
+
+        cur.execute(PGVECTOR_VERSION_SQL)
+        version = tuple(int(part) for part in re.findall(r"\d+", cur.fetchone()[0])[:2])
+        if version < (0, 7) and ("halfvec" in target or "subvector" in (expression or "")):
+            print("❌ halfvec, subvector and l2_normalize need pgvector 0.7+ (ALTER EXTENSION vector UPDATE;)")
+            return
+
+        cur.execute(SIZE_SQL)
+        size_before = cur.fetchone()[0]
+        print(f"🔄 company_faq.embedding: {current} -> {target} "
+              f"({'converted in place' if expression else 're-embedded by upload_to_db.py'})")
+        if dry_run:
+            print(f"   USING {expression or 'NULL'}")
+            return
+
+        # One transaction: readers keep using the old column until the commit.
+        # ALTER COLUMN TYPE rewrites the table under an exclusive lock, so run it off-peak
+        cur.execute(f"DROP INDEX IF EXISTS {INDEX_NAME};")
+        cur.execute(f"ALTER TABLE company_faq ALTER COLUMN embedding TYPE {target} USING {expression or 'NULL'};")
+        if expression is None:
+            cur.execute("UPDATE company_faq SET content_hash = NULL;")  # makes upload_to_db.py embed every row
+        cur.execute(match_function_sql(target))
+        settings = build_vector_index(cur)
+        conn.commit()
+
+        cur.execute(SIZE_SQL)
+        print(f"✅ Migrated; table size {size_before} -> {cur.fetchone()[0]}, vector index {settings}")
+        if expression is None:
+            print(f"👉 Run: EMBEDDING_DIMENSIONS={column_dimensions(target)} python RAG/upload_to_db.py")
+        print(f"👉 Set EMBEDDING_STORAGE={target.split('(')[0]} and EMBEDDING_DIMENSIONS={column_dimensions(target)} "
+              f"for the API so query embeddings match")
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Migration failed, nothing was changed: {e}")
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--storage", choices=["vector", "halfvec"], default=EMBEDDING_STORAGE)
+    parser.add_argument("--dimensions", type=int, default=EMBEDDING_DIMENSIONS)
+    parser.add_argument("--reembed", action="store_true", help="clear the vectors and re-embed with upload_to_db.py")
+    parser.add_argument("--dry-run", action="store_true", help="print the conversion without changing anything")
+    args = parser.parse_args()
+    migrate(args.storage, args.dimensions, reembed=args.reembed, dry_run=args.dry_run)
@@ -1,13 +1,64 @@
+#!/usr/bin/env python3
+"""
+Retrieval benchmark for the company_faq knowledge base
+Usage:
+    python test_search.py                      # benchmark all configurations, JSON to stdout
+    python test_search.py --offline            # deterministic local embeddings, no OpenAI calls
+    python test_search.py --output run.json    # also write results to a file
+    python test_search.py --query "Do you have a Toyota RAV4 in stock?"
+    python test_search.py --storage vector:1536,vector:768,halfvec:768,halfvec:512   # storage trade-offs
+"""
+
 import os
+import sys
+import json
+import math
+import time
+import argparse
+import contextlib
+from datetime import datetime
+
+import numpy as np
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from openai import OpenAI
 from dotenv import load_dotenv
 from pgvector.psycopg2 import register_vector
 
+# Load .env before the project modules, which read their settings at import time
 load_dotenv()
 
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from embedding_cache import (
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MODEL,
+    embed_query,
+    embed_texts,
+    query_embedding_cache,
+    shorten_embedding,
+)
+from embedding_store import embed_with_store, open_embedding_store
+from index_settings import (
+    EMBEDDING_STORAGE,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_M,
+    choose_index_settings,
+    cosine_ops,
+    current_column_type,
+    embedding_column_type,
+    load_index_settings,
+    search_settings_sql,
+)
+from local_embeddings import LocalEmbeddingClient
+from vector_index import InMemoryVectorIndex
+
+RAG_DIR = os.path.dirname(os.path.abspath(__file__))
+QUERIES_PATH = os.path.join(RAG_DIR, "benchmark_queries.json")
+CONTENT_PATH = os.path.join(RAG_DIR, "demo_content.json")
+RECALL_AT = (1, 3, 5)
+
+# Created lazily so --offline runs don't need an API key
+openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY")) if os.getenv("OPENAI_API_KEY") else None
 
 def search(question):
     """Search Boralio content for relevant information"""
@@ -27,18 +78,17 @@ def search(question):
         register_vector(conn)
         cur = conn.cursor(cursor_factory=RealDictCursor)
 
-        # Set ivfflat.probes for better recall
-        cur.execute("SET ivfflat.probes = 100;")
+        # Use the probes / ef_search recorded when the index was built
+        settings_sql = search_settings_sql(load_index_settings(cur))
+        if settings_sql:
+            cur.execute(settings_sql)
 
-        # Generate query embedding
-        response = openai_client.embeddings.create(
-            input=question,
-            model="text-embedding-3-small"
-        )
-        query_embedding = response.data[0].embedding
+        # Generate query embedding (same cache the chatbot uses)
+        query_embedding = embed_query(openai_client, question)
 
-        # Direct similarity search
-        cur.execute("""
+        # Direct similarity search (query cast to the column's vector / halfvec type)
+        column_type = current_column_type(cur)
+        cur.execute(f"""
             SELECT
                 id,
                 title,
@@ -46,9 +96,9 @@ def search(question):
                 excerpt,
                 url,
                 metadata,
-                (1 - (embedding <=> %s::vector))::float as similarity
+                (1 - (embedding <=> %s::vector::{column_type}))::float as similarity
             FROM company_faq
-            ORDER BY embedding <=> %s::vector
+            ORDER BY embedding <=> %s::vector::{column_type}
             LIMIT 3;
         """, (query_embedding, query_embedding))
 
@@ -71,21 +121,260 @@ def search(question):
         print(f"❌ Search error: {e}")
         return []
 
-if __name__ == "__main__":
-    # Test queries (dealer & vehicle-focused to match demo_content.json)
-    test_queries = [
-        "Where can I schedule a test drive?",
-        "Do you have a Toyota RAV4 in stock?",
-        "Tell me about Ford F-Series towing capacity",
-        "How do I get financing for a new car?",
-        "What warranty and protection plans do you offer?",
-        "Do you offer certified pre-owned vehicles and inspections?",
-        "What are the current special offers and incentives?",
-        "How can I order OEM parts and accessories?",
-        "Which electric vehicle models and charging support do you provide?",
-        "What is the trade-in appraisal process and how do I get a quote?",
+
+def percentile(values, p):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    index = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+def score_config(name, ranked_titles, queries, latencies_ms, params=None):
+    """recall@k, MRR and latency percentiles for one retrieval configuration"""
+    recall = {k: 0.0 for k in RECALL_AT}
+    reciprocal_ranks = 0.0
+    for titles, item in zip(ranked_titles, queries):
+        expected = set(item["expected"])
+        for k in RECALL_AT:
+            recall[k] += len(expected & set(titles[:k])) / len(expected)
+        first_hit = next((rank for rank, title in enumerate(titles, 1) if title in expected), None)
+        if first_hit:
+            reciprocal_ranks += 1.0 / first_hit
+
+    n = len(queries)
+    result = {"config": name, "params": params or {}}
+    for k in RECALL_AT:
+        result[f"recall@{k}"] = round(recall[k] / n, 4)
+    result["mrr"] = round(reciprocal_ranks / n, 4)
+    result["latency_ms"] = {
+        "p50": round(percentile(latencies_ms, 50), 3),
+        "p95": round(percentile(latencies_ms, 95), 3),
+        "p99": round(percentile(latencies_ms, 99), 3),
+    }
+    return result
+
+def load_corpus(cur, offline, client, store=None, dimensions=EMBEDDING_DIMENSIONS):
+    """(id, title, embedding) rows: live company_faq, or demo_content.json embedded locally"""
+    if not offline and cur is not None:
+        cur.execute("SELECT id, title, embedding::vector AS embedding FROM company_faq WHERE embedding IS NOT NULL ORDER BY id;")
+        return [dict(row) for row in cur.fetchall()]
+
+    with open(CONTENT_PATH, "r") as f:
+        content_chunks = json.load(f)
+    texts = [f"{chunk['title']}\n\n{chunk['content']}" for chunk in content_chunks]
+    embeddings = embed_with_store(texts, lambda missing: embed_texts(client, missing, dimensions=dimensions), store)
+    return [
+        {"id": i, "title": chunk["title"], "embedding": embedding}
+        for i, (chunk, embedding) in enumerate(zip(content_chunks, embeddings), 1)
     ]
 
-    for query in test_queries:
-        search(query)
-        print("-" * 80)
+def run_sql_queries(cur, query_vectors, limit, repeats, column_type="vector"):
+    """Ranked titles (first run) and per-query latencies against the bench_faq temp table"""
+    ranked_titles = []
+    latencies_ms = []
+    for repeat in range(repeats):
+        for vector in query_vectors:
+            start = time.perf_counter()
+            cur.execute(
+                f"SELECT title FROM bench_faq ORDER BY embedding <=> %s::vector::{column_type} LIMIT %s;",
+                (vector, limit)
+            )
+            rows = cur.fetchall()
+            latencies_ms.append((time.perf_counter() - start) * 1000)
+            if repeat == 0:
+                ranked_titles.append([row["title"] for row in rows])
+    return ranked_titles, latencies_ms
+
+def run_memory_queries(corpus, query_vectors, limit, repeats):
+    index = InMemoryVectorIndex(refresh_interval=float("inf"))
+    with contextlib.redirect_stdout(sys.stderr):  # keep stdout machine-readable
+        index.set_rows(corpus, "benchmark")
+    ranked_titles = []
+    latencies_ms = []
+    for repeat in range(repeats):
+        for vector in query_vectors:
+            start = time.perf_counter()
+            rows = index.search(vector, limit=limit)
+            latencies_ms.append((time.perf_counter() - start) * 1000)
+            if repeat == 0:
+                ranked_titles.append([row["title"] for row in rows])
+    return ranked_titles, latencies_ms
+
+def relation_sizes(cur, index_name=None):
+    """On-disk bytes of bench_faq (table + TOAST) and of one of its indexes"""
+    cur.execute("SELECT pg_table_size('bench_faq') AS table_bytes, avg(pg_column_size(embedding))::int AS vector_bytes FROM bench_faq;")
+    sizes = dict(cur.fetchone())
+    if index_name:
+        cur.execute("SELECT pg_relation_size(%s::regclass) AS index_bytes;", (index_name,))
+        sizes.update(cur.fetchone())
+    return sizes
+
+def run_sql_configs(cur, configs, corpus, query_vectors, queries, probes_list, ef_search_list, lists, repeats,
+                    column_type):
+    """exact / ivfflat / hnsw results on a bench_faq copy stored as column_type"""
+    limit = max(RECALL_AT)
+    storage = {"storage": column_type}
+    results = []
+
+    # Benchmark a temp copy so building/dropping indexes never locks company_faq
+    cur.execute("DROP TABLE IF EXISTS bench_faq;")
+    cur.execute(f"CREATE TEMP TABLE bench_faq (id INT PRIMARY KEY, title TEXT, embedding {column_type});")
+    execute_values(
+        cur,
+        "INSERT INTO bench_faq (id, title, embedding) VALUES %s",
+        [(row["id"], row["title"], np.asarray(row["embedding"], dtype=np.float32)) for row in corpus]
+    )
+    cur.execute("ANALYZE bench_faq;")
+    ops = cosine_ops(column_type)
+
+    if "exact" in configs:
+        titles, latencies = run_sql_queries(cur, query_vectors, limit, repeats, column_type)
+        results.append(score_config("exact", titles, queries, latencies, dict(storage, **relation_sizes(cur))))
+
+    # Force the index even on tiny tables where the planner would prefer a seq scan
+    cur.execute("SET enable_seqscan = off;")
+
+    if "ivfflat" in configs:
+        ivf_lists = lists or choose_index_settings(len(corpus), "ivfflat")["lists"]
+        cur.execute(f"CREATE INDEX bench_faq_ivfflat ON bench_faq USING ivfflat (embedding {ops}) WITH (lists = {int(ivf_lists)});")
+        sizes = relation_sizes(cur, "bench_faq_ivfflat")
+        for probes in probes_list:
+            cur.execute(f"SET ivfflat.probes = {int(probes)};")
+            titles, latencies = run_sql_queries(cur, query_vectors, limit, repeats, column_type)
+            params = dict(storage, lists=ivf_lists, probes=probes, **sizes)
+            results.append(score_config("ivfflat", titles, queries, latencies, params))
+        cur.execute("DROP INDEX bench_faq_ivfflat;")
+
+    if "hnsw" in configs:
+        cur.execute(f"CREATE INDEX bench_faq_hnsw ON bench_faq USING hnsw (embedding {ops}) WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION});")
+        sizes = relation_sizes(cur, "bench_faq_hnsw")
+        for ef_search in ef_search_list:
+            cur.execute(f"SET hnsw.ef_search = {int(ef_search)};")
+            titles, latencies = run_sql_queries(cur, query_vectors, limit, repeats, column_type)
+            params = dict(storage, m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, ef_search=ef_search, **sizes)
+            results.append(score_config("hnsw", titles, queries, latencies, params))
+        cur.execute("DROP INDEX bench_faq_hnsw;")
+
+    cur.execute("RESET enable_seqscan;")
+    cur.execute("DROP TABLE bench_faq;")
+    return results
+
+def run_benchmark(configs, probes_list, ef_search_list, lists=None, offline=False, repeats=3, storage_modes=None):
+    """Evaluate every requested configuration on the labeled query set, per storage mode.
+
+    storage_modes is a list of (storage, dimensions) such as ("halfvec", 512). Embeddings
+    are fetched once at the largest size and shortened for the others, which is what
+    text-embedding-3 returns when asked for fewer dimensions.
+    """
+    with open(QUERIES_PATH, "r") as f:
+        queries = json.load(f)
+    storage_modes = storage_modes or [(EMBEDDING_STORAGE, EMBEDDING_DIMENSIONS)]
+    source_dimensions = max(dimensions for _, dimensions in storage_modes)
+
+    client = LocalEmbeddingClient() if offline else openai_client
+    if client is None:
+        raise ValueError("OPENAI_API_KEY not set (use --offline for local embeddings)")
+
+    database_url = os.getenv("BATCH_DB_URL") or os.getenv("DATABASE_URL")
+    conn = None
+    cur = None
+    if database_url:
+        conn = psycopg2.connect(database_url)
+        conn.autocommit = True
+        register_vector(conn)
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+    else:
+        print("⚠️  No database configured, running the in-memory configuration only", file=sys.stderr)
+        configs = [c for c in configs if c == "memory"]
+
+    # Repeated runs read API embeddings from the on-disk store (local ones are free to recompute)
+    store = None if offline else open_embedding_store(EMBEDDING_MODEL, source_dimensions)
+    corpus = load_corpus(cur, offline, client, store, source_dimensions)
+    query_texts = [item["query"] for item in queries]
+    full_query_vectors = embed_with_store(
+        query_texts, lambda missing: embed_texts(client, missing, dimensions=source_dimensions), store
+    )
+    limit = max(RECALL_AT)
+    results = []
+    memory_dimensions = set()
+
+    try:
+        for storage, dimensions in storage_modes:
+            if dimensions > len(corpus[0]["embedding"]):
+                print(f"⚠️  Skipping {storage}({dimensions}): corpus embeddings only have "
+                      f"{len(corpus[0]['embedding'])} dimensions", file=sys.stderr)
+                continue
+            mode_corpus = [dict(row, embedding=shorten_embedding(row["embedding"], dimensions)) for row in corpus]
+            query_vectors = [shorten_embedding(vector, dimensions) for vector in full_query_vectors]
+
+            if cur is not None and any(c in configs for c in ("exact", "ivfflat", "hnsw")):
+                results.extend(run_sql_configs(
+                    cur, configs, mode_corpus, query_vectors, queries, probes_list, ef_search_list, lists,
+                    repeats, embedding_column_type(storage, dimensions),
+                ))
+
+            if "memory" in configs and dimensions not in memory_dimensions:
+                # The in-memory index always holds float32, so only the dimensions matter
+                memory_dimensions.add(dimensions)
+                titles, latencies = run_memory_queries(mode_corpus, query_vectors, limit, repeats)
+                params = {"storage": f"float32({dimensions})", "matrix_bytes": len(mode_corpus) * dimensions * 4}
+                results.append(score_config("memory", titles, queries, latencies, params))
+    finally:
+        if conn is not None:
+            cur.close()
+            conn.close()
+
+    return {
+        "generated_at": datetime.utcnow().isoformat(),
+        "embeddings": "local" if offline else EMBEDDING_MODEL,
+        "corpus_rows": len(corpus),
+        "queries": len(queries),
+        "repeats": repeats,
+        "storage_modes": [embedding_column_type(storage, dimensions) for storage, dimensions in storage_modes],
+        "results": results,
+    }
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+def _storage_list(value):
+    """"vector:1536,halfvec:512" -> [("vector", 1536), ("halfvec", 512)]"""
+    modes = []
+    for item in value.split(","):
+        if item:
+            storage, _, dimensions = item.partition(":")
+            modes.append((storage.strip().lower(), int(dimensions or EMBEDDING_DIMENSIONS)))
+    return modes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrieval benchmark: recall@1/3/5, MRR and latency percentiles")
+    parser.add_argument("--configs", default="exact,ivfflat,hnsw,memory", help="comma-separated: exact,ivfflat,hnsw,memory")
+    parser.add_argument("--probes", type=_int_list, default=[1, 2, 4, 10], help="ivfflat.probes values")
+    parser.add_argument("--lists", type=int, default=None, help="ivfflat lists (default: sized from row count)")
+    parser.add_argument("--ef-search", type=_int_list, default=[10, 20, 40, 100], help="hnsw.ef_search values")
+    parser.add_argument("--repeats", type=int, default=3, help="timing repetitions per query")
+    parser.add_argument("--offline", action="store_true", help="use deterministic local embeddings (no network)")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--query", help="print the top results for a single question instead")
+    parser.add_argument("--storage", type=_storage_list, default=None,
+                        help="storage modes to compare, e.g. vector:1536,vector:768,halfvec:768,halfvec:512 "
+                             "(default: EMBEDDING_STORAGE:EMBEDDING_DIMENSIONS)")
+    args = parser.parse_args()
+
+    if args.query:
+        search(args.query)
+        print(f"🧠 Embedding cache: {query_embedding_cache.stats()}")
+        sys.exit(0)
+
+    report = run_benchmark(
+        [c.strip() for c in args.configs.split(",") if c.strip()],
+        args.probes,
+        args.ef_search,
+        lists=args.lists,
+        offline=args.offline,
+        repeats=args.repeats,
+        storage_modes=args.storage,
+    )
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
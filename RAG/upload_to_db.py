@@ -1,25 +1,45 @@
 import os
-import json
+import sys
+import time
+import argparse
 import psycopg2
 from openai import OpenAI
 from dotenv import load_dotenv
 from pgvector.psycopg2 import register_vector
 
+# Load .env before the project modules, which read their settings at import time
 load_dotenv()
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from index_settings import build_vector_index, current_column_type, embedding_column_type
+from embedding_cache import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL, embed_texts
+from embedding_store import embed_with_store, open_embedding_store
+from chunker import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, iter_chunks
+from kb_sync import sync_chunks
+
 # Initialize clients
 openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def generate_embedding(text):
-    """Generate embedding using OpenAI"""
-    response = openai_client.embeddings.create(
-        input=text,
-        model="text-embedding-3-small"
+# Embeddings from earlier runs (any database) are reused from disk instead of the API
+embedding_store = open_embedding_store(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+
+def generate_embeddings(texts):
+    """Generate embeddings using OpenAI, batched within the API's input and token limits"""
+    return embed_with_store(
+        texts,
+        lambda missing: embed_texts(openai_client, missing, model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS),
+        embedding_store,
     )
-    return response.data[0].embedding
 
-def load_content():
-    """Load Boralio content into PostgreSQL"""
+DEFAULT_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "demo_content.json")
+
+def load_content(sources=None, full=False, max_tokens=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP_TOKENS, prune=False):
+    """Load Boralio content into PostgreSQL (incrementally unless full=True).
+
+    prune=True deletes every row that is not in sources, so only use it when sources
+    are the whole knowledge base.
+    """
+    sources = sources or [DEFAULT_SOURCE]
 
     # Use BATCH_DB_URL for batch operations (session mode, port 5432)
     # Falls back to DATABASE_URL if BATCH_DB_URL is not set
@@ -30,11 +50,9 @@ def load_content():
 
     print(f"🔗 Using: {'BATCH_DB_URL' if os.getenv('BATCH_DB_URL') else 'DATABASE_URL'}")
 
-    # Load content
-    with open('demo_content.json', 'r') as f:
-        content_chunks = json.load(f)
-
-    print(f"📥 Loading {len(content_chunks)} content chunks...")
+    # Sources are read and chunked lazily, so they can be far larger than memory
+    content_chunks = iter_chunks(sources, max_tokens, overlap)
+    print(f"📥 Loading {', '.join(sources)} (chunks of up to {max_tokens} tokens, {overlap} overlap)...")
 
     try:
         # Connect to PostgreSQL
@@ -42,45 +60,40 @@ def load_content():
         register_vector(conn)
         cur = conn.cursor()
 
-        # Clear existing data (optional - comment out if you want to keep old data)
+        # Embeddings are requested at EMBEDDING_DIMENSIONS; refuse before spending API calls
+        # if the column was created (or migrated) for a different size
+        column_type = current_column_type(cur)
+        if f"({EMBEDDING_DIMENSIONS})" not in column_type:
+            print(f"❌ company_faq.embedding is {column_type} but EMBEDDING_DIMENSIONS={EMBEDDING_DIMENSIONS}; "
+                  f"run python RAG/migrate_embeddings.py or fix the setting")
+            conn.close()
+            return
+        if column_type != embedding_column_type():
+            print(f"⚠️  company_faq.embedding is {column_type}, EMBEDDING_STORAGE asks for {embedding_column_type()}")
+
+        # Upsert new/changed chunks (and with prune, delete removed ones) in a single transaction:
+        # only new or edited text is embedded, and readers keep seeing the old rows
+        # until the commit (never an empty or half-loaded table)
+        started = time.perf_counter()
         try:
-            cur.execute("DELETE FROM company_faq WHERE id > 0;")
+            counts = sync_chunks(cur, content_chunks, generate_embeddings, full=full, prune=prune,
+                                 progress=lambda c: print(f"   ... {c['chunks']} chunks, {c['embedded']} embedded"))
             conn.commit()
-            print("🗑️  Cleared existing data\n")
         except Exception as e:
-            print(f"⚠️  Could not clear data: {e}\n")
+            print(f"❌ Error syncing chunks: {e}")
             conn.rollback()
-
-        for i, chunk in enumerate(content_chunks, 1):
-            print(f"  Processing {i}/{len(content_chunks)}: {chunk['title']}")
-
-            try:
-                # Generate embedding
-                embedding_text = f"{chunk['title']}\n\n{chunk['content']}"
-                embedding = generate_embedding(embedding_text)
-
-                # Prepare data
-                cur.execute("""
-                    INSERT INTO company_faq (title, content, excerpt, url, embedding, metadata)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    RETURNING id;
-                """, (
-                    chunk['title'],
-                    chunk['content'],
-                    chunk['content'][:200],  # First 200 chars as excerpt
-                    chunk['url'],
-                    embedding,
-                    json.dumps({"category": chunk['category']})
-                ))
-
-                inserted_id = cur.fetchone()[0]
-                conn.commit()
-                print(f"    ✅ Inserted with ID: {inserted_id}")
-
-            except Exception as e:
-                print(f"    ❌ Error: {e}")
-                conn.rollback()
-                continue
+            raise
+        elapsed = time.perf_counter() - started
+        print(f"🧠 Embedded {counts['embedded']} new or changed chunks "
+              f"({counts['chunks'] - counts['embedded']} reused)")
+        if embedding_store is not None:
+            store_stats = embedding_store.stats()
+            print(f"🗄️  Embedding store: {store_stats['hits']} from disk, {store_stats['misses']} from the API "
+                  f"({store_stats['entries']} stored)")
+        print(f"💾 {counts['inserted']} inserted, {counts['updated']} updated, "
+              f"{counts['unchanged']} unchanged, {counts['deleted']} deleted")
+        print(f"⚡ Synced {counts['chunks']} chunks in {elapsed:.2f}s "
+              f"({counts['chunks'] / max(elapsed, 1e-9):.1f} chunks/sec)")
 
         print("\n🎉 Loading complete!")
 
@@ -89,6 +102,14 @@ def load_content():
         count = cur.fetchone()[0]
         print(f"📊 Total records in database: {count}")
 
+        # Rebuild the vector index only when the row count changed (ivfflat lists depend on it)
+        if counts["inserted"] or counts["deleted"] or full:
+            settings = build_vector_index(cur)
+            conn.commit()
+            print(f"🔍 Vector index rebuilt: {settings}")
+        else:
+            print("🔍 Row count unchanged, vector index kept")
+
         # Close connection
         cur.close()
         conn.close()
@@ -97,4 +118,17 @@ def load_content():
         print(f"❌ Database connection error: {e}")
 
 if __name__ == "__main__":
-    load_content()
+    parser = argparse.ArgumentParser(
+        description="Sync knowledge base sources into company_faq",
+        epilog="Rows are only deleted with --prune, which removes everything not in the given sources: "
+               "pass every source of the knowledge base, not just the files that changed",
+    )
+    parser.add_argument("sources", nargs="*", help=".json/.jsonl documents or .txt files (default: RAG/demo_content.json)")
+    parser.add_argument("--full", action="store_true", help="Re-embed every chunk (e.g. after changing EMBEDDING_MODEL)")
+    parser.add_argument("--max-tokens", type=int, default=CHUNK_MAX_TOKENS, help="max tokens per chunk")
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP_TOKENS, help="tokens repeated between chunks")
+    parser.add_argument("--prune", action="store_true",
+                        help="Delete rows for chunks that are not in these sources (DANGER: with a partial list "
+                             "this deletes the rest of the knowledge base)")
+    args = parser.parse_args()
+    load_content(args.sources, full=args.full, max_tokens=args.max_tokens, overlap=args.overlap, prune=args.prune)
@@ -11,12 +11,28 @@ if not os.getenv("OPENAI_API_KEY"):
 
 from fastapi import FastAPI, HTTPException, Response, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional
-import uuid
+import json
 from pathlib import Path
-from chatbot import chat
+from chatbot import new_lead_data
+from async_chatbot import chat_async, stream_chat_async
+from async_db import close_async_pool, get_async_pool
+from vector_index import RETRIEVAL_BACKEND, get_memory_index
+from embedding_cache import query_embedding_cache
+from response_cache import response_cache
+from lead_rules import extraction_stats
+from lead_writes import persisted_leads
+from session_store import (
+    SESSION_BACKEND,
+    SESSION_HISTORY_LIMIT,
+    SESSION_IDLE_TTL,
+    SESSION_MAX_COUNT,
+    SESSION_REVALIDATE,
+    PostgresSessionStore,
+    SessionStore,
+)
 
 app = FastAPI(title="AI Sales Assistant Chatbot API")
 
@@ -38,8 +54,43 @@ class ChatResponse(BaseModel):
     session_id: str
     sources: List[Dict] = []
 
-# In-memory session storage
-sessions = {}
+@app.on_event("startup")
+def warm_vector_index():
+    """Load the in-memory vector index at startup instead of on the first chat turn"""
+    if RETRIEVAL_BACKEND == "memory":
+        get_memory_index()
+
+@app.on_event("shutdown")
+async def close_database_pool():
+    await close_async_pool()
+
+# In-memory session storage: session_id -> {"history": [...], "lead": {...}},
+# bounded by count, idle time and history length
+session_store = SessionStore(
+    new_lead_data,
+    max_sessions=SESSION_MAX_COUNT,
+    idle_ttl=SESSION_IDLE_TTL,
+    history_limit=SESSION_HISTORY_LIMIT,
+)
+# With SESSION_BACKEND=postgres the store above is only a read-through cache in front
+# of chat_sessions, so any worker or serverless instance can continue a conversation
+session_db = (
+    PostgresSessionStore(session_store, get_async_pool, revalidate=SESSION_REVALIDATE)
+    if SESSION_BACKEND == "postgres" else None
+)
+
+async def load_session(session_id):
+    """Return (session_id, session), creating the session if needed"""
+    if session_db:
+        return await session_db.get_or_create(session_id)
+    return session_store.get_or_create(session_id)
+
+async def store_session(session_id, session, new_messages):
+    """Record a finished turn"""
+    if session_db:
+        await session_db.save(session_id, session, new_messages)
+    else:
+        session_store.save(session_id, session)
 
 # Create API router with /api prefix for Vercel deployment
 # For local development, routes are at root level
@@ -53,30 +104,72 @@ async def chat_options():
 @api_router.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
     """Chat endpoint for web widget"""
-    # Get or create session
-    session_id = request.session_id or str(uuid.uuid4())
-    if session_id not in sessions:
-        sessions[session_id] = []
-    # Get response
+    # Get or create session, then get response
     try:
-        response_text, updated_history = chat(
+        session_id, session = await load_session(request.session_id)
+        turn_start = len(session["history"])
+        response_text, updated_history, sources = await chat_async(
             request.message,
-            sessions[session_id],
-            session_id
+            session["history"],
+            session_id,
+            session["lead"]
         )
-        sessions[session_id] = updated_history
+        session["history"] = updated_history
+        await store_session(session_id, session, updated_history[turn_start:])
         return ChatResponse(
             message=response_text,
             session_id=session_id,
-            sources=[]
+            sources=sources
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.options("/chat/stream")
+async def chat_stream_options():
+    return Response(status_code=200)
+
+@api_router.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """Chat endpoint streaming the reply as Server-Sent Events"""
+    async def events():
+        session_id = request.session_id
+        try:
+            session_id, session = await load_session(session_id)
+            turn_start = len(session["history"])
+            async for event in stream_chat_async(
+                request.message,
+                session["history"],
+                session_id,
+                session["lead"]
+            ):
+                if event["type"] == "done":
+                    await store_session(session_id, session, session["history"][turn_start:])
+                    event["session_id"] = session_id
+                yield f"data: {json.dumps(event)}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'type': 'error', 'detail': str(e), 'session_id': session_id})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
+@api_router.get("/stats")
+async def cache_stats():
+    """Cache hit rates, extraction LLM avoidance and session memory for the current worker"""
+    return {
+        "sessions": session_db.stats() if session_db else session_store.stats(),
+        "embedding_cache": query_embedding_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "lead_extraction": extraction_stats(),
+        "lead_writes": persisted_leads.stats(),
+    }
+
 # Include router with /api prefix for production, and also at root for local dev
 app.include_router(api_router, prefix="/api")
 app.include_router(api_router)  # Also include at root level for backward compatibility
@@ -0,0 +1,422 @@
+import asyncio
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+from async_db import get_async_pool, to_asyncpg_sql
+from chatbot import (
+    BACKGROUND_POST_TURN,
+    SINGLE_CALL_EXTRACTION,
+    SINGLE_CALL_INSTRUCTIONS,
+    TURN_RESPONSE_FORMAT,
+    UPSERT_LEAD_SQL,
+    append_turn,
+    build_extraction_prompt,
+    build_messages,
+    build_system_prompt,
+    format_context,
+    format_sources,
+    is_personal_turn,
+    is_qualified,
+    last_assistant_message,
+    merge_lead_fields,
+    plan_lead_write,
+    record_lead_write,
+    new_lead_data,
+    parse_turn_response,
+)
+from embedding_cache import embed_query_async
+from hybrid_search import HYBRID_CANDIDATES, HYBRID_LEXICAL_WAIT, HYBRID_SEARCH, fuse_hybrid, is_confident_lexical
+from index_settings import (
+    SELECT_SETTINGS_SQL,
+    SETTINGS_TABLE_EXISTS_SQL,
+    cached_index_settings,
+    remember_index_settings,
+    search_settings_sql,
+)
+from lead_rules import extract_with_rules, merge_rule_fields, record_extraction
+from response_cache import RESPONSE_CACHE_ENABLED, response_cache
+from notification_worker import NOTIFY_INLINE, drain_notifications
+from vector_index import (
+    KB_VERSION_CHECK_INTERVAL,
+    KB_VERSION_SQL,
+    RETRIEVAL_BACKEND,
+    format_kb_version,
+    get_memory_index,
+)
+
+load_dotenv()
+
+# Event-loop counterpart of chatbot.chat: every network call (OpenAI, Postgres) is awaited
+# and emails go through the outbox, so one slow turn never stalls the other conversations on the worker
+async_openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+UPSERT_LEAD_ASYNC_SQL = to_asyncpg_sql(UPSERT_LEAD_SQL)
+
+# chatbot.APPEND_MESSAGES_SQL as a single statement over arrays (no execute_values in asyncpg)
+APPEND_MESSAGES_ASYNC_SQL = """
+    INSERT INTO conversation_messages (session_id, seq, role, content, created_at)
+    SELECT $1, * FROM unnest($2::int[], $3::text[], $4::text[], $5::timestamp[])
+    ON CONFLICT (session_id, seq) DO NOTHING;
+"""
+
+
+async def load_index_settings_async(conn):
+    """index_settings.load_index_settings for an asyncpg connection (same cache)"""
+    settings = cached_index_settings()
+    if settings is None:
+        if await conn.fetchval(SETTINGS_TABLE_EXISTS_SQL):
+            row = await conn.fetchrow(SELECT_SETTINGS_SQL)
+            settings = dict(row) if row is not None else None
+        settings = remember_index_settings(settings)
+    return settings
+
+
+_kb_version = None
+_kb_version_checked_at = 0.0
+
+
+async def get_kb_version_async(max_age=KB_VERSION_CHECK_INTERVAL):
+    """vector_index.get_kb_version without blocking the event loop"""
+    global _kb_version, _kb_version_checked_at
+    if _kb_version is None or time.monotonic() - _kb_version_checked_at >= max_age:
+        pool = await get_async_pool()
+        row = await pool.fetchrow(KB_VERSION_SQL)
+        _kb_version = format_kb_version(list(row.values()))
+        _kb_version_checked_at = time.monotonic()
+    return _kb_version
+
+
+async def lexical_search_async(question, limit=HYBRID_CANDIDATES):
+    """hybrid_search.lexical_search on the asyncpg pool"""
+    try:
+        pool = await get_async_pool()
+        rows = await pool.fetch("SELECT * FROM search_company_faq_text($1, $2);", question, limit)
+        return [dict(row, similarity=None) for row in rows]
+    except Exception as e:
+        # Databases that haven't re-run init_db.py yet have no search_tsv column
+        print(f"⚠️  Lexical search unavailable, using vector search only: {e}")
+        return []
+
+
+async def _search_postgres_async(query_embedding, threshold, limit):
+    """Similarity search in pgvector via match_company_faq (see RAG/init_db.py)"""
+    pool = await get_async_pool()
+    async with pool.acquire() as conn:
+        settings_sql = search_settings_sql(await load_index_settings_async(conn))
+        # SET LOCAL only lives as long as the transaction around the search
+        async with conn.transaction():
+            if settings_sql:
+                await conn.execute(settings_sql)
+            rows = await conn.fetch(
+                "SELECT * FROM match_company_faq($1::vector, $2, $3);",
+                query_embedding, threshold, limit
+            )
+    return [dict(row) for row in rows]
+
+
+async def get_relevant_context_async(question, threshold=0.45, limit=3):
+    """chatbot.get_relevant_context without blocking the event loop"""
+    try:
+        if HYBRID_SEARCH:
+            # Keyword head start as in get_relevant_context: a confident match within
+            # HYBRID_LEXICAL_WAIT skips the embedding call
+            lexical_task = asyncio.create_task(lexical_search_async(question))
+            await asyncio.wait({lexical_task}, timeout=HYBRID_LEXICAL_WAIT)
+            if lexical_task.done() and is_confident_lexical(lexical_task.result()):
+                lexical_results = lexical_task.result()
+                print(f"[DEBUG] Confident keyword match, skipping embedding: {lexical_results[0]['title']}")
+                return lexical_results[:limit]
+            try:
+                query_embedding = await embed_query_async(async_openai_client, question)
+            except BaseException:
+                lexical_task.cancel()
+                raise
+            lexical_results = await lexical_task
+            if is_confident_lexical(lexical_results):
+                print(f"[DEBUG] Confident keyword match, skipping vector search: {lexical_results[0]['title']}")
+                return lexical_results[:limit]
+        else:
+            lexical_results = []
+            query_embedding = await embed_query_async(async_openai_client, question)
+
+        vector_limit = max(limit, HYBRID_CANDIDATES) if lexical_results else limit
+        if RETRIEVAL_BACKEND == "memory":
+            # The search itself is microseconds, but a stale index reloads over psycopg2
+            results = await asyncio.to_thread(
+                lambda: get_memory_index().search(query_embedding, threshold=threshold, limit=vector_limit)
+            )
+        else:
+            results = await _search_postgres_async(query_embedding, threshold, vector_limit)
+
+        if lexical_results:
+            results = fuse_hybrid(results, lexical_results, limit=limit)
+
+        if results:
+            top_similarity = results[0]['similarity']
+            top_similarity = f"{top_similarity:.4f}" if top_similarity is not None else "keyword match"
+            print(f"[DEBUG] Retrieved {len(results)} results, top similarity: {top_similarity}")
+        else:
+            print(f"[DEBUG] No results above similarity threshold {threshold}")
+
+        return results
+    except Exception as e:
+        print(f"❌ Error retrieving context: {e}")
+        import traceback
+        traceback.print_exc()
+        return []
+
+
+async def extract_lead_info_async(user_message, lead_data=None, previous_assistant_message=None):
+    """chatbot.extract_lead_info with the LLM pass awaited"""
+    if lead_data is None:
+        lead_data = new_lead_data()
+
+    rule_fields, needs_llm = extract_with_rules(user_message, previous_assistant_message)
+    # Rules only fill unset fields; one that disagrees with an earlier turn goes to the LLM
+    needs_llm = merge_rule_fields(lead_data, rule_fields) or needs_llm
+    record_extraction(needs_llm)
+    if not needs_llm:
+        return lead_data
+
+    try:
+        response = await async_openai_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": build_extraction_prompt(user_message, lead_data, previous_assistant_message)}],
+            temperature=0,
+            response_format={"type": "json_object"}
+        )
+        merge_lead_fields(lead_data, json.loads(response.choices[0].message.content))
+    except Exception:
+        pass
+
+    return lead_data
+
+
+async def save_lead_async(lead_data, conversation_history, session_id):
+    """chatbot.save_lead on the asyncpg pool"""
+    try:
+        params, rows = plan_lead_write(lead_data, conversation_history, session_id)
+        row = None
+        if params is not None or rows:
+            pool = await get_async_pool()
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    if params is not None:
+                        row = await conn.fetchrow(UPSERT_LEAD_ASYNC_SQL, *params)
+                    if rows:
+                        _, seqs, roles, contents, timestamps = zip(*rows)
+                        await conn.execute(
+                            APPEND_MESSAGES_ASYNC_SQL, session_id, list(seqs), list(roles), list(contents), list(timestamps)
+                        )
+        record_lead_write(session_id, params, rows)
+        return dict(row) if row else {"id": None, "inserted": False}
+    except Exception as e:
+        print(f"Error saving lead: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+
+async def persist_qualified_lead_async(lead_data, conversation_history, session_id):
+    """Save the lead once it qualifies and notify sales about new leads"""
+    try:
+        if is_qualified(lead_data):
+            saved_lead = await save_lead_async(lead_data, conversation_history, session_id)
+            if saved_lead:
+                if saved_lead.get('inserted', False):
+                    print(f"✅ New lead saved to database with ID: {saved_lead['id']} (notification queued)")
+                    if NOTIFY_INLINE:
+                        # The outbox worker is synchronous (psycopg2 + requests): keep it off the loop
+                        await asyncio.to_thread(drain_notifications, limit=1, lead_id=saved_lead['id'])
+                elif saved_lead['id']:
+                    print(f"✅ Lead {saved_lead['id']} updated (no duplicate email sent)")
+    except Exception as e:
+        print(f"❌ Error persisting lead: {e}")
+
+
+# Background saves are serialized (like chatbot's single post-turn thread) so a session's
+# saves land in order; task references are kept so they aren't garbage collected mid-flight
+_persist_lock = asyncio.Lock()
+_background_tasks = set()
+
+
+async def _persist_in_order(lead_data, conversation_history, session_id):
+    async with _persist_lock:
+        await persist_qualified_lead_async(lead_data, conversation_history, session_id)
+
+
+async def _schedule_persist(lead_data, conversation_history, session_id):
+    if BACKGROUND_POST_TURN:
+        task = asyncio.create_task(
+            _persist_in_order(dict(lead_data), list(conversation_history), session_id)
+        )
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    else:
+        await _persist_in_order(lead_data, conversation_history, session_id)
+
+
+async def _cached_response_async(user_message, conversation_history, lead_data):
+    """(cache key, cached answer or None) for history-free FAQ questions without personal details"""
+    if not RESPONSE_CACHE_ENABLED or conversation_history:
+        return None, None
+    rule_fields, needs_llm = extract_with_rules(user_message)
+    if is_personal_turn(rule_fields, needs_llm, lead_data):
+        return None, None
+    try:
+        cache_key = (
+            await embed_query_async(async_openai_client, user_message),
+            await get_kb_version_async(),
+        )
+    except Exception as e:
+        print(f"⚠️  Response cache unavailable: {e}")
+        return None, None
+    cached = response_cache.lookup(*cache_key)
+    if cached:
+        print(f"⚡ Response cache hit (matched: {cached['question']})")
+        # Preferences stated in a cached turn ("used SUVs?") still reach the lead
+        merge_rule_fields(lead_data, rule_fields)
+        record_extraction(False)
+        return cache_key, cached["answer"]
+    return cache_key, None
+
+
+async def _finish_turn_async(user_message, assistant_message, conversation_history, lead_data,
+                             session_id, cache_key=None, context_docs=None):
+    """Cache the answer, record the turn and hand the lead off for persistence"""
+    print(f"\n🤖 Mendieta Auto: {assistant_message}")
+
+    if cache_key:
+        response_cache.store(cache_key[0], user_message, assistant_message, cache_key[1])
+
+    append_turn(conversation_history, user_message, assistant_message)
+    await _schedule_persist(lead_data, conversation_history, session_id)
+
+    if context_docs:
+        print("\n📎 Sources:")
+        for doc in context_docs:
+            print(f"  • {doc['title']}")
+
+
+async def chat_async(user_message, conversation_history=None, session_id=None, lead_data=None):
+    """chatbot.chat for the event loop; returns (assistant_message, conversation_history, sources)"""
+    if conversation_history is None:
+        conversation_history = []
+    if lead_data is None:
+        lead_data = new_lead_data()
+
+    print(f"\n🧑 User: {user_message}")
+
+    cache_key, cached_answer = await _cached_response_async(user_message, conversation_history, lead_data)
+    if cached_answer:
+        await _finish_turn_async(user_message, cached_answer, conversation_history, lead_data, session_id)
+        return cached_answer, conversation_history, []
+
+    previous_assistant_message = last_assistant_message(conversation_history)
+    if SINGLE_CALL_EXTRACTION:
+        merge_rule_fields(lead_data, extract_with_rules(user_message, previous_assistant_message)[0])
+        context_docs = await get_relevant_context_async(user_message)
+    else:
+        context_docs, _ = await asyncio.gather(
+            get_relevant_context_async(user_message),
+            extract_lead_info_async(user_message, lead_data, previous_assistant_message),
+        )
+
+    system_prompt = build_system_prompt(lead_data, format_context(context_docs))
+    if SINGLE_CALL_EXTRACTION:
+        system_prompt += SINGLE_CALL_INSTRUCTIONS
+    messages = build_messages(system_prompt, conversation_history, user_message)
+
+    assistant_message = None
+    if SINGLE_CALL_EXTRACTION:
+        response = await async_openai_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=700,
+            response_format=TURN_RESPONSE_FORMAT
+        )
+        assistant_message = parse_turn_response(response.choices[0].message, lead_data)
+        if assistant_message is None:
+            # Same two-call fallback as chatbot.chat
+            print("⚠️  Structured reply unusable, falling back to separate extraction")
+            await extract_lead_info_async(user_message, lead_data, previous_assistant_message)
+            messages = build_messages(build_system_prompt(lead_data, format_context(context_docs)),
+                                      conversation_history, user_message)
+        else:
+            record_extraction(False)
+    if assistant_message is None:
+        response = await async_openai_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500
+        )
+        assistant_message = response.choices[0].message.content
+
+    await _finish_turn_async(user_message, assistant_message, conversation_history, lead_data,
+                             session_id, cache_key, context_docs)
+
+    return assistant_message, conversation_history, format_sources(context_docs)
+
+
+async def stream_chat_async(user_message, conversation_history=None, session_id=None, lead_data=None):
+    """chatbot.stream_chat for the event loop: yields token events, then a done event with sources"""
+    if conversation_history is None:
+        conversation_history = []
+    if lead_data is None:
+        lead_data = new_lead_data()
+
+    print(f"\n🧑 User: {user_message}")
+
+    cache_key, cached_answer = await _cached_response_async(user_message, conversation_history, lead_data)
+    if cached_answer:
+        await _finish_turn_async(user_message, cached_answer, conversation_history, lead_data, session_id)
+        yield {"type": "token", "content": cached_answer}
+        yield {"type": "done", "sources": []}
+        return
+
+    # As in stream_chat: the first token only waits for retrieval
+    previous_assistant_message = last_assistant_message(conversation_history)
+    prompt_lead = dict(lead_data)
+    merge_rule_fields(prompt_lead, extract_with_rules(user_message, previous_assistant_message)[0])
+    extraction_task = asyncio.create_task(
+        extract_lead_info_async(user_message, lead_data, previous_assistant_message)
+    )
+    try:
+        context_docs = await get_relevant_context_async(user_message)
+
+        system_prompt = build_system_prompt(prompt_lead, format_context(context_docs))
+        messages = build_messages(system_prompt, conversation_history, user_message)
+
+        stream = await async_openai_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500,
+            stream=True
+        )
+        parts = []
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                parts.append(token)
+                yield {"type": "token", "content": token}
+        assistant_message = "".join(parts)
+
+        await extraction_task
+    finally:
+        # Client disconnected or the completion failed: don't leave the extraction running
+        if not extraction_task.done():
+            extraction_task.cancel()
+
+    await _finish_turn_async(user_message, assistant_message, conversation_history, lead_data,
+                             session_id, cache_key, context_docs)
+
+    yield {"type": "done", "sources": format_sources(context_docs)}
@@ -0,0 +1,57 @@
+import asyncio
+import itertools
+import os
+import re
+
+import asyncpg
+from dotenv import load_dotenv
+from pgvector.asyncpg import register_vector
+
+from db_pool import DB_POOL_MAX_LIFETIME, DB_POOL_MAX_SIZE, DB_POOL_MIN_SIZE, DB_POOL_TIMEOUT
+
+load_dotenv()
+
+
+async def _init_connection(conn):
+    """Register the pgvector codec once per physical connection"""
+    await register_vector(conn)
+
+
+_pool = None
+_pool_lock = asyncio.Lock()
+
+
+async def get_async_pool():
+    """Process-wide asyncpg pool built from DATABASE_URL (same DB_POOL_* settings as db_pool)"""
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await asyncpg.create_pool(
+                    os.getenv("DATABASE_URL"),
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    max_inactive_connection_lifetime=DB_POOL_MAX_LIFETIME,
+                    timeout=DB_POOL_TIMEOUT,
+                    # Transaction-mode poolers (Supabase, PgBouncer) can't keep prepared statements
+                    statement_cache_size=0,
+                    init=_init_connection,
+                )
+    return _pool
+
+
+async def close_async_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+# %% first, so "%%s" stays a literal "%s" rather than a placeholder
+_PLACEHOLDER_RE = re.compile(r"%%|%s")
+
+
+def to_asyncpg_sql(sql):
+    """Rewrite psycopg2 %s placeholders as asyncpg's $1, $2, ... (and %% escapes as a literal %)"""
+    numbers = itertools.count(1)
+    return _PLACEHOLDER_RE.sub(lambda m: "%" if m.group() == "%%" else f"${next(numbers)}", sql)
@@ -1,26 +1,46 @@
 import os
 import json
-import re
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from openai import OpenAI
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from dotenv import load_dotenv
-from send_email import send_lead_notification
-from pgvector.psycopg2 import register_vector
+from notification_worker import NOTIFY_INLINE, drain_notifications
+from db_pool import db_connection
+from embedding_cache import embed_query
+from vector_index import RETRIEVAL_BACKEND, get_kb_version, get_memory_index
+from index_settings import load_index_settings, search_settings_sql
+from response_cache import RESPONSE_CACHE_ENABLED, response_cache
+from lead_writes import persisted_leads
+from lead_rules import extract_with_rules, merge_rule_fields, record_extraction
+from hybrid_search import (
+    HYBRID_CANDIDATES,
+    HYBRID_LEXICAL_WAIT,
+    HYBRID_SEARCH,
+    fuse_hybrid,
+    is_confident_lexical,
+    lexical_search,
+)
 
 load_dotenv()
 
 openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def get_db_connection():
-    """Get PostgreSQL database connection"""
-    database_url = os.getenv("DATABASE_URL")
-    if not database_url:
-        raise ValueError("DATABASE_URL not found in environment variables")
-    conn = psycopg2.connect(database_url)
-    register_vector(conn)
-    return conn
+# Bounded pool for the concurrent parts of a turn (retrieval + lead extraction)
+TURN_WORKERS = int(os.getenv("TURN_WORKERS", "8"))
+_turn_executor = ThreadPoolExecutor(max_workers=TURN_WORKERS, thread_name_prefix="chat-turn")
+# Keyword queries started alongside the embedding call; a separate pool, since retrieval
+# itself runs on _turn_executor and must not wait on tasks queued behind it
+_lexical_executor = ThreadPoolExecutor(max_workers=TURN_WORKERS, thread_name_prefix="lexical")
+
+# Post-response work (save_lead, notification) runs on a single background thread so
+# saves for a session stay in order and stay off the response path. Serverless platforms
+# may freeze the process once the response is sent, losing the write, so on Vercel
+# (which sets VERCEL=1) the default is to finish it inside the request instead.
+BACKGROUND_POST_TURN = os.getenv(
+    "BACKGROUND_POST_TURN", "false" if os.getenv("VERCEL") else "true"
+).lower() == "true"
+_background_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="post-turn")
 
 # Lead qualification criteria
 QUALIFICATION_QUESTIONS = {
@@ -36,47 +56,69 @@ QUALIFICATION_QUESTIONS = {
     "priorities": "What's most important to you? (safety, fuel economy, cargo space, towing, etc.)",
 }
 
-def get_relevant_context(question, threshold=0.45, limit=3):
-    """Retrieve relevant content from vector DB"""
-    try:
-        response = openai_client.embeddings.create(
-            input=question,
-            model="text-embedding-3-small"
-        )
-        query_embedding = response.data[0].embedding
-
-        conn = get_db_connection()
+def _search_postgres(query_embedding, threshold, limit):
+    """Similarity search in pgvector via match_company_faq (see RAG/init_db.py)"""
+    with db_connection() as conn:
         cur = conn.cursor(cursor_factory=RealDictCursor)
 
-        # Set ivfflat.probes for better recall (match lists parameter from index)
-        # This fixes the accuracy issue - default probes=1 checks only 1 of 100 lists
-        cur.execute("SET ivfflat.probes = 100;")
-
-        # Direct query with low threshold
-        cur.execute("""
-            SELECT
-                id,
-                title,
-                content,
-                excerpt,
-                url,
-                metadata,
-                (1 - (embedding <=> %s::vector))::float as similarity
-            FROM company_faq
-            ORDER BY embedding <=> %s::vector ASC
-            LIMIT %s;
-        """, (query_embedding, query_embedding, limit))
+        # Match probes / ef_search to the index recorded by build_vector_index.
+        # SET LOCAL is scoped to this transaction and rides in the same round trip;
+        # the threshold is applied server-side and the vector is sent once
+        settings_sql = search_settings_sql(load_index_settings(cur))
+        cur.execute(
+            settings_sql + "SELECT * FROM match_company_faq(%s::vector, %s, %s);",
+            (query_embedding, threshold, limit)
+        )
 
         results = cur.fetchall()
+        cur.close()
+        conn.rollback()
+    return results
+
+def get_relevant_context(question, threshold=0.45, limit=3):
+    """Retrieve relevant content from vector DB (only matches above threshold)"""
+    try:
+        # Repeated questions are served from the in-process embedding cache
+        if HYBRID_SEARCH:
+            # The keyword query gets a HYBRID_LEXICAL_WAIT head start: a confident match
+            # within it skips the embedding call (the slowest hop of retrieval) entirely;
+            # otherwise the embedding request overlaps the rest of the keyword query
+            lexical_future = _lexical_executor.submit(lexical_search, question)
+            try:
+                lexical_results = lexical_future.result(timeout=HYBRID_LEXICAL_WAIT)
+            except FutureTimeout:
+                lexical_results = None
+            if lexical_results is not None and is_confident_lexical(lexical_results):
+                print(f"[DEBUG] Confident keyword match, skipping embedding: {lexical_results[0]['title']}")
+                return lexical_results[:limit]
+            query_embedding = embed_query(openai_client, question)
+            if lexical_results is None:
+                lexical_results = lexical_future.result()
+                if is_confident_lexical(lexical_results):
+                    print(f"[DEBUG] Confident keyword match, skipping vector search: {lexical_results[0]['title']}")
+                    return lexical_results[:limit]
+        else:
+            lexical_results = []
+            query_embedding = embed_query(openai_client, question)
+
+        # Fetch more vector candidates when they will be fused with keyword results
+        vector_limit = max(limit, HYBRID_CANDIDATES) if lexical_results else limit
+        if RETRIEVAL_BACKEND == "memory":
+            # Small knowledge base: one matrix-vector product instead of a Postgres scan
+            results = get_memory_index().search(query_embedding, threshold=threshold, limit=vector_limit)
+        else:
+            results = _search_postgres(query_embedding, threshold, vector_limit)
+
+        if lexical_results:
+            results = fuse_hybrid(results, lexical_results, limit=limit)
 
         # Debug: show what we got
         if results:
-            print(f"[DEBUG] Retrieved {len(results)} results, top similarity: {results[0]['similarity']:.4f}")
+            top_similarity = results[0]['similarity']
+            top_similarity = f"{top_similarity:.4f}" if top_similarity is not None else "keyword match"
+            print(f"[DEBUG] Retrieved {len(results)} results, top similarity: {top_similarity}")
         else:
-            print(f"[DEBUG] Query returned 0 results - checking database connectivity")
-
-        cur.close()
-        conn.close()
+            print(f"[DEBUG] No results above similarity threshold {threshold}")
 
         return results
     except Exception as e:
@@ -85,65 +127,105 @@ def get_relevant_context(question, threshold=0.45, limit=3):
         traceback.print_exc()
         return []
 
-def extract_lead_info(conversation_history):
-    """Extract lead information from conversation"""
-    lead_data = {
-        "name": None,
-        "email": None,
-        "phone_number": None,
-        "vehicle_type": None,
-        "make_model_preference": None,
-        "new_or_used": None,
-        "budget_range": None,
-        "trade_in": None,
-        "financing_needed": None,
-        "priorities": None
-    }
-
-    # Extract email and phone from user messages
-    for msg in conversation_history:
-        if msg["role"] == "user":
-            # Extract email
-            email_match = re.search(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', msg["content"])
-            if email_match:
-                lead_data["email"] = email_match.group(0)
-
-            # Extract phone number (various formats)
-            phone_match = re.search(r'\b(?:\+?1[-.]?)?\(?([0-9]{3})\)?[-.]?([0-9]{3})[-.]?([0-9]{4})\b', msg["content"])
-            if phone_match:
-                lead_data["phone_number"] = phone_match.group(0)
-
-    # Use LLM to extract other info
-    extraction_prompt = f"""Analyze this conversation and extract car dealership lead information.
-Return ONLY a JSON object with these fields (use null if not mentioned):
-- name: person's full name
-- vehicle_type: type of vehicle (sedan, SUV, truck, EV, crossover, etc.)
-- make_model_preference: specific make/model mentioned (e.g., "Toyota RAV4", "Ford F-150")
-- new_or_used: preference for new, used, certified pre-owned, or either
-- budget_range: price range mentioned (e.g., "Under $20k", "$20k-$35k", "$35k-$50k", "$50k+")
-- trade_in: whether they have a trade-in vehicle (yes/no/maybe)
-- financing_needed: financing or cash purchase preference
-- priorities: what's important to them (safety, fuel economy, cargo space, towing, technology, etc.)
-
-Conversation:
-{json.dumps(conversation_history, indent=2)}
-
-JSON only, no explanation:"""
-
+# Fields the LLM extracts (email/phone always come from the rules)
+LEAD_FIELD_DESCRIPTIONS = {
+    "name": "person's full name",
+    "vehicle_type": "type of vehicle (sedan, SUV, truck, EV, crossover, etc.)",
+    "make_model_preference": 'specific make/model mentioned (e.g., "Toyota RAV4", "Ford F-150")',
+    "new_or_used": "preference for new, used, certified pre-owned, or either",
+    "budget_range": 'price range mentioned (e.g., "Under $20k", "$20k-$35k", "$35k-$50k", "$50k+")',
+    "trade_in": "whether they have a trade-in vehicle (yes/no/maybe)",
+    "financing_needed": "financing or cash purchase preference",
+    "priorities": "what's important to them (safety, fuel economy, cargo space, towing, technology, etc.)",
+}
+LEAD_FIELD_LIST = "\n".join(f"- {field}: {description}" for field, description in LEAD_FIELD_DESCRIPTIONS.items())
+
+# Single-call mode: the reply and the lead fields come back from one structured completion
+SINGLE_CALL_EXTRACTION = os.getenv("SINGLE_CALL_EXTRACTION", "false").lower() == "true"
+TURN_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "assistant_turn",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "reply": {"type": "string", "description": "Your message to the customer"},
+                "lead": {
+                    "type": "object",
+                    "description": "Lead details stated in the customer's newest message (null if not mentioned)",
+                    "properties": {
+                        field: {"type": ["string", "null"], "description": description}
+                        for field, description in LEAD_FIELD_DESCRIPTIONS.items()
+                    },
+                    "required": list(LEAD_FIELD_DESCRIPTIONS),
+                    "additionalProperties": False,
+                },
+            },
+            "required": ["reply", "lead"],
+            "additionalProperties": False,
+        },
+    },
+}
+SINGLE_CALL_INSTRUCTIONS = """
+
+RESPONSE FORMAT:
+Return JSON with "reply" (your message to the customer) and "lead" (the lead fields the customer
+states in their newest message, null for anything not mentioned there)."""
+
+def new_lead_data():
+    """Empty lead record with every qualification field unset"""
+    return {field: None for field in QUALIFICATION_QUESTIONS}
+
+def extract_lead_info(user_message, lead_data=None, previous_assistant_message=None):
+    """Update the session's lead information (in place) from the newest user message"""
+    if lead_data is None:
+        lead_data = new_lead_data()
+
+    # Precompiled patterns and keyword tables first (email, phone, budget, vehicle, ...)
+    rule_fields, needs_llm = extract_with_rules(user_message, previous_assistant_message)
+    # Rules only fill unset fields; one that disagrees with an earlier turn goes to the LLM
+    needs_llm = merge_rule_fields(lead_data, rule_fields) or needs_llm
+    record_extraction(needs_llm)
+    if not needs_llm:
+        return lead_data
+
+    # Use LLM only for what the rules couldn't classify
     try:
         response = openai_client.chat.completions.create(
             model="gpt-4o-mini",
-            messages=[{"role": "user", "content": extraction_prompt}],
+            messages=[{"role": "user", "content": build_extraction_prompt(user_message, lead_data, previous_assistant_message)}],
             temperature=0,
             response_format={"type": "json_object"}
         )
-        extracted = json.loads(response.choices[0].message.content)
-        lead_data.update({k: v for k, v in extracted.items() if v})
+        merge_lead_fields(lead_data, json.loads(response.choices[0].message.content))
     except:
         pass
 
     return lead_data
 
+def build_extraction_prompt(user_message, lead_data, previous_assistant_message=None):
+    """Extraction prompt that stays the same size every turn: known fields, the assistant's
+    last message (context for short answers like "yes") and the new message - never the whole transcript"""
+    known_fields = {k: v for k, v in lead_data.items() if v}
+    assistant_context = f"Assistant's previous message:\n{previous_assistant_message}\n\n" if previous_assistant_message else ""
+
+    return f"""Update car dealership lead information from the customer's newest message.
+Return ONLY a JSON object with these fields (use null if not mentioned in the new message):
+{LEAD_FIELD_LIST}
+
+Already known (only return a field again if the customer changes it):
+{json.dumps(known_fields)}
+
+{assistant_context}Customer's newest message:
+{user_message}
+
+JSON only, no explanation:"""
+
+def merge_lead_fields(lead_data, extracted):
+    """Copy non-empty extracted values for known lead fields into lead_data"""
+    lead_data.update({k: v for k, v in extracted.items() if v and k in lead_data})
+
 def calculate_qualification_score(lead_data):
     """Calculate lead qualification score 0-100"""
     score = 0
@@ -165,94 +247,153 @@ def calculate_qualification_score(lead_data):
 
     return score
 
-def save_lead(lead_data, conversation_history, session_id):
-    """Save qualified lead to database (only once per session)"""
-    try:
-        score = calculate_qualification_score(lead_data)
-
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+# If session_id already exists, update the lead instead of inserting a duplicate.
+# Only scalar columns are written (the transcript lives in conversation_messages) and
+# only what the caller needs comes back: (xmax = 0) is true only for a fresh insert.
+# An update that would change nothing is skipped by the WHERE clause (no new row
+# version) and returns no row. A new lead queues its notification email in the
+# lead_notifications outbox within the same statement (see notification_worker.py)
+UPSERT_LEAD_SQL = """
+    WITH lead AS (
+        INSERT INTO leads (
+            session_id, name, email, phone_number, vehicle_type, make_model_preference,
+            new_or_used, budget_range, trade_in, financing_needed, priorities,
+            qualification_score
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (session_id) DO UPDATE SET
+            name = EXCLUDED.name,
+            email = EXCLUDED.email,
+            phone_number = EXCLUDED.phone_number,
+            vehicle_type = EXCLUDED.vehicle_type,
+            make_model_preference = EXCLUDED.make_model_preference,
+            new_or_used = EXCLUDED.new_or_used,
+            budget_range = EXCLUDED.budget_range,
+            trade_in = EXCLUDED.trade_in,
+            financing_needed = EXCLUDED.financing_needed,
+            priorities = EXCLUDED.priorities,
+            qualification_score = EXCLUDED.qualification_score,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE (
+            leads.name, leads.email, leads.phone_number, leads.vehicle_type, leads.make_model_preference,
+            leads.new_or_used, leads.budget_range, leads.trade_in, leads.financing_needed, leads.priorities,
+            leads.qualification_score
+        ) IS DISTINCT FROM (
+            EXCLUDED.name, EXCLUDED.email, EXCLUDED.phone_number, EXCLUDED.vehicle_type, EXCLUDED.make_model_preference,
+            EXCLUDED.new_or_used, EXCLUDED.budget_range, EXCLUDED.trade_in, EXCLUDED.financing_needed, EXCLUDED.priorities,
+            EXCLUDED.qualification_score
+        )
+        RETURNING id, (xmax = 0) AS inserted
+    ), outbox AS (
+        INSERT INTO lead_notifications (lead_id)
+        SELECT id FROM lead WHERE inserted
+    )
+    SELECT id, inserted FROM lead;
+"""
+
+# Append-only transcript: re-sent messages are ignored thanks to UNIQUE (session_id, seq)
+APPEND_MESSAGES_SQL = """
+    INSERT INTO conversation_messages (session_id, seq, role, content, created_at)
+    VALUES %s
+    ON CONFLICT (session_id, seq) DO NOTHING;
+"""
+
+def lead_upsert_params(lead_data, session_id):
+    """Parameters for UPSERT_LEAD_SQL, in placeholder order"""
+    return (
+        session_id,
+        lead_data.get('name'),
+        lead_data.get('email'),
+        lead_data.get('phone_number'),
+        lead_data.get('vehicle_type'),
+        lead_data.get('make_model_preference'),
+        lead_data.get('new_or_used'),
+        lead_data.get('budget_range'),
+        lead_data.get('trade_in'),
+        lead_data.get('financing_needed'),
+        lead_data.get('priorities'),
+        calculate_qualification_score(lead_data)
+    )
 
-        # Use INSERT ... ON CONFLICT to prevent duplicates per session
-        # If session_id already exists, update the conversation history
-        cur.execute("""
-            INSERT INTO leads (
-                session_id, name, email, phone_number, vehicle_type, make_model_preference,
-                new_or_used, budget_range, trade_in, financing_needed, priorities,
-                qualification_score, conversation_history
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (session_id) DO UPDATE SET
-                name = EXCLUDED.name,
-                email = EXCLUDED.email,
-                phone_number = EXCLUDED.phone_number,
-                vehicle_type = EXCLUDED.vehicle_type,
-                make_model_preference = EXCLUDED.make_model_preference,
-                new_or_used = EXCLUDED.new_or_used,
-                budget_range = EXCLUDED.budget_range,
-                trade_in = EXCLUDED.trade_in,
-                financing_needed = EXCLUDED.financing_needed,
-                priorities = EXCLUDED.priorities,
-                conversation_history = EXCLUDED.conversation_history,
-                qualification_score = EXCLUDED.qualification_score,
-                updated_at = CURRENT_TIMESTAMP
-            RETURNING *, (xmax = 0) AS inserted;
-        """, (
+def message_rows(conversation_history, session_id, after_seq=-1):
+    """conversation_messages rows for the messages after after_seq (newest are at the end)"""
+    rows = []
+    for i in range(len(conversation_history) - 1, -1, -1):
+        message = conversation_history[i]
+        seq = message.get("seq", i)
+        if seq <= after_seq:
+            break
+        rows.append((
             session_id,
-            lead_data.get('name'),
-            lead_data.get('email'),
-            lead_data.get('phone_number'),
-            lead_data.get('vehicle_type'),
-            lead_data.get('make_model_preference'),
-            lead_data.get('new_or_used'),
-            lead_data.get('budget_range'),
-            lead_data.get('trade_in'),
-            lead_data.get('financing_needed'),
-            lead_data.get('priorities'),
-            score,
-            json.dumps(conversation_history)
+            seq,
+            message["role"],
+            message["content"],
+            datetime.fromisoformat(message["timestamp"]) if message.get("timestamp") else datetime.utcnow()
         ))
+    rows.reverse()
+    return rows
+
+def plan_lead_write(lead_data, conversation_history, session_id):
+    """(upsert params or None when the lead is unchanged since the last write, message rows to append)"""
+    params = lead_upsert_params(lead_data, session_id)
+    fingerprint, last_seq = persisted_leads.get(session_id)
+    return (params if params != fingerprint else None), message_rows(conversation_history, session_id, last_seq)
+
+def record_lead_write(session_id, params, rows):
+    """Remember what is now stored for the session once the write committed"""
+    fingerprint, last_seq = persisted_leads.get(session_id)
+    persisted_leads.put(
+        session_id,
+        params if params is not None else fingerprint,
+        rows[-1][1] if rows else last_seq
+    )
+    persisted_leads.record(params is not None, bool(rows))
 
-        result = cur.fetchone()
-        conn.commit()
-
-        cur.close()
-        conn.close()
-
-        return dict(result) if result else None
+def save_lead(lead_data, conversation_history, session_id):
+    """Save qualified lead to database (only once per session) and append new messages"""
+    try:
+        params, rows = plan_lead_write(lead_data, conversation_history, session_id)
+        result = None
+        if params is not None or rows:
+            with db_connection() as conn:
+                cur = conn.cursor(cursor_factory=RealDictCursor)
+
+                # Use INSERT ... ON CONFLICT to prevent duplicates per session
+                if params is not None:
+                    cur.execute(UPSERT_LEAD_SQL, params)
+                    result = cur.fetchone()
+
+                if rows:
+                    execute_values(cur, APPEND_MESSAGES_SQL, rows)
+                conn.commit()
+
+                cur.close()
+        record_lead_write(session_id, params, rows)
+
+        # No row back: the lead was already stored with exactly these values
+        return dict(result) if result else {"id": None, "inserted": False}
     except Exception as e:
         print(f"Error saving lead: {e}")
         import traceback
         traceback.print_exc()
         return None
 
-def chat(user_message, conversation_history=None, session_id=None):
-    """Enhanced chat with lead qualification"""
-    
-    if conversation_history is None:
-        conversation_history = []
-    
-    print(f"\n🧑 User: {user_message}")
-    
-    # Get relevant context
-    context_docs = get_relevant_context(user_message)
-    
+def format_context(context_docs):
+    """Knowledge base excerpts for the system prompt"""
     if context_docs:
-        context = "\n\n".join([
+        print(f"📚 Found {len(context_docs)} relevant sources")
+        return "\n\n".join([
             f"Source: {doc['title']}\n{doc['content']}"
             for doc in context_docs
         ])
-        print(f"📚 Found {len(context_docs)} relevant sources")
-    else:
-        context = "No specific information found."
-        print("⚠️  No relevant sources found")
-    
-    # Extract current lead info
-    lead_data = extract_lead_info(conversation_history + [{"role": "user", "content": user_message}])
+    print("⚠️  No relevant sources found")
+    return "No specific information found."
+
+def build_system_prompt(lead_data, context):
+    """System prompt with qualification guidance"""
     missing_info = [k for k, v in lead_data.items() if v is None]
-    
-    # Build system prompt with qualification guidance
-    system_prompt = f"""You are a helpful AI assistant for Mendieta Auto Group, a car dealership.
+
+    return f"""You are a helpful AI assistant for Mendieta Auto Group, a car dealership.
 
 Your PRIMARY GOALS:
 1. Answer questions about vehicles, services, inventory, and financing using the context provided
@@ -275,59 +416,271 @@ Context from knowledge base:
 
 Be friendly, enthusiastic about helping them find the right vehicle, and focused on understanding their transportation needs."""
 
-    # Build messages
-    messages = [{"role": "system", "content": system_prompt}]
-    messages.extend(conversation_history)
-    messages.append({"role": "user", "content": user_message})
-    
-    # Get response
-    response = openai_client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
-        temperature=0.7,
-        max_tokens=500
-    )
-    
-    assistant_message = response.choices[0].message.content
-    print(f"\n🤖 Mendieta Auto: {assistant_message}")
-    
-    # Update conversation history
+def parse_turn_response(message, lead_data):
+    """Reply from a single-call completion message, merging its lead fields into lead_data.
+    None when the model refused or the JSON is unusable (e.g. cut off at max_tokens)"""
+    if getattr(message, "refusal", None) or not message.content:
+        return None
+    try:
+        parsed = json.loads(message.content)
+        reply, extracted = parsed["reply"], parsed.get("lead") or {}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+    if not isinstance(reply, str) or not reply.strip():
+        return None
+    if isinstance(extracted, dict):
+        merge_lead_fields(lead_data, extracted)
+    return reply
+
+# Lead details that make a turn personal: a reply may repeat them back ("Thanks, John!"),
+# so such turns are neither served from nor stored in the shared response cache
+PERSONAL_LEAD_FIELDS = ("name", "email", "phone_number", "budget_range", "trade_in")
+
+def is_personal_turn(rule_fields, needs_llm, lead_data):
+    """Whether the message (or the session's lead so far) carries personal lead details"""
+    # needs_llm: something like "my name is bob" that only the LLM pass can resolve
+    return needs_llm or any(rule_fields.get(field) or lead_data.get(field) for field in PERSONAL_LEAD_FIELDS)
+
+def _response_cache_key(user_message, conversation_history):
+    """(embedding, kb_version) for a cacheable first turn, or None"""
+    if not RESPONSE_CACHE_ENABLED or conversation_history:
+        return None
+    try:
+        # Served from the embedding cache again when retrieval needs it
+        return embed_query(openai_client, user_message), get_kb_version()
+    except Exception as e:
+        print(f"⚠️  Response cache unavailable: {e}")
+        return None
+
+def append_turn(conversation_history, user_message, assistant_message):
+    """Record a user/assistant exchange in the conversation history"""
+    # seq numbers messages across the whole conversation, even after history trimming
+    seq = conversation_history[-1].get("seq", len(conversation_history) - 1) + 1 if conversation_history else 0
     conversation_history.append({
         "role": "user", 
         "content": user_message,
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": datetime.utcnow().isoformat(),
+        "seq": seq
     })
     conversation_history.append({
         "role": "assistant", 
         "content": assistant_message,
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": datetime.utcnow().isoformat(),
+        "seq": seq + 1
     })
-    
-    # Save conversation (optional - implement if needed)
-    # Note: Session persistence can be added to PostgreSQL if required
-    
-    # Check if lead is qualified
+
+def is_qualified(lead_data):
+    """Leads are saved once they score 60+ and have an email to follow up on"""
     score = calculate_qualification_score(lead_data)
     if score >= 60 and lead_data.get("email"):
         print(f"\n🎯 QUALIFIED LEAD! Score: {score}/100")
-        saved_lead = save_lead(lead_data, conversation_history, session_id)
-        if saved_lead:
-            # Only send email if this is a NEW lead (inserted=True)
-            # The 'inserted' field tells us if it was an INSERT or UPDATE
-            if saved_lead.get('inserted', False):
-                print(f"✅ New lead saved to database with ID: {saved_lead['id']}")
-                send_lead_notification(saved_lead)
-            else:
-                print(f"✅ Lead {saved_lead['id']} updated (no duplicate email sent)") 
+        return True
+    return False
+
+def persist_qualified_lead(lead_data, conversation_history, session_id):
+    """Save the lead once it qualifies and notify sales about new leads"""
+    try:
+        if is_qualified(lead_data):
+            saved_lead = save_lead(lead_data, conversation_history, session_id)
+            if saved_lead:
+                # Only NEW leads (inserted=True) have a notification queued in the outbox
+                # The 'inserted' field tells us if it was an INSERT or UPDATE
+                if saved_lead.get('inserted', False):
+                    print(f"✅ New lead saved to database with ID: {saved_lead['id']} (notification queued)")
+                    if NOTIFY_INLINE:
+                        drain_notifications(limit=1, lead_id=saved_lead['id'])
+                elif saved_lead['id']:
+                    print(f"✅ Lead {saved_lead['id']} updated (no duplicate email sent)")
+    except Exception as e:
+        print(f"❌ Error persisting lead: {e}")
+
+def last_assistant_message(conversation_history):
+    return next(
+        (msg["content"] for msg in reversed(conversation_history) if msg["role"] == "assistant"),
+        None
+    )
+
+def build_messages(system_prompt, conversation_history, user_message):
+    messages = [{"role": "system", "content": system_prompt}]
+    messages.extend({"role": msg["role"], "content": msg["content"]} for msg in conversation_history)
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+def format_sources(context_docs):
+    """Title/url pairs of the documents a response was grounded on"""
+    return [{"title": doc["title"], "url": doc.get("url")} for doc in context_docs]
+
+def _finish_turn(user_message, assistant_message, conversation_history, lead_data, session_id,
+                 cache_key=None, context_docs=None):
+    """Cache the answer, record the turn and hand the lead off for persistence"""
+    print(f"\n🤖 Mendieta Auto: {assistant_message}")
+    
+    if cache_key:
+        response_cache.store(cache_key[0], user_message, assistant_message, cache_key[1])
+    
+    # Update conversation history
+    append_turn(conversation_history, user_message, assistant_message)
+    
+    # Lead persistence and notification happen off the critical path; snapshots
+    # keep the next turn from mutating what is being saved
+    if BACKGROUND_POST_TURN:
+        _background_executor.submit(
+            persist_qualified_lead, dict(lead_data), list(conversation_history), session_id
+        )
+    else:
+        persist_qualified_lead(lead_data, conversation_history, session_id)
     
     # Show sources
     if context_docs:
         print("\n📎 Sources:")
         for doc in context_docs:
             print(f"  • {doc['title']}")
+
+def _cached_response(user_message, conversation_history, lead_data):
+    """(cache key, cached answer or None) for history-free FAQ questions without personal details"""
+    if not RESPONSE_CACHE_ENABLED or conversation_history:
+        return None, None
+    rule_fields, needs_llm = extract_with_rules(user_message)
+    if is_personal_turn(rule_fields, needs_llm, lead_data):
+        return None, None
+    cache_key = _response_cache_key(user_message, conversation_history)
+    if cache_key:
+        cached = response_cache.lookup(*cache_key)
+        if cached:
+            print(f"⚡ Response cache hit (matched: {cached['question']})")
+            # Preferences stated in a cached turn ("used SUVs?") still reach the lead
+            merge_rule_fields(lead_data, rule_fields)
+            record_extraction(False)
+            return cache_key, cached["answer"]
+    return cache_key, None
+
+def chat(user_message, conversation_history=None, session_id=None, lead_data=None):
+    """Enhanced chat with lead qualification (lead_data is the session's lead state, updated in place)"""
+    
+    if conversation_history is None:
+        conversation_history = []
+    if lead_data is None:
+        lead_data = new_lead_data()
+    
+    print(f"\n🧑 User: {user_message}")
+    
+    # History-free FAQ questions can be answered from the semantic response cache
+    cache_key, cached_answer = _cached_response(user_message, conversation_history, lead_data)
+    if cached_answer:
+        _finish_turn(user_message, cached_answer, conversation_history, lead_data, session_id)
+        return cached_answer, conversation_history
+    
+    # Retrieval and lead extraction don't depend on each other: run them concurrently
+    # so the turn waits for the slower of the two instead of their sum
+    previous_assistant_message = last_assistant_message(conversation_history)
+    if SINGLE_CALL_EXTRACTION:
+        # Only the cheap rules run up front; the main completion returns the rest
+        merge_rule_fields(lead_data, extract_with_rules(user_message, previous_assistant_message)[0])
+        context_docs = get_relevant_context(user_message)
+    else:
+        context_future = _turn_executor.submit(get_relevant_context, user_message)
+        extraction_future = _turn_executor.submit(
+            extract_lead_info, user_message, lead_data, previous_assistant_message
+        )
+        context_docs = context_future.result()
+        extraction_future.result()
+
+    system_prompt = build_system_prompt(lead_data, format_context(context_docs))
+    if SINGLE_CALL_EXTRACTION:
+        system_prompt += SINGLE_CALL_INSTRUCTIONS
+
+    # Build messages
+    messages = build_messages(system_prompt, conversation_history, user_message)
+    
+    # Get response
+    assistant_message = None
+    if SINGLE_CALL_EXTRACTION:
+        response = openai_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=700,  # room for the lead JSON alongside the reply
+            response_format=TURN_RESPONSE_FORMAT
+        )
+        assistant_message = parse_turn_response(response.choices[0].message, lead_data)
+        if assistant_message is None:
+            # Refused or truncated: redo the turn the two-call way rather than show raw JSON
+            print("⚠️  Structured reply unusable, falling back to separate extraction")
+            extract_lead_info(user_message, lead_data, previous_assistant_message)
+            messages = build_messages(build_system_prompt(lead_data, format_context(context_docs)),
+                                      conversation_history, user_message)
+        else:
+            # No separate extraction call: the structured reply carried the remaining fields
+            record_extraction(False)
+    if assistant_message is None:
+        response = openai_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500
+        )
+        assistant_message = response.choices[0].message.content
+    
+    _finish_turn(user_message, assistant_message, conversation_history, lead_data, session_id,
+                 cache_key, context_docs)
     
     return assistant_message, conversation_history
 
+def stream_chat(user_message, conversation_history=None, session_id=None, lead_data=None):
+    """Streaming variant of chat(): yields token events as they arrive, then a done event with sources"""
+    
+    if conversation_history is None:
+        conversation_history = []
+    if lead_data is None:
+        lead_data = new_lead_data()
+    
+    print(f"\n🧑 User: {user_message}")
+    
+    cache_key, cached_answer = _cached_response(user_message, conversation_history, lead_data)
+    if cached_answer:
+        _finish_turn(user_message, cached_answer, conversation_history, lead_data, session_id)
+        yield {"type": "token", "content": cached_answer}
+        yield {"type": "done", "sources": []}
+        return
+    
+    # The first token only waits for retrieval: the prompt uses the lead state from
+    # previous turns plus this message's rule hits, and the full extraction (LLM pass
+    # included, single-call mode or not) runs while the reply is being generated
+    previous_assistant_message = last_assistant_message(conversation_history)
+    prompt_lead = dict(lead_data)
+    merge_rule_fields(prompt_lead, extract_with_rules(user_message, previous_assistant_message)[0])
+    extraction_future = _turn_executor.submit(
+        extract_lead_info, user_message, lead_data, previous_assistant_message
+    )
+    context_docs = get_relevant_context(user_message)
+    
+    system_prompt = build_system_prompt(prompt_lead, format_context(context_docs))
+    messages = build_messages(system_prompt, conversation_history, user_message)
+    
+    stream = openai_client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        temperature=0.7,
+        max_tokens=500,
+        stream=True
+    )
+    parts = []
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        token = chunk.choices[0].delta.content
+        if token:
+            parts.append(token)
+            yield {"type": "token", "content": token}
+    assistant_message = "".join(parts)
+    
+    # Lead state must be complete before the turn is persisted
+    extraction_future.result()
+    _finish_turn(user_message, assistant_message, conversation_history, lead_data, session_id,
+                 cache_key, context_docs)
+    
+    yield {"type": "done", "sources": format_sources(context_docs)}
+
 def interactive_chat():
     """Interactive chat session"""
     import uuid
@@ -340,6 +693,7 @@ def interactive_chat():
     print("Type 'quit' to exit\n")
     
     conversation_history = []
+    lead_data = new_lead_data()
     
     while True:
         user_input = input("\n🧑 You: ").strip()
@@ -351,7 +705,7 @@ def interactive_chat():
         if not user_input:
             continue
         
-        _, conversation_history = chat(user_input, conversation_history, session_id)
+        _, conversation_history = chat(user_input, conversation_history, session_id, lead_data)
         print("\n" + "-" * 80)
 
 if __name__ == "__main__":
@@ -0,0 +1,183 @@
+import json
+import os
+import re
+from collections import deque
+
+from embedding_cache import estimate_tokens
+from kb_sync import chunk_key
+
+try:
+    import tiktoken
+except ImportError:  # optional: exact token counts instead of the byte-based estimate
+    tiktoken = None
+
+# Chunking of long sources (all optional, see .env.example)
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "400"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "cl100k_base")  # tiktoken encoding of the embedding models
+
+# Plain-text sources are keyed by their path relative to the project, whatever the working directory
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# A word with the whitespace before it, so joining pieces gives back the original text
+_PIECE_RE = re.compile(r"\s*\S+")
+_SENTENCE_END_RE = re.compile(r"[.!?:;][\"')\]]*$")
+
+
+def token_counter(encoding_name=CHUNK_TOKENIZER):
+    """text -> token count: tiktoken when installed, else a conservative estimate"""
+    if tiktoken is None:
+        return estimate_tokens
+    encoding = tiktoken.get_encoding(encoding_name)
+    return lambda text: len(encoding.encode_ordinary(text))
+
+
+def iter_pieces(lines):
+    """Words (with their leading whitespace) from an iterable of text, one line at a time"""
+    pending = ""
+    for line in lines:
+        text = pending + line
+        pieces = _PIECE_RE.findall(text)
+        # Trailing whitespace (blank lines = paragraph breaks) goes with the next word, and
+        # the last word may continue in the next line if this line was cut mid-word
+        pending = text[sum(map(len, pieces)):]
+        if pieces and not pending:
+            pending = pieces.pop()
+        yield from pieces
+    if pending.strip():
+        yield pending
+
+
+def split_pieces(pieces, max_tokens=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP_TOKENS, count_tokens=None):
+    """Yield chunk texts of at most max_tokens, each repeating ~overlap tokens of the previous one.
+
+    Holds one window of pieces at a time, so memory does not depend on the input size.
+    Chunks end at a sentence or paragraph break when one falls in the second half of the window.
+    """
+    count_tokens = count_tokens or token_counter()
+    overlap = min(overlap, max_tokens // 2)
+    window = deque()  # (piece, tokens)
+    size = 0
+    carried = 0  # pieces at the front of window that were already emitted (the overlap)
+
+    def cut():
+        """Emit the window up to the best break and keep up to overlap tokens of it"""
+        nonlocal size, carried
+        end = len(window)
+        running = 0
+        for i, (piece, tokens) in enumerate(window):
+            running += tokens
+            if running >= max_tokens / 2 and (_SENTENCE_END_RE.search(piece) or
+                                              (i + 1 < len(window) and "\n\n" in window[i + 1][0])):
+                end = i + 1
+        emitted = [window.popleft() for _ in range(end)]
+        carried = 0
+        kept = 0
+        while emitted and kept + emitted[-1][1] <= overlap:
+            piece, tokens = emitted.pop()
+            window.appendleft((piece, tokens))
+            kept += tokens
+            carried += 1
+        size = sum(tokens for _, tokens in window)
+        return "".join(piece for piece, _ in emitted + list(window)[:carried]).strip()
+
+    def flush():
+        nonlocal size, carried
+        text = "".join(piece for piece, _ in list(window)[carried:]).strip()
+        window.clear()
+        size = carried = 0
+        return text
+
+    for piece in pieces:
+        tokens = count_tokens(piece)
+        if tokens > max_tokens:
+            # A single huge "word" (URL, table row without spaces): split it by characters
+            text = flush()
+            if text:
+                yield text
+            step = max(1, len(piece) * max_tokens // tokens)
+            for start in range(0, len(piece), step):
+                if piece[start:start + step].strip():
+                    yield piece[start:start + step].strip()
+            continue
+
+        if size + tokens > max_tokens:
+            text = cut()
+            if text:
+                yield text
+        while size + tokens > max_tokens:
+            if carried:  # give up overlap before splitting unseen text further
+                size -= window.popleft()[1]
+                carried -= 1
+            else:
+                text = flush()
+                if text:
+                    yield text
+        window.append((piece, tokens))
+        size += tokens
+
+    text = flush()
+    if text:
+        yield text
+
+
+def chunk_document(document, lines=None, max_tokens=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP_TOKENS, count_tokens=None):
+    """Split one document ({"title", "content", "url", "category"}) into knowledge base chunks.
+
+    A document that already fits is passed through unchanged (same chunk key as before);
+    longer ones get keys "<document key>#<n>". lines streams the content instead of
+    document["content"].
+    """
+    count_tokens = count_tokens or token_counter()
+    if lines is None:
+        content = document["content"]
+        if count_tokens(content) <= max_tokens:
+            yield document
+            return
+        lines = [content]
+
+    key = chunk_key(document)
+    for n, text in enumerate(split_pieces(iter_pieces(lines), max_tokens, overlap, count_tokens)):
+        yield dict(document, content=text, chunk_key=f"{key}#{n}")
+
+
+def source_key(path):
+    """Stable key of a plain-text source: its normalised path relative to the project.
+
+    The directory is part of the key, so docs/ford/warranty.txt and docs/kia/warranty.txt
+    don't collide; files outside the project fall back to their absolute path.
+    """
+    path = os.path.abspath(path)
+    relative = os.path.relpath(path, PROJECT_DIR)
+    if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+        relative = path
+    return relative.replace(os.sep, "/")
+
+
+def iter_documents(path):
+    """(document, lines or None) pairs from a .jsonl, .json or .txt source, read lazily"""
+    if path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line), None
+    elif path.endswith(".json"):
+        # Small hand-written list of chunks (RAG/demo_content.json)
+        with open(path, "r", encoding="utf-8") as f:
+            for document in json.load(f):
+                yield document, None
+    else:
+        # Plain text (brochures, spec sheets, PDFs converted to text): one document per file
+        name = os.path.splitext(os.path.basename(path))[0]
+        document = {"title": name.replace("_", " ").replace("-", " ").strip().title(),
+                    "content": "", "url": None, "category": "document", "chunk_key": source_key(path)}
+        with open(path, "r", encoding="utf-8") as f:
+            yield document, f
+
+
+def iter_chunks(paths, max_tokens=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP_TOKENS):
+    """Knowledge base chunks from every source in paths, one at a time"""
+    count_tokens = token_counter()
+    for path in paths:
+        for document, lines in iter_documents(path):
+            yield from chunk_document(document, lines, max_tokens, overlap, count_tokens)
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Crawl a website (or its sitemap) into knowledge base documents for RAG/upload_to_db.py
+Usage: python crawler.py https://dealer.example.com/ [--output RAG/crawled.jsonl] [--sitemap]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from urllib.parse import urldefrag, urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+from bs4 import BeautifulSoup
+
+# Crawl limits (all optional, see .env.example)
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "16"))  # requests in flight overall
+CRAWL_PER_HOST = int(os.getenv("CRAWL_PER_HOST", "4"))  # requests in flight per host
+CRAWL_DELAY = float(os.getenv("CRAWL_DELAY", "0.1"))  # seconds between request starts per host
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "5000"))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", "20"))  # seconds
+CRAWL_CACHE_DIR = os.getenv(
+    "CRAWL_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".crawl_cache")
+)
+CRAWL_USER_AGENT = os.getenv("CRAWL_USER_AGENT", "ai-sales-assistant-crawler/1.0")
+
+_LOC_RE = re.compile(r"<loc>\s*([^<\s]+)\s*</loc>", re.IGNORECASE)
+_SKIP_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg", ".css", ".js", ".zip", ".mp4", ".ico")
+
+
+class PageCache:
+    """Raw pages on disk plus their validators and parsed result, keyed by sha256(url).
+
+    <digest>.html holds the last body; <digest>.json the ETag / Last-Modified
+    validators, a hash of the body, and the document and links parsed from it.
+    """
+
+    def __init__(self, directory=CRAWL_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url, suffix):
+        return os.path.join(self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest() + suffix)
+
+    def get(self, url):
+        try:
+            with open(self._path(url, ".json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url, entry, body=None):
+        if body is not None:
+            with open(self._path(url, ".html"), "wb") as f:
+                f.write(body)
+        # Write-then-rename so an interrupted crawl never leaves a half-written entry
+        path = self._path(url, ".json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(path + ".tmp", path)
+
+
+class HostLimiter:
+    """Per-host politeness: at most per_host requests in flight, starts spaced by delay seconds"""
+
+    def __init__(self, per_host=CRAWL_PER_HOST, delay=CRAWL_DELAY):
+        self.per_host = per_host
+        self.delay = delay
+        self._hosts = {}  # host -> [semaphore, start lock, next allowed start, delay]
+
+    def set_delay(self, host, delay):
+        self._state(host)[3] = max(self.delay, delay)
+
+    def _state(self, host):
+        if host not in self._hosts:
+            self._hosts[host] = [asyncio.Semaphore(self.per_host), asyncio.Lock(), 0.0, self.delay]
+        return self._hosts[host]
+
+    async def __call__(self, host, request):
+        state = self._state(host)
+        async with state[0]:
+            async with state[1]:
+                wait = state[2] - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                state[2] = time.monotonic() + state[3]
+            return await request()
+
+
+def parse_page(url, html):
+    """(document, links) from an HTML page: main text split into paragraphs, same-page links"""
+    soup = BeautifulSoup(html, "html.parser")
+    links = []
+    for anchor in soup.find_all("a", href=True):
+        link = urldefrag(urljoin(url, anchor["href"]))[0]
+        if link.startswith(("http://", "https://")):
+            links.append(link)
+
+    for tag in soup(["script", "style", "noscript", "nav", "header", "footer", "form", "svg"]):
+        tag.decompose()
+    heading = soup.find("h1")
+    title = (soup.title.get_text(" ", strip=True) if soup.title else "") or \
+        (heading.get_text(" ", strip=True) if heading else "") or url
+    root = soup.find("main") or soup.find("article") or soup.body or soup
+    blocks = [
+        re.sub(r"\s+", " ", block.get_text(" ", strip=True))
+        for block in root.find_all(["h1", "h2", "h3", "h4", "p", "li", "td", "dd", "blockquote"])
+    ]
+    content = "\n\n".join(block for block in blocks if block)
+    if not content:
+        content = re.sub(r"\s+", " ", root.get_text(" ", strip=True))
+
+    segments = [segment for segment in urlsplit(url).path.split("/") if segment]
+    category = segments[0].lower() if segments else "home"
+    return {"title": title, "content": content, "url": url, "category": category}, links
+
+
+def sitemap_urls(xml):
+    """Page (or nested sitemap) URLs listed in a sitemap document"""
+    return _LOC_RE.findall(xml)
+
+
+class Crawler:
+    """Bounded-concurrency async crawler with per-host limits and conditional requests.
+
+    Pages answered with 304, or whose body hash is unchanged, reuse the document and
+    links parsed last time, so a refresh only parses what changed.
+    """
+
+    def __init__(self, concurrency=CRAWL_CONCURRENCY, per_host=CRAWL_PER_HOST, delay=CRAWL_DELAY,
+                 max_pages=CRAWL_MAX_PAGES, cache=None, timeout=CRAWL_TIMEOUT, respect_robots=True,
+                 user_agent=CRAWL_USER_AGENT):
+        self.concurrency = concurrency
+        self.max_pages = max_pages
+        self.cache = cache or PageCache()
+        self.timeout = timeout
+        self.respect_robots = respect_robots
+        self.user_agent = user_agent
+        self.limiter = HostLimiter(per_host, delay)
+        self._robots = {}
+        self.stats = {"fetched": 0, "not_modified": 0, "unchanged": 0, "parsed": 0,
+                      "skipped": 0, "errors": 0}
+
+    async def _get(self, client, url, headers=None):
+        return await self.limiter(urlsplit(url).netloc, lambda: client.get(url, headers=headers or {}))
+
+    async def _allowed(self, client, url):
+        if not self.respect_robots:
+            return True
+        parts = urlsplit(url)
+        host = parts.netloc
+        if host not in self._robots:
+            self._robots[host] = asyncio.ensure_future(self._load_robots(client, f"{parts.scheme}://{host}"))
+        robots = await self._robots[host]
+        return robots is None or robots.can_fetch(self.user_agent, url)
+
+    async def _load_robots(self, client, origin):
+        try:
+            response = await self._get(client, origin + "/robots.txt")
+        except httpx.HTTPError:
+            return None
+        if response.status_code != 200:
+            return None
+        robots = RobotFileParser()
+        robots.parse(response.text.splitlines())
+        delay = robots.crawl_delay(self.user_agent)
+        if delay:
+            self.limiter.set_delay(urlsplit(origin).netloc, float(delay))
+        return robots
+
+    async def fetch(self, client, url):
+        """(document or None, links) for url, using the cache whenever the page is unchanged"""
+        cached = self.cache.get(url)
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = await self._get(client, url, headers)
+        if response.status_code == 304 and cached:
+            self.stats["not_modified"] += 1
+            return cached.get("document"), cached.get("links", [])
+        response.raise_for_status()
+        self.stats["fetched"] += 1
+
+        body = response.content
+        body_hash = hashlib.sha256(body).hexdigest()
+        entry = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "body_hash": body_hash,
+            "fetched_at": time.time(),
+        }
+        if cached and cached.get("body_hash") == body_hash:
+            # Server ignored the validators but the page is the same: keep the parse
+            self.stats["unchanged"] += 1
+            entry.update(document=cached.get("document"), links=cached.get("links", []))
+            self.cache.put(url, entry)
+            return entry["document"], entry["links"]
+
+        content_type = response.headers.get("Content-Type", "")
+        if "xml" in content_type or url.endswith(".xml"):
+            document, links = None, sitemap_urls(response.text)
+        elif "html" in content_type:
+            document, links = parse_page(url, response.text)
+        else:
+            document, links = None, []
+        self.stats["parsed"] += 1
+        entry.update(document=document, links=links)
+        self.cache.put(url, entry, body)
+        return document, links
+
+    def _in_scope(self, url, hosts):
+        parts = urlsplit(url)
+        return parts.netloc in hosts and not parts.path.lower().endswith(_SKIP_EXTENSIONS)
+
+    async def crawl(self, start_urls, follow_links=True):
+        """Yield the document of every page reachable from start_urls (same hosts only)"""
+        start_urls = list(start_urls)
+        hosts = {urlsplit(url).netloc for url in start_urls}
+        queue = asyncio.Queue()
+        results = asyncio.Queue()
+        seen = set()
+
+        def enqueue(url):
+            if url not in seen and len(seen) < self.max_pages and self._in_scope(url, hosts):
+                seen.add(url)
+                queue.put_nowait(url)
+
+        for url in start_urls:
+            enqueue(url)
+
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limits, follow_redirects=True,
+                                     headers={"User-Agent": self.user_agent}) as client:
+
+            async def worker():
+                while True:
+                    url = await queue.get()
+                    try:
+                        if not await self._allowed(client, url):
+                            self.stats["skipped"] += 1
+                            continue
+                        document, links = await self.fetch(client, url)
+                        sitemap = url.endswith(".xml")
+                        if follow_links or sitemap:
+                            for link in links:
+                                enqueue(link)
+                        if document and document["content"]:
+                            await results.put(document)
+                    except (httpx.HTTPError, ValueError) as e:
+                        self.stats["errors"] += 1
+                        print(f"⚠️  {url}: {e}")
+                    finally:
+                        queue.task_done()
+
+            workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+            done = asyncio.create_task(queue.join())
+            try:
+                while True:
+                    get_result = asyncio.create_task(results.get())
+                    finished, _ = await asyncio.wait({get_result, done}, return_when=asyncio.FIRST_COMPLETED)
+                    if get_result in finished:
+                        yield get_result.result()
+                        continue
+                    get_result.cancel()
+                    while not results.empty():
+                        yield results.get_nowait()
+                    break
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+
+async def crawl_to_jsonl(start_urls, output, follow_links=True, **options):
+    """Crawl start_urls and write one document per line to output; returns the crawl stats"""
+    crawler = Crawler(**options)
+    started = time.perf_counter()
+    count = 0
+    with open(output, "w", encoding="utf-8") as f:
+        async for document in crawler.crawl(start_urls, follow_links):
+            f.write(json.dumps(document) + "\n")
+            count += 1
+    elapsed = time.perf_counter() - started
+    print(f"🕸️  {count} documents in {elapsed:.1f}s: {crawler.stats}")
+    return crawler.stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", nargs="+", help="start page(s) or sitemap.xml URL(s)")
+    parser.add_argument("--output", default=os.path.join("RAG", "crawled.jsonl"), help="JSONL file to write")
+    parser.add_argument("--sitemap", action="store_true", help="only crawl pages listed in the sitemap(s)")
+    parser.add_argument("--concurrency", type=int, default=CRAWL_CONCURRENCY)
+    parser.add_argument("--per-host", type=int, default=CRAWL_PER_HOST)
+    parser.add_argument("--delay", type=float, default=CRAWL_DELAY, help="seconds between requests per host")
+    parser.add_argument("--max-pages", type=int, default=CRAWL_MAX_PAGES)
+    parser.add_argument("--ignore-robots", action="store_true")
+    args = parser.parse_args()
+
+    asyncio.run(crawl_to_jsonl(
+        args.urls,
+        args.output,
+        follow_links=not args.sitemap,
+        concurrency=args.concurrency,
+        per_host=args.per_host,
+        delay=args.delay,
+        max_pages=args.max_pages,
+        respect_robots=not args.ignore_robots,
+    ))
+    print(f"✅ Next: python RAG/upload_to_db.py {args.output}")
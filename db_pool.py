@@ -0,0 +1,215 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+from dotenv import load_dotenv
+from pgvector.psycopg2 import register_vector
+
+load_dotenv()
+
+# Pool sizing and recycling (all optional, see .env.example)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))  # seconds
+DB_POOL_MAX_IDLE_CHECK = float(os.getenv("DB_POOL_MAX_IDLE_CHECK", "30"))  # seconds
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # seconds
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available before the timeout"""
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 connection pool with health checks and lifetime recycling"""
+
+    def __init__(self, dsn, min_size=1, max_size=10, max_lifetime=1800,
+                 max_idle_check=30, timeout=10):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size: need 1 <= max_size and min_size <= max_size")
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.max_idle_check = max_idle_check
+        self.timeout = timeout
+
+        self._idle = deque()   # (conn, created_at, last_used_at)
+        self._created = {}     # id(conn) -> created_at for connections handed out
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        for _ in range(min_size):
+            conn = self._connect()
+            self._idle.append((conn, time.monotonic(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        """Open a new physical connection and register pgvector once"""
+        conn = psycopg2.connect(self.dsn)
+        register_vector(conn)
+        conn.commit()  # register_vector leaves a transaction open
+        return conn
+
+    def _is_healthy(self, conn, created_at, last_used_at):
+        """Check that an idle connection is open, young enough, and still answers"""
+        now = time.monotonic()
+        if conn.closed:
+            return False
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            return False
+        if now - last_used_at > self.max_idle_check:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1;")
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self):
+        """Borrow a connection, opening a new one if the pool is not at max_size"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed")
+
+                    if self._idle:
+                        # Taken out of the pool (still counted in _size) and checked below
+                        idle = self._idle.pop()
+                        break
+
+                    if self._size < self.max_size:
+                        self._size += 1
+                        idle = None
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                    self._cond.wait(remaining)
+
+            if idle is None:
+                break
+
+            # The health check (possibly a SELECT 1 round trip) runs outside the lock
+            # so a slow or dead connection doesn't block other borrowers
+            conn, created_at, last_used_at = idle
+            if self._is_healthy(conn, created_at, last_used_at):
+                with self._cond:
+                    self._created[id(conn)] = created_at
+                return conn
+            self._discard(conn)
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+
+        # Connect outside the lock so slow handshakes don't block other borrowers
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._created[id(conn)] = time.monotonic()
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool, discarding it if broken or expired"""
+        with self._cond:
+            created_at = self._created.pop(id(conn), time.monotonic())
+
+        if not discard and not conn.closed:
+            try:
+                status = conn.info.transaction_status
+                if status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        expired = self.max_lifetime and time.monotonic() - created_at > self.max_lifetime
+        with self._cond:
+            if discard or expired or conn.closed or self._closed:
+                self._discard(conn)
+                self._size -= 1
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that borrows a connection and always returns it"""
+        conn = self.getconn()
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.putconn(conn, discard=True)
+            raise
+        except Exception:
+            self.putconn(conn)
+            raise
+        else:
+            self.putconn(conn)
+
+    def closeall(self):
+        """Close every idle connection and refuse new borrows"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _, _ = self._idle.pop()
+                self._discard(conn)
+                self._size -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        """Current pool occupancy"""
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Get the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                database_url = os.getenv("DATABASE_URL")
+                if not database_url:
+                    raise ValueError("DATABASE_URL not found in environment variables")
+                _pool = ConnectionPool(
+                    database_url,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    max_lifetime=DB_POOL_MAX_LIFETIME,
+                    max_idle_check=DB_POOL_MAX_IDLE_CHECK,
+                    timeout=DB_POOL_TIMEOUT,
+                )
+    return _pool
+
+
+def db_connection():
+    """Borrow a pooled connection: `with db_connection() as conn: ...`"""
+    return get_pool().connection()
@@ -0,0 +1,161 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+# text-embedding-3 models can return shorter vectors; must match company_faq.embedding
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "86400"))  # seconds, 0 = never expire
+# Bulk embedding requests stay under the API's per-request limits (2048 inputs, 300k tokens)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "512"))
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "250000"))
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT_RE = re.compile(r"[\s?!.,;:]+$")
+
+
+def normalize_text(text):
+    """Normalize question text so trivial variations share a cache entry"""
+    text = _WHITESPACE_RE.sub(" ", text.strip().lower())
+    return _TRAILING_PUNCT_RE.sub("", text)
+
+
+class EmbeddingCache:
+    """Thread-safe LRU cache of query embeddings with TTL and hit/miss counters"""
+
+    def __init__(self, max_size=2048, ttl=86400):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (model, text) -> (embedding, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, text, model=EMBEDDING_MODEL):
+        """Return the cached embedding or None"""
+        key = (model, normalize_text(text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                embedding, stored_at = entry
+                if not self.ttl or time.monotonic() - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return embedding
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, text, embedding, model=EMBEDDING_MODEL):
+        key = (model, normalize_text(text))
+        with self._lock:
+            self._entries[key] = (embedding, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Process-wide cache shared by the chatbot and RAG scripts
+query_embedding_cache = EmbeddingCache(max_size=EMBEDDING_CACHE_SIZE, ttl=EMBEDDING_CACHE_TTL)
+
+
+def request_options(model, dimensions):
+    """Extra embeddings.create arguments: dimensions, for the models that support it"""
+    return {"dimensions": dimensions} if model.startswith("text-embedding-3") else {}
+
+
+def embed_query(client, text, model=EMBEDDING_MODEL, cache=query_embedding_cache, dimensions=EMBEDDING_DIMENSIONS):
+    """Embed a query with the given OpenAI client, consulting the cache first"""
+    cache_model = f"{model}:{dimensions}"
+    if cache is not None:
+        embedding = cache.get(text, cache_model)
+        if embedding is not None:
+            return embedding
+
+    response = client.embeddings.create(input=text, model=model, **request_options(model, dimensions))
+    embedding = response.data[0].embedding
+
+    if cache is not None:
+        cache.put(text, embedding, cache_model)
+    return embedding
+
+
+def shorten_embedding(embedding, dimensions):
+    """First dimensions values, re-normalized: what text-embedding-3 returns for that dimensions"""
+    vector = np.asarray(embedding, dtype=np.float32)[:dimensions]
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def estimate_tokens(text):
+    """Conservative token estimate (English averages ~4 bytes per token)"""
+    return len(text.encode("utf-8")) // 3 + 1
+
+
+def embedding_batches(texts, max_inputs=EMBEDDING_BATCH_SIZE, max_tokens=EMBEDDING_BATCH_TOKENS):
+    """Yield (start, end) ranges of texts that fit in one embeddings request"""
+    start = 0
+    tokens = 0
+    for i, text in enumerate(texts):
+        text_tokens = estimate_tokens(text)
+        if i > start and (i - start >= max_inputs or tokens + text_tokens > max_tokens):
+            yield start, i
+            start, tokens = i, 0
+        tokens += text_tokens
+    if start < len(texts):
+        yield start, len(texts)
+
+
+def embed_texts(client, texts, model=EMBEDDING_MODEL, max_inputs=EMBEDDING_BATCH_SIZE,
+                max_tokens=EMBEDDING_BATCH_TOKENS, dimensions=EMBEDDING_DIMENSIONS):
+    """Embed many texts with as few requests as the limits allow; results keep input order"""
+    embeddings = []
+    for start, end in embedding_batches(texts, max_inputs, max_tokens):
+        response = client.embeddings.create(input=texts[start:end], model=model,
+                                            **request_options(model, dimensions))
+        embeddings.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+    return embeddings
+
+
+async def embed_query_async(client, text, model=EMBEDDING_MODEL, cache=query_embedding_cache,
+                            dimensions=EMBEDDING_DIMENSIONS):
+    """embed_query for an AsyncOpenAI client (same cache)"""
+    cache_model = f"{model}:{dimensions}"
+    if cache is not None:
+        embedding = cache.get(text, cache_model)
+        if embedding is not None:
+            return embedding
+
+    response = await client.embeddings.create(input=text, model=model, **request_options(model, dimensions))
+    embedding = response.data[0].embedding
+
+    if cache is not None:
+        cache.put(text, embedding, cache_model)
+    return embedding
@@ -0,0 +1,140 @@
+import hashlib
+import os
+import re
+import threading
+
+import numpy as np
+
+from embedding_cache import EMBEDDING_DIMENSIONS
+
+# On-disk embedding store for ingestion and benchmarks (see .env.example)
+EMBEDDING_STORE = os.getenv("EMBEDDING_STORE", "true").lower() == "true"
+EMBEDDING_STORE_DIR = os.getenv(
+    "EMBEDDING_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".embedding_store")
+)
+
+DIGEST_SIZE = 32  # sha256
+
+
+def text_digest(text):
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingStore:
+    """Append-only embeddings for one (model, dimensions), keyed by sha256(text).
+
+    Two files per model: <name>.f32 holds the vectors as contiguous float32 rows and
+    <name>.idx the 32-byte digest of row i at offset 32 * i. Opening reads only the
+    digests; vectors are served from a read-only memmap, so a lookup touches just the
+    rows it needs. Meant for one writer at a time (an ingestion run or a benchmark).
+    """
+
+    def __init__(self, model, dimensions, directory=EMBEDDING_STORE_DIR):
+        self.model = model
+        self.dimensions = dimensions
+        name = f"{re.sub(r'[^A-Za-z0-9_.-]', '_', model)}-{dimensions}"
+        self.vectors_path = os.path.join(directory, f"{name}.f32")
+        self.index_path = os.path.join(directory, f"{name}.idx")
+        self.row_bytes = 4 * dimensions
+        self._lock = threading.Lock()
+        self._matrix = None
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._rows, self._count = self._load_index()
+
+    def _load_index(self):
+        """(digest -> row, row count), dropping a partially written tail left by an interrupted run"""
+        index_size = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else 0
+        vectors_size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        count = min(index_size // DIGEST_SIZE, vectors_size // self.row_bytes)
+        for path, size in ((self.index_path, count * DIGEST_SIZE), (self.vectors_path, count * self.row_bytes)):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                os.truncate(path, size)
+
+        rows = {}
+        if count:
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+            for row in range(count):
+                rows.setdefault(data[row * DIGEST_SIZE:(row + 1) * DIGEST_SIZE], row)
+        return rows, count
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _vectors(self):
+        if self._matrix is None or len(self._matrix) < self._count:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self._count, self.dimensions))
+        return self._matrix
+
+    def get_many(self, texts):
+        """Stored embedding (float32 array) for each text, or None where it is missing"""
+        with self._lock:
+            rows = [self._rows.get(text_digest(text)) for text in texts]
+            found = sum(1 for row in rows if row is not None)
+            self.hits += found
+            self.misses += len(rows) - found
+            if not found:
+                return [None] * len(texts)
+            matrix = self._vectors()
+            return [None if row is None else np.array(matrix[row]) for row in rows]
+
+    def put_many(self, texts, embeddings):
+        """Append embeddings for texts not stored yet"""
+        with self._lock:
+            digests, vectors, seen = [], [], set()
+            for text, embedding in zip(texts, embeddings):
+                digest = text_digest(text)
+                if digest in self._rows or digest in seen:
+                    continue
+                seen.add(digest)
+                vector = np.asarray(embedding, dtype=np.float32)
+                if vector.shape != (self.dimensions,):
+                    raise ValueError(f"Expected {self.dimensions} dimensions, got {vector.shape}")
+                digests.append(digest)
+                vectors.append(vector)
+            if not digests:
+                return 0
+
+            # Vectors first: a crash in between leaves only an unindexed tail, dropped on open
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.stack(vectors).tobytes())
+            with open(self.index_path, "ab") as f:
+                f.write(b"".join(digests))
+            for digest in digests:
+                self._rows[digest] = self._count
+                self._count += 1
+            return len(digests)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "model": self.model,
+                "dimensions": self.dimensions,
+                "entries": len(self._rows),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def open_embedding_store(model, dimensions=EMBEDDING_DIMENSIONS):
+    """EmbeddingStore for model, or None when EMBEDDING_STORE is off"""
+    if not EMBEDDING_STORE:
+        return None
+    return EmbeddingStore(model, dimensions)
+
+
+def embed_with_store(texts, embed, store=None):
+    """embed(texts) for only the texts store does not have yet; results keep input order"""
+    if store is None:
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in embed(texts)]
+
+    embeddings = store.get_many(texts)
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        fresh = embed([texts[i] for i in missing])
+        store.put_many([texts[i] for i in missing], fresh)
+        for i, vector in zip(missing, fresh):
+            embeddings[i] = vector
+    return [np.asarray(vector, dtype=np.float32).tolist() for vector in embeddings]
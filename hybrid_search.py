@@ -0,0 +1,68 @@
+import os
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from db_pool import db_connection
+
+# Hybrid lexical + vector retrieval (all optional, see .env.example)
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "10"))  # results per list before fusion
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+# Normalized ts_rank_cd (0-1) at which a keyword match is trusted without embedding the question
+HYBRID_LEXICAL_CONFIDENCE = float(os.getenv("HYBRID_LEXICAL_CONFIDENCE", "0.5"))
+# Head start of the keyword query: a confident match within it skips the embedding call,
+# otherwise the embedding request goes out while the keyword query finishes
+HYBRID_LEXICAL_WAIT = float(os.getenv("HYBRID_LEXICAL_WAIT", "0.05"))  # seconds
+
+
+def lexical_search(question, limit=HYBRID_CANDIDATES):
+    """Full-text search over company_faq.search_tsv (see search_company_faq_text in RAG/init_db.py)"""
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute("SELECT * FROM search_company_faq_text(%s, %s);", (question, limit))
+            results = [dict(row, similarity=None) for row in cur.fetchall()]
+            cur.close()
+            conn.rollback()
+        return results
+    except psycopg2.Error as e:
+        # Databases that haven't re-run init_db.py yet have no search_tsv column
+        print(f"⚠️  Lexical search unavailable, using vector search only: {e}")
+        return []
+
+
+def is_confident_lexical(results, threshold=HYBRID_LEXICAL_CONFIDENCE):
+    """True when the best keyword hit matches every query term with a high rank"""
+    if not results:
+        return False
+    top = results[0]
+    return bool(top.get("matches_all")) and top.get("lexical_rank", 0) >= threshold
+
+
+def rrf_fuse(result_lists, limit=3, k=HYBRID_RRF_K):
+    """Reciprocal rank fusion: score(d) = sum over lists of 1 / (k + rank of d)"""
+    fused = {}
+    for results in result_lists:
+        for rank, row in enumerate(results, 1):
+            entry = fused.get(row["id"])
+            if entry is None:
+                entry = fused[row["id"]] = dict(row, rrf_score=0.0)
+            elif entry.get("similarity") is None and row.get("similarity") is not None:
+                entry["similarity"] = row["similarity"]
+            entry["rrf_score"] += 1.0 / (k + rank)
+
+    ranked = sorted(fused.values(), key=lambda row: row["rrf_score"], reverse=True)
+    return ranked[:limit]
+
+
+def fuse_hybrid(vector_results, lexical_results, limit=3):
+    """rrf_fuse of vector and keyword results that keeps off-topic questions context-free.
+
+    Keyword search matches ANY query term, so when no vector row passed the similarity
+    threshold only keyword rows that match every term are kept (a lone common word is
+    not evidence that the knowledge base covers the question).
+    """
+    if not vector_results:
+        lexical_results = [row for row in lexical_results if row.get("matches_all")]
+    return rrf_fuse([vector_results, lexical_results], limit=limit)
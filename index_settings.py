@@ -0,0 +1,246 @@
+import math
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from embedding_cache import EMBEDDING_DIMENSIONS
+
+load_dotenv()
+
+# Index selection (all optional, see .env.example)
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "auto").lower()  # auto | exact | ivfflat | hnsw
+EXACT_SCAN_MAX_ROWS = int(os.getenv("EXACT_SCAN_MAX_ROWS", "5000"))
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+INDEX_SETTINGS_TTL = float(os.getenv("INDEX_SETTINGS_TTL", "300"))  # seconds
+# Column type of company_faq.embedding: "vector" (float32) or "halfvec" (float16, pgvector 0.7+)
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "vector").lower()
+
+INDEX_NAME = "company_faq_embedding_idx"
+
+# Settings used when the database predates vector_index_settings (the old fixed index)
+LEGACY_SETTINGS = {"index_type": "ivfflat", "lists": 100, "probes": 100}
+
+CREATE_SETTINGS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS vector_index_settings (
+        table_name TEXT PRIMARY KEY,
+        index_type TEXT NOT NULL,
+        lists INT,
+        probes INT,
+        m INT,
+        ef_construction INT,
+        ef_search INT,
+        row_count INT,
+        built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+
+def choose_index_settings(row_count, index_type=None):
+    """Pick index type and parameters from the number of rows (pgvector guidance)"""
+    index_type = (index_type or VECTOR_INDEX_TYPE).lower()
+    if index_type == "auto":
+        index_type = "exact" if row_count < EXACT_SCAN_MAX_ROWS else "ivfflat"
+
+    if index_type == "exact":
+        return {"index_type": "exact", "row_count": row_count}
+
+    if index_type == "ivfflat":
+        # lists = rows / 1000 up to 1M rows, sqrt(rows) beyond; probes = sqrt(lists)
+        if row_count <= 1_000_000:
+            lists = max(1, row_count // 1000)
+        else:
+            lists = int(math.sqrt(row_count))
+        probes = max(1, round(math.sqrt(lists)))
+        return {"index_type": "ivfflat", "lists": lists, "probes": probes, "row_count": row_count}
+
+    if index_type == "hnsw":
+        return {
+            "index_type": "hnsw",
+            "m": HNSW_M,
+            "ef_construction": HNSW_EF_CONSTRUCTION,
+            "ef_search": HNSW_EF_SEARCH,
+            "row_count": row_count,
+        }
+
+    raise ValueError(f"Unknown VECTOR_INDEX_TYPE: {index_type}")
+
+
+def embedding_column_type(storage=None, dimensions=None):
+    """SQL type of company_faq.embedding for a storage mode, e.g. halfvec(512)"""
+    storage = (storage or EMBEDDING_STORAGE).lower()
+    if storage not in ("vector", "halfvec"):
+        raise ValueError(f"Unknown EMBEDDING_STORAGE: {storage}")
+    return f"{storage}({int(dimensions or EMBEDDING_DIMENSIONS)})"
+
+
+def cosine_ops(column_type):
+    """Operator class for cosine-distance indexes on a vector or halfvec column"""
+    return "halfvec_cosine_ops" if column_type.startswith("halfvec") else "vector_cosine_ops"
+
+
+CURRENT_COLUMN_TYPE_SQL = """
+    SELECT format_type(atttypid, atttypmod)
+    FROM pg_attribute
+    WHERE attrelid = 'company_faq'::regclass AND attname = 'embedding' AND NOT attisdropped;
+"""
+
+
+def current_column_type(cur):
+    """Type company_faq.embedding actually has, e.g. vector(1536)"""
+    cur.execute(CURRENT_COLUMN_TYPE_SQL)
+    row = cur.fetchone()
+    return list(row.values())[0] if isinstance(row, dict) else row[0]
+
+
+def match_function_sql(column_type):
+    """match_company_faq for the given embedding column type.
+
+    The query embedding arrives as a plain vector and is cast to the column type,
+    so callers send the same parameter whatever the storage mode.
+    """
+    return f"""
+        CREATE OR REPLACE FUNCTION match_company_faq(
+            query_embedding vector,
+            match_threshold float DEFAULT 0.5,
+            match_count int DEFAULT 3
+        )
+        RETURNS TABLE (
+            id int,
+            title text,
+            content text,
+            excerpt text,
+            url text,
+            metadata jsonb,
+            similarity float
+        )
+        LANGUAGE sql STABLE
+        AS $$
+            -- Plain SQL (not plpgsql) so the planner can inline it into the caller
+            SELECT
+                company_faq.id,
+                company_faq.title,
+                company_faq.content,
+                company_faq.excerpt,
+                company_faq.url,
+                company_faq.metadata,
+                (1 - (company_faq.embedding <=> query_embedding::{column_type}))::float AS similarity
+            FROM company_faq
+            WHERE 1 - (company_faq.embedding <=> query_embedding::{column_type}) > match_threshold
+            ORDER BY company_faq.embedding <=> query_embedding::{column_type}
+            LIMIT match_count;
+        $$;
+    """
+
+
+def create_index_sql(settings, ops="vector_cosine_ops"):
+    """CREATE INDEX statement for the chosen settings (None for exact scan)"""
+    if settings["index_type"] == "ivfflat":
+        return (
+            f"CREATE INDEX {INDEX_NAME} ON company_faq "
+            f"USING ivfflat (embedding {ops}) WITH (lists = {int(settings['lists'])});"
+        )
+    if settings["index_type"] == "hnsw":
+        return (
+            f"CREATE INDEX {INDEX_NAME} ON company_faq "
+            f"USING hnsw (embedding {ops}) "
+            f"WITH (m = {int(settings['m'])}, ef_construction = {int(settings['ef_construction'])});"
+        )
+    return None
+
+
+def build_vector_index(cur, index_type=None):
+    """(Re)build the company_faq vector index for the current row count and record the settings"""
+    cur.execute(CREATE_SETTINGS_TABLE_SQL)
+    cur.execute("SELECT COUNT(*) FROM company_faq WHERE embedding IS NOT NULL;")
+    row_count = cur.fetchone()[0]
+    settings = choose_index_settings(row_count, index_type)
+
+    cur.execute(f"DROP INDEX IF EXISTS {INDEX_NAME};")
+    statement = create_index_sql(settings, cosine_ops(current_column_type(cur)))
+    if statement:
+        cur.execute(statement)
+
+    cur.execute("""
+        INSERT INTO vector_index_settings (
+            table_name, index_type, lists, probes, m, ef_construction, ef_search, row_count, built_at
+        )
+        VALUES ('company_faq', %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (table_name) DO UPDATE SET
+            index_type = EXCLUDED.index_type,
+            lists = EXCLUDED.lists,
+            probes = EXCLUDED.probes,
+            m = EXCLUDED.m,
+            ef_construction = EXCLUDED.ef_construction,
+            ef_search = EXCLUDED.ef_search,
+            row_count = EXCLUDED.row_count,
+            built_at = EXCLUDED.built_at;
+    """, (
+        settings["index_type"],
+        settings.get("lists"),
+        settings.get("probes"),
+        settings.get("m"),
+        settings.get("ef_construction"),
+        settings.get("ef_search"),
+        row_count,
+    ))
+    return settings
+
+
+SETTINGS_COLUMNS = ["index_type", "lists", "probes", "m", "ef_construction", "ef_search", "row_count"]
+SETTINGS_TABLE_EXISTS_SQL = "SELECT to_regclass('vector_index_settings') IS NOT NULL;"
+SELECT_SETTINGS_SQL = f"""
+    SELECT {", ".join(SETTINGS_COLUMNS)}
+    FROM vector_index_settings
+    WHERE table_name = 'company_faq';
+"""
+
+_cached_settings = None
+_cached_at = 0.0
+_cache_lock = threading.Lock()
+
+
+def cached_index_settings(max_age=INDEX_SETTINGS_TTL):
+    """Settings from the in-process cache, or None once they are older than max_age seconds"""
+    if _cached_settings is not None and time.monotonic() - _cached_at < max_age:
+        return _cached_settings
+    return None
+
+
+def remember_index_settings(settings):
+    """Cache settings read from the database (None falls back to LEGACY_SETTINGS)"""
+    global _cached_settings, _cached_at
+    _cached_settings = settings or LEGACY_SETTINGS
+    _cached_at = time.monotonic()
+    return _cached_settings
+
+
+def load_index_settings(cur, max_age=INDEX_SETTINGS_TTL):
+    """Settings recorded by build_vector_index, cached in-process for max_age seconds"""
+    settings = cached_index_settings(max_age)
+    if settings is not None:
+        return settings
+
+    with _cache_lock:
+        cur.execute(SETTINGS_TABLE_EXISTS_SQL)
+        row = cur.fetchone()
+        exists = list(row.values())[0] if isinstance(row, dict) else row[0]
+        settings = None
+        if exists:
+            cur.execute(SELECT_SETTINGS_SQL)
+            row = cur.fetchone()
+            if row is not None:
+                settings = dict(row) if isinstance(row, dict) else dict(zip(SETTINGS_COLUMNS, row))
+        return remember_index_settings(settings)
+
+
+def search_settings_sql(settings):
+    """SET LOCAL statement matching the index, to prepend to the search query"""
+    if settings["index_type"] == "ivfflat" and settings.get("probes"):
+        return f"SET LOCAL ivfflat.probes = {int(settings['probes'])}; "
+    if settings["index_type"] == "hnsw" and settings.get("ef_search"):
+        return f"SET LOCAL hnsw.ef_search = {int(settings['ef_search'])}; "
+    return ""
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+from collections import Counter
+from itertools import islice
+
+from psycopg2.extras import execute_values
+
+# Chunks looked up, embedded and written per round trip (see .env.example)
+KB_SYNC_BATCH_SIZE = int(os.getenv("KB_SYNC_BATCH_SIZE", "500"))
+
+# Columns that make company_faq loads incremental (added by RAG/init_db.py)
+ADD_SYNC_COLUMNS_SQL = """
+    ALTER TABLE company_faq ADD COLUMN IF NOT EXISTS chunk_key TEXT;
+    ALTER TABLE company_faq ADD COLUMN IF NOT EXISTS content_hash TEXT;
+    ALTER TABLE company_faq ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+    CREATE UNIQUE INDEX IF NOT EXISTS company_faq_chunk_key_idx ON company_faq (chunk_key);
+"""
+
+EXISTING_CHUNKS_SQL = "SELECT chunk_key, content_hash FROM company_faq WHERE chunk_key = ANY(%s);"
+
+# Keys seen during this sync, kept server-side so memory stays flat however large the source is
+CREATE_SEEN_KEYS_SQL = "CREATE TEMP TABLE kb_sync_seen (chunk_key TEXT PRIMARY KEY) ON COMMIT DROP;"
+MARK_SEEN_SQL = "INSERT INTO kb_sync_seen (chunk_key) VALUES %s ON CONFLICT DO NOTHING RETURNING chunk_key;"
+
+# Rows whose text is unchanged are sent with a NULL embedding and keep the stored one;
+# rows where nothing at all changed are skipped by the WHERE clause (no dead tuple)
+UPSERT_CHUNKS_SQL = """
+    INSERT INTO company_faq (chunk_key, title, content, excerpt, url, embedding, metadata, content_hash)
+    VALUES %s
+    ON CONFLICT (chunk_key) DO UPDATE SET
+        title = EXCLUDED.title,
+        content = EXCLUDED.content,
+        excerpt = EXCLUDED.excerpt,
+        url = EXCLUDED.url,
+        embedding = COALESCE(EXCLUDED.embedding, company_faq.embedding),
+        metadata = EXCLUDED.metadata,
+        content_hash = EXCLUDED.content_hash,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE EXCLUDED.embedding IS NOT NULL
+       OR (company_faq.title, company_faq.content, company_faq.url, company_faq.metadata)
+          IS DISTINCT FROM (EXCLUDED.title, EXCLUDED.content, EXCLUDED.url, EXCLUDED.metadata)
+    RETURNING (xmax = 0) AS inserted;
+"""
+UPSERT_CHUNKS_TEMPLATE = "(%s, %s, %s, %s, %s, %s::vector, %s::jsonb, %s)"
+
+# Only run with prune=True: it removes every row not in this sync, so the sources passed
+# in must be the whole knowledge base. Also clears rows loaded before chunk keys existed
+DELETE_REMOVED_SQL = """
+    DELETE FROM company_faq
+    WHERE chunk_key IS NULL
+       OR NOT EXISTS (SELECT 1 FROM kb_sync_seen WHERE kb_sync_seen.chunk_key = company_faq.chunk_key);
+"""
+
+
+def chunk_key(chunk):
+    """Stable identity of a chunk across loads: its own chunk_key, else url + title"""
+    return chunk.get("chunk_key") or f"{chunk.get('url') or ''}#{chunk['title']}"
+
+
+def embedding_text(chunk):
+    """The text that is embedded for a chunk"""
+    return f"{chunk['title']}\n\n{chunk['content']}"
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def plan_sync(chunks, existing, full=False):
+    """Indexes of chunks that need embedding (new key or changed text).
+
+    existing maps chunk_key -> content_hash for what is in company_faq now.
+    """
+    keys = [chunk_key(chunk) for chunk in chunks]
+    duplicates = [key for key, count in Counter(keys).items() if count > 1]
+    if duplicates:
+        raise ValueError(f"Duplicate chunk keys: {sorted(duplicates)[:5]}")
+
+    return [
+        i for i, (chunk, key) in enumerate(zip(chunks, keys))
+        if full or existing.get(key) != content_hash(embedding_text(chunk))
+    ]
+
+
+def sync_batch(cur, chunks, embed, full=False):
+    """Upsert one batch of chunks, embedding only new or changed text"""
+    keys = [chunk_key(chunk) for chunk in chunks]
+    cur.execute(EXISTING_CHUNKS_SQL, (keys,))
+    to_embed = plan_sync(chunks, dict(cur.fetchall()), full)
+
+    seen = execute_values(cur, MARK_SEEN_SQL, [(key,) for key in keys], page_size=len(keys), fetch=True)
+    if len(seen) < len(keys):
+        raise ValueError(f"Duplicate chunk keys across the source ({len(keys) - len(seen)} in this batch)")
+
+    embeddings = {}
+    if to_embed:
+        vectors = embed([embedding_text(chunks[i]) for i in to_embed])
+        embeddings = {i: list(vector) for i, vector in zip(to_embed, vectors)}
+
+    rows = [
+        (
+            key,
+            chunk["title"],
+            chunk["content"],
+            chunk["content"][:200],  # First 200 chars as excerpt
+            chunk.get("url"),
+            embeddings.get(i),
+            json.dumps({"category": chunk.get("category")}),
+            content_hash(embedding_text(chunk)),
+        )
+        for i, (chunk, key) in enumerate(zip(chunks, keys))
+    ]
+    written = execute_values(cur, UPSERT_CHUNKS_SQL, rows, template=UPSERT_CHUNKS_TEMPLATE,
+                             page_size=len(rows), fetch=True)
+    inserted = sum(1 for row in written if row[0])
+    return {
+        "chunks": len(chunks),
+        "embedded": len(to_embed),
+        "inserted": inserted,
+        "updated": len(written) - inserted,
+        "unchanged": len(chunks) - len(written),
+    }
+
+
+def sync_chunks(cur, chunks, embed, full=False, batch_size=KB_SYNC_BATCH_SIZE, progress=None, prune=False):
+    """Upsert chunks (any iterable) into company_faq, embedding only new or changed text.
+
+    embed(texts) -> embeddings. Chunks are consumed batch_size at a time, so only one
+    batch is held in memory. Runs on the caller's transaction (commit afterwards).
+    progress(counts) is called after each batch. prune=True also deletes every row
+    that was not in chunks, so chunks must then be the complete knowledge base.
+    """
+    counts = {"chunks": 0, "embedded": 0, "inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+    cur.execute(CREATE_SEEN_KEYS_SQL)
+    chunks = iter(chunks)
+    while True:
+        batch = list(islice(chunks, batch_size))
+        if not batch:
+            break
+        for name, value in sync_batch(cur, batch, embed, full).items():
+            counts[name] += value
+        if progress:
+            progress(counts)
+
+    if prune:
+        cur.execute(DELETE_REMOVED_SQL)
+        counts["deleted"] = cur.rowcount
+    return counts
@@ -0,0 +1,382 @@
+import re
+import threading
+
+# Precompiled once at import instead of on every message
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+PHONE_PATTERN = re.compile(r'\b(?:\+?1[-.]?)?\(?([0-9]{3})\)?[-.]?([0-9]{3})[-.]?([0-9]{4})\b')
+
+# Lead-in is case-insensitive, the name itself must be capitalized ("I'm looking" is not a name).
+# Group 1 is an explicit lead-in; after "I'm" / "this is" the word must not be in NOT_NAMES
+NAME_PATTERN = re.compile(
+    r"\b(?i:(my name is|my name's|call me)|this is|i am|i'm|im)\s+"
+    r"([A-Z][a-zA-Z'-]+(?:\s+[A-Z][a-zA-Z'-]+)?)"
+)
+NAME_SIGNAL = re.compile(r"\b(my name|call me)\b", re.I)
+# Capitalized words that follow "I'm" / "this is" without being a name ("This is Great", "I'm Looking")
+NOT_NAMES = {
+    "a", "an", "the", "just", "not", "also", "still", "only", "really", "very", "so", "here", "there",
+    "back", "ready", "sure", "fine", "good", "great", "ok", "okay", "well", "glad", "happy", "excited",
+    "interested", "curious", "new", "open", "in", "on", "at", "from", "with", "after", "about", "into",
+    "currently", "actually", "definitely", "probably", "maybe", "it", "what", "why", "looking", "thinking",
+    "trying", "wondering", "shopping", "calling", "writing", "reaching", "hoping", "planning", "leaning",
+    "considering", "searching", "browsing",
+}
+
+# Amounts like "$30k", "30,000", "30 grand", "$25000"; mileage and monthly payments are excluded
+AMOUNT_PATTERN = re.compile(
+    r"(\$)?\s?(\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?)(?![\d,])\s*(k\b|thousand\b|grand\b)?"
+    r"(?!\s*(?:miles|mi\b|km|mpg|/mo|a month|per month|month))",
+    re.I
+)
+# An amount is only a budget with one of these in its clause ("around $30k", "30k is my budget")
+BUDGET_SIGNAL = re.compile(
+    r"\b(budget|afford|spend|spending|price range|under|around|about|max(?:imum)?|up to|"
+    r"no more than|less than|below|looking to pay)\b", re.I
+)
+# Amounts that are not the price of the car: down payments, rebates, weights, zip codes
+AMOUNT_SKIP_BEFORE = re.compile(
+    r"\b(zip|zip code|postal|down payment|rebate|discount|tow|tows|towing|payload|weighs)\b", re.I
+)
+AMOUNT_SKIP_AFTER = re.compile(
+    r"^\s*(down|off|rebate|discount|cash back|lbs?|pounds|tons?|miles|mi|km|hp|horsepower)\b", re.I
+)
+# Amounts that describe income rather than a price ("I make 60k a year")
+INCOME_BEFORE = re.compile(r"\b(make|making|earn|earning|income|salary|paid|take home)\b", re.I)
+INCOME_AFTER = re.compile(r"^\s*(a year|per year|annually|/\s?yr|a yr|salary|income)\b", re.I)
+
+# Negations in the same clause before a match ("not interested in leasing", "no trucks"),
+# or right after it ("leasing is not for me")
+NEGATION_BEFORE = re.compile(
+    r"n't\b|\b(no|not|never|without|dont|doesnt|wont|cant|instead of|rather than|other than|except)\b", re.I
+)
+NEGATION_AFTER = re.compile(
+    r"^\W*(?:is|are)?\s*(not for me|no thanks|out of the question|isn't|aren't|"
+    r"(?:does|do)n't matter|not important|not a (?:priority|concern))", re.I
+)
+CLAUSE_BREAK = re.compile(r"[.,;!?]|\b(?:but|and)\b", re.I)
+
+# Questions ask about inventory or policy ("Do you offer financing?", "How does trade-in work?");
+# they say nothing about what the customer wants, so preference rules skip them
+SENTENCE_PATTERN = re.compile(r"[^.!?\n]+[.!?]*")
+QUESTION_START = re.compile(
+    r"^\s*(do|does|did|is|are|was|were|can|could|will|would|should|how|what|which|when|where|why|who|"
+    r"any|have you|has)\b", re.I
+)
+
+# A car the customer already has ("I have a 2015 Civic"): a possible trade-in, not a preference
+OWNED_BEFORE = re.compile(
+    r"\b(i have|i've got|i own|i drive|i'm driving|currently (?:have|drive|own)|trade|trading)\b"
+    r"|\bmy\s+(?:current\s+|old\s+)?(?:\d{4}\s+)?$", re.I
+)
+
+NEW_OR_USED_RULES = [
+    (re.compile(r"\b(certified pre-?owned|cpo)\b", re.I), "certified pre-owned"),
+    (re.compile(r"\b(either|doesn't matter|don't mind|open to both)\b.*\b(new|used)\b|\bnew or used\b.*\b(either|both)\b", re.I), "either"),
+    (re.compile(r"\b(used|pre-?owned|second[- ]hand)\b", re.I), "used"),
+    (re.compile(r"\b(brand[- ]new|new (?:car|truck|suv|vehicle|one|model)s?|a new)\b", re.I), "new"),
+]
+
+VEHICLE_TYPES = [
+    (re.compile(r"\b(electric|evs?|battery[- ]powered)\b", re.I), "EV"),  # powertrains, see POWERTRAINS
+    (re.compile(r"\b(hybrids?|plug-in)\b", re.I), "hybrid"),
+    (re.compile(r"\b(pickups?|trucks?)\b", re.I), "truck"),
+    (re.compile(r"\b(suvs?)\b", re.I), "SUV"),
+    (re.compile(r"\b(crossovers?)\b", re.I), "crossover"),
+    (re.compile(r"\b(minivans?|vans?)\b", re.I), "minivan"),
+    (re.compile(r"\b(sedans?)\b", re.I), "sedan"),
+    (re.compile(r"\b(hatchbacks?)\b", re.I), "hatchback"),
+    (re.compile(r"\b(coupes?)\b", re.I), "coupe"),
+    (re.compile(r"\b(convertibles?)\b", re.I), "convertible"),
+    (re.compile(r"\b(wagons?)\b", re.I), "wagon"),
+]
+
+# A powertrain plus one body style is a single answer ("an electric SUV" -> EV)
+POWERTRAINS = {"EV", "hybrid"}
+
+MAKES = {
+    "toyota": "Toyota", "honda": "Honda", "ford": "Ford", "chevrolet": "Chevrolet", "chevy": "Chevrolet",
+    "ram": "Ram", "gmc": "GMC", "nissan": "Nissan", "subaru": "Subaru", "hyundai": "Hyundai", "kia": "Kia",
+    "jeep": "Jeep", "tesla": "Tesla", "mazda": "Mazda", "volkswagen": "Volkswagen", "vw": "Volkswagen",
+    "bmw": "BMW", "audi": "Audi", "mercedes": "Mercedes-Benz", "lexus": "Lexus", "acura": "Acura",
+    "dodge": "Dodge", "buick": "Buick", "cadillac": "Cadillac", "volvo": "Volvo",
+}
+MODELS = {
+    "rav4": "Toyota RAV4", "camry": "Toyota Camry", "corolla": "Toyota Corolla", "tacoma": "Toyota Tacoma",
+    "tundra": "Toyota Tundra", "highlander": "Toyota Highlander", "4runner": "Toyota 4Runner",
+    "cr-v": "Honda CR-V", "crv": "Honda CR-V", "civic": "Honda Civic", "accord": "Honda Accord",
+    "pilot": "Honda Pilot", "odyssey": "Honda Odyssey",
+    "f-150": "Ford F-150", "f150": "Ford F-150", "f-series": "Ford F-Series", "escape": "Ford Escape",
+    "explorer": "Ford Explorer", "bronco": "Ford Bronco", "mustang": "Ford Mustang", "maverick": "Ford Maverick",
+    "silverado": "Chevrolet Silverado", "equinox": "Chevrolet Equinox", "tahoe": "Chevrolet Tahoe",
+    "sierra": "GMC Sierra", "rogue": "Nissan Rogue", "altima": "Nissan Altima",
+    "outback": "Subaru Outback", "forester": "Subaru Forester", "tucson": "Hyundai Tucson",
+    "santa fe": "Hyundai Santa Fe", "telluride": "Kia Telluride", "grand cherokee": "Jeep Grand Cherokee",
+    "wrangler": "Jeep Wrangler", "model y": "Tesla Model Y", "model 3": "Tesla Model 3",
+    "cx-5": "Mazda CX-5", "cx5": "Mazda CX-5", "tiguan": "Volkswagen Tiguan",
+}
+MODEL_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(m) for m in sorted(MODELS, key=len, reverse=True)) + r")\b", re.I
+)
+MAKE_PATTERN = re.compile(r"\b(" + "|".join(MAKES) + r")\b", re.I)
+
+TRADE_SIGNAL = re.compile(r"\btrad(?:e|ing)[- ]?in\b|\btrade\b", re.I)
+TRADE_NO = re.compile(r"\b(no|not|don't|do not|won't|without)\b[^.?!]{0,25}\btrad", re.I)
+TRADE_MAYBE = re.compile(r"\b(maybe|might|possibly|thinking about|considering)\b[^.?!]{0,25}\btrad", re.I)
+
+FINANCING_RULES = [
+    (re.compile(r"\b(lease|leasing)\b", re.I), "lease"),
+    (re.compile(r"\b(pay(?:ing)? (?:in )?cash|cash buyer|pay in full|outright)\b", re.I), "cash"),
+    (re.compile(r"\b(financ(?:e|ing)|loan|monthly payments?|apr)\b", re.I), "finance"),
+]
+FINANCING_SIGNAL = re.compile(r"\b(cash|credit)\b", re.I)
+
+PRIORITIES = [
+    (re.compile(r"\b(safe|safety)\b", re.I), "safety"),
+    (re.compile(r"\b(fuel economy|fuel[- ]efficien\w*|mpg|gas mileage|good on gas)\b", re.I), "fuel economy"),
+    (re.compile(r"\b(cargo|trunk space|storage)\b", re.I), "cargo space"),
+    (re.compile(r"\b(tow|towing)\b", re.I), "towing"),
+    (re.compile(r"\b(tech|technology|infotainment|carplay)\b", re.I), "technology"),
+    (re.compile(r"\b(reliab\w*)\b", re.I), "reliability"),
+    (re.compile(r"\b(third[- ]row|seats? (?:seven|eight|7|8)|family)\b", re.I), "seating"),
+    (re.compile(r"\b(off[- ]road\w*|awd|all[- ]wheel|4x4)\b", re.I), "off-road/AWD"),
+    (re.compile(r"\b(comfort\w*)\b", re.I), "comfort"),
+    (re.compile(r"\b(performance|power\w*|fast)\b", re.I), "performance"),
+]
+
+# What the assistant just asked about; a reply that rules can't resolve goes to the LLM
+QUESTION_TOPICS = {
+    "name": re.compile(r"\byour name\b", re.I),
+    "budget_range": re.compile(r"\bbudget\b", re.I),
+    "trade_in": re.compile(r"\btrade", re.I),
+    "financing_needed": re.compile(r"\b(financ|cash)", re.I),
+    "new_or_used": re.compile(r"\b(new or used|pre-owned)\b", re.I),
+    "vehicle_type": re.compile(r"\b(type of vehicle|kind of vehicle|what kind)\b", re.I),
+    "make_model_preference": re.compile(r"\b(make or model|brand|specific model)\b", re.I),
+    "priorities": re.compile(r"\b(important to you|priorit)", re.I),
+}
+
+
+def _clause_before(message, start, width=40):
+    """Text of the same clause just before a match"""
+    return CLAUSE_BREAK.split(message[max(0, start - width):start])[-1]
+
+
+def _clause_after(message, end, width=30):
+    """Text of the same clause just after a match"""
+    return CLAUSE_BREAK.split(message[end:end + width])[0]
+
+
+def _is_negated(message, match):
+    """Whether a match is negated within its clause ("I don't want a used car")"""
+    return bool(NEGATION_BEFORE.search(_clause_before(message, match.start()))
+                or NEGATION_AFTER.search(_clause_after(message, match.end())))
+
+
+def _is_owned(message, match):
+    """Whether a vehicle match describes the customer's current car"""
+    return bool(OWNED_BEFORE.search(_clause_before(message, match.start())))
+
+
+def _statements(message):
+    """The message with question sentences blanked out"""
+    return "".join(
+        " " * len(sentence) if sentence.rstrip().endswith("?") or QUESTION_START.match(sentence) else sentence
+        for sentence in SENTENCE_PATTERN.findall(message)
+    )
+
+
+def _rule_values(message, rules, skip_owned=False):
+    """Values of the rules that match, in rule order, and whether any match was negated.
+
+    A match inside an earlier rule's match is part of that answer ("certified pre-owned" is not
+    also "used"), so it is skipped. With skip_owned, the customer's current car is skipped too.
+    """
+    values = []
+    spans = []
+    negated = False
+    for pattern, value in rules:
+        for match in pattern.finditer(message):
+            start, end = match.span()
+            if any(s <= start and end <= e for s, e in spans):
+                continue
+            if skip_owned and _is_owned(message, match):
+                continue
+            if _is_negated(message, match):
+                negated = True
+                continue
+            spans.append((start, end))
+            if value not in values:
+                values.append(value)
+    return values, negated
+
+
+def _single_value(message, rules, field, fields, unresolved):
+    """Record a field only when exactly one value matches and nothing was negated"""
+    values, negated = _rule_values(message, rules, skip_owned=field == "vehicle_type")
+    if field == "vehicle_type" and len(values) == 2 and values[0] in POWERTRAINS:
+        values = values[:1]
+    if negated or len(values) > 1:
+        unresolved.add(field)  # "no trucks, I want a sedan", "lease or finance": the LLM decides
+    elif values:
+        fields[field] = values[0]
+    return bool(values) or negated
+
+
+def _budget_bucket(message):
+    """Map the largest dollar amount mentioned to the budget ranges in QUALIFICATION_QUESTIONS.
+
+    Returns (bucket, whether an amount was skipped as income).
+    """
+    amounts = []
+    income = False
+    for match in AMOUNT_PATTERN.finditer(message):
+        dollar, number, suffix = match.groups()
+        value = float(number.replace(",", ""))
+        if suffix:
+            value *= 1000
+        elif not dollar and (value < 1000 or 1900 <= value <= 2100):
+            continue  # "2 kids", "a 2019 Camry" are not prices
+        before = _clause_before(message, match.start())
+        after = _clause_after(message, match.end())
+        if INCOME_BEFORE.search(before) or INCOME_AFTER.search(message[match.end():]):
+            income = True
+            continue
+        if AMOUNT_SKIP_BEFORE.search(before) or AMOUNT_SKIP_AFTER.search(after):
+            continue  # "$5,000 down", "the $2,000 rebate", "5000 lbs", "zip 90210"
+        if not (BUDGET_SIGNAL.search(before) or BUDGET_SIGNAL.search(after)):
+            continue
+        amounts.append(value)
+    if not amounts:
+        return None, income
+    top = max(amounts)
+    if top < 20000:
+        return "Under $20k", income
+    if top < 35000:
+        return "$20k-$35k", income
+    if top < 50000:
+        return "$35k-$50k", income
+    return "$50k+", income
+
+
+def extract_with_rules(message, previous_assistant_message=None):
+    """Rule-based lead extraction: (fields found, whether an LLM pass is still needed)"""
+    fields = {}
+    unresolved = set()
+
+    email_match = EMAIL_PATTERN.search(message)
+    if email_match:
+        fields["email"] = email_match.group(0)
+
+    phone_match = PHONE_PATTERN.search(message)
+    if phone_match:
+        fields["phone_number"] = phone_match.group(0)
+
+    for name_match in NAME_PATTERN.finditer(message):
+        explicit, name = name_match.groups()
+        first = name.split()[0].lower()
+        if not explicit and first in NOT_NAMES:
+            continue  # "This is Great", "I'm Looking"
+        if not explicit and first.endswith("ing"):
+            unresolved.add("name")  # "I'm Driving ..." or "I'm Ming": the LLM decides
+            continue
+        fields["name"] = name
+        break
+    if "name" not in fields and NAME_SIGNAL.search(message):
+        unresolved.add("name")
+
+    # Preferences only come from statements; phone numbers and emails contain digits
+    # that would otherwise read as prices
+    text = _statements(message)
+    budget_text = PHONE_PATTERN.sub(" ", EMAIL_PATTERN.sub(" ", text))
+    bucket, income = _budget_bucket(budget_text)
+    if bucket:
+        fields["budget_range"] = bucket
+    elif income or BUDGET_SIGNAL.search(budget_text):
+        unresolved.add("budget_range")
+
+    _single_value(text, NEW_OR_USED_RULES, "new_or_used", fields, unresolved)
+    _single_value(text, VEHICLE_TYPES, "vehicle_type", fields, unresolved)
+
+    preference = None
+    negated = False
+    for pattern, names in ((MODEL_PATTERN, MODELS), (MAKE_PATTERN, MAKES)):
+        for match in pattern.finditer(text):
+            if _is_owned(text, match):
+                continue  # "I have a 2015 Civic"
+            if _is_negated(text, match):
+                negated = True  # "I don't want a Ford"
+            elif preference is None:
+                preference = names[match.group(1).lower()]
+        if preference or negated:
+            break
+    if negated:
+        unresolved.add("make_model_preference")
+    elif preference:
+        fields["make_model_preference"] = preference
+
+    if TRADE_SIGNAL.search(text):
+        if TRADE_NO.search(text):
+            fields["trade_in"] = "no"
+        elif TRADE_MAYBE.search(text):
+            fields["trade_in"] = "maybe"
+        else:
+            fields["trade_in"] = "yes"
+
+    if not _single_value(text, FINANCING_RULES, "financing_needed", fields, unresolved):
+        if FINANCING_SIGNAL.search(text):
+            unresolved.add("financing_needed")
+
+    priorities, negated = _rule_values(text, PRIORITIES)
+    if negated:
+        unresolved.add("priorities")  # "towing doesn't matter"
+    elif priorities:
+        fields["priorities"] = ", ".join(priorities)
+
+    # A direct answer to the assistant's last question that the rules couldn't classify
+    if previous_assistant_message:
+        for field, pattern in QUESTION_TOPICS.items():
+            if field not in fields and pattern.search(previous_assistant_message):
+                unresolved.add(field)
+
+    return fields, bool(unresolved - set(fields))
+
+
+def merge_rule_fields(lead_data, rule_fields):
+    """Fill unset lead fields from the rules; True when a rule disagrees with a known value.
+
+    Rules never overwrite what an earlier turn established: a disagreement ("actually, a
+    used one") is left to the LLM pass, which sees the known fields.
+    """
+    conflict = False
+    for field, value in rule_fields.items():
+        current = lead_data.get(field)
+        if not current:
+            lead_data[field] = value
+        elif current != value:
+            conflict = True
+    return conflict
+
+
+_stats_lock = threading.Lock()
+_stats = {"messages": 0, "llm_calls": 0}
+
+
+def record_extraction(llm_called):
+    """Count extraction passes and how many needed the LLM"""
+    with _stats_lock:
+        _stats["messages"] += 1
+        if llm_called:
+            _stats["llm_calls"] += 1
+
+
+def extraction_stats():
+    """How often the extraction LLM call was avoided"""
+    with _stats_lock:
+        messages = _stats["messages"]
+        llm_calls = _stats["llm_calls"]
+    return {
+        "messages": messages,
+        "llm_calls": llm_calls,
+        "llm_avoided": messages - llm_calls,
+        "llm_avoided_rate": (messages - llm_calls) / messages if messages else 0.0,
+    }
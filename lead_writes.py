@@ -0,0 +1,66 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Sessions whose last persisted lead state is remembered (see .env.example)
+LEAD_FINGERPRINT_CACHE_SIZE = int(os.getenv("LEAD_FINGERPRINT_CACHE_SIZE", "10000"))
+
+
+class LeadWriteTracker:
+    """Bounded LRU of what was last written per session: (lead fingerprint, last message seq).
+
+    Lets save_lead skip the leads upsert when the fields and score are unchanged and
+    append only the messages after the last persisted seq. A forgotten session just
+    means one full write, which the SQL side de-duplicates.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # session_id -> (fingerprint, last_seq)
+        self._lock = threading.Lock()
+        self.upserts = 0
+        self.skipped_upserts = 0
+        self.message_appends = 0
+        self.skipped_writes = 0
+
+    def get(self, session_id):
+        """(fingerprint, last_seq) of the last write, or (None, -1) if unknown"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None, -1
+            self._entries.move_to_end(session_id)
+            return entry
+
+    def put(self, session_id, fingerprint, last_seq):
+        with self._lock:
+            self._entries[session_id] = (fingerprint, last_seq)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def record(self, upserted, appended):
+        """Count one persistence pass"""
+        with self._lock:
+            if upserted:
+                self.upserts += 1
+            else:
+                self.skipped_upserts += 1
+            if appended:
+                self.message_appends += 1
+            if not upserted and not appended:
+                self.skipped_writes += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tracked_sessions": len(self._entries),
+                "upserts": self.upserts,
+                "skipped_upserts": self.skipped_upserts,
+                "message_appends": self.message_appends,
+                "skipped_writes": self.skipped_writes,
+            }
+
+
+# Process-wide tracker shared by chatbot and async_chatbot
+persisted_leads = LeadWriteTracker(max_size=LEAD_FINGERPRINT_CACHE_SIZE)
@@ -0,0 +1,52 @@
+import hashlib
+import re
+from types import SimpleNamespace
+
+import numpy as np
+
+DEFAULT_DIMENSIONS = 1536
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _features(text):
+    """Word unigrams plus character trigrams, so related word forms share features"""
+    for word in _TOKEN_RE.findall(text.lower()):
+        yield word, 1.0
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            yield padded[i:i + 3], 0.5
+
+
+def hash_embedding(text, dimensions=DEFAULT_DIMENSIONS):
+    """Deterministic unit-length embedding built with the hashing trick (no network)"""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature, weight in _features(text):
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        sign = 1.0 if value & 1 else -1.0
+        vector[(value >> 1) % dimensions] += sign * weight
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector.tolist()
+
+
+class _LocalEmbeddings:
+    def create(self, input, model=None, dimensions=None, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        dimensions = dimensions or DEFAULT_DIMENSIONS
+        return SimpleNamespace(
+            model=model,
+            data=[
+                SimpleNamespace(index=i, embedding=hash_embedding(text, dimensions))
+                for i, text in enumerate(texts)
+            ],
+        )
+
+
+class LocalEmbeddingClient:
+    """Offline stand-in for OpenAI(): only client.embeddings.create is implemented"""
+
+    def __init__(self):
+        self.embeddings = _LocalEmbeddings()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Deliver queued lead notification emails from the lead_notifications outbox
+Usage: python notification_worker.py [--once]
+"""
+
+import argparse
+import os
+import random
+import time
+
+from dotenv import load_dotenv
+from psycopg2.extras import RealDictCursor
+
+from db_pool import db_connection
+from send_email import deliver_lead_notification
+
+load_dotenv()
+
+# Delivery and retry policy (all optional, see .env.example)
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "6"))
+NOTIFY_BACKOFF_BASE = float(os.getenv("NOTIFY_BACKOFF_BASE", "30"))  # seconds before the first retry
+NOTIFY_BACKOFF_MAX = float(os.getenv("NOTIFY_BACKOFF_MAX", "3600"))  # seconds
+NOTIFY_LEASE = float(os.getenv("NOTIFY_LEASE", "300"))  # seconds before a claimed job is considered abandoned
+NOTIFY_BATCH_SIZE = int(os.getenv("NOTIFY_BATCH_SIZE", "10"))
+NOTIFY_POLL_INTERVAL = float(os.getenv("NOTIFY_POLL_INTERVAL", "5"))  # seconds
+# Deliver a new lead's notification from the chat process (needed where no worker runs, e.g. Vercel);
+# only that lead's job is sent there, retries and other leads are left to the worker
+NOTIFY_INLINE = os.getenv("NOTIFY_INLINE", "true").lower() == "true"
+
+# One row per notification; written in the same statement as the lead insert (see chatbot.UPSERT_LEAD_SQL)
+CREATE_OUTBOX_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS lead_notifications (
+        id BIGSERIAL PRIMARY KEY,
+        lead_id INT NOT NULL REFERENCES leads(id) ON DELETE CASCADE,
+        status TEXT NOT NULL DEFAULT 'pending',  -- pending | sending | sent | failed
+        attempts INT NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        claimed_at TIMESTAMP,
+        sent_at TIMESTAMP,
+        provider_message_id TEXT,
+        last_error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS lead_notifications_due_idx
+        ON lead_notifications (next_attempt_at)
+        WHERE status IN ('pending', 'sending');
+"""
+
+# Due jobs plus jobs whose worker died mid-delivery; SKIP LOCKED lets several
+# workers (and inline drains) run side by side without double-sending
+CLAIM_SQL = """
+    UPDATE lead_notifications
+    SET status = 'sending', attempts = attempts + 1, claimed_at = CURRENT_TIMESTAMP
+    WHERE id IN (
+        SELECT id FROM lead_notifications
+        WHERE (status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP)
+           OR (status = 'sending' AND claimed_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+               AND attempts < %s)
+        ORDER BY next_attempt_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, lead_id, attempts;
+"""
+
+# The job just queued for one lead, claimed by the chat process that saved it (NOTIFY_INLINE)
+CLAIM_LEAD_SQL = """
+    UPDATE lead_notifications
+    SET status = 'sending', attempts = attempts + 1, claimed_at = CURRENT_TIMESTAMP
+    WHERE id IN (
+        SELECT id FROM lead_notifications
+        WHERE lead_id = %s AND status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP
+        ORDER BY id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, lead_id, attempts;
+"""
+
+# Abandoned jobs that have used up their attempts (e.g. one that keeps crashing the worker)
+EXPIRE_ABANDONED_SQL = """
+    UPDATE lead_notifications
+    SET status = 'failed', last_error = 'abandoned mid-delivery after ' || attempts || ' attempt(s)'
+    WHERE status = 'sending' AND claimed_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+      AND attempts >= %s;
+"""
+
+TRANSCRIPT_SQL = """
+    SELECT role, content, created_at AS timestamp
+    FROM conversation_messages
+    WHERE session_id = %s
+    ORDER BY seq;
+"""
+
+MARK_SENT_SQL = """
+    UPDATE lead_notifications
+    SET status = 'sent', sent_at = CURRENT_TIMESTAMP, provider_message_id = %s, last_error = NULL
+    WHERE id = %s;
+"""
+
+MARK_RETRY_SQL = """
+    UPDATE lead_notifications
+    SET status = 'pending', next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => %s), last_error = %s
+    WHERE id = %s;
+"""
+
+MARK_FAILED_SQL = """
+    UPDATE lead_notifications
+    SET status = 'failed', last_error = %s
+    WHERE id = %s;
+"""
+
+
+def backoff_delay(attempts, base=NOTIFY_BACKOFF_BASE, maximum=NOTIFY_BACKOFF_MAX):
+    """Exponential backoff with jitter: base * 2^(attempts - 1), capped, scaled by 0.5-1.0"""
+    delay = min(maximum, base * 2 ** max(attempts - 1, 0))
+    return delay * (0.5 + random.random() / 2)
+
+
+def retry_decision(attempts, error, max_attempts=NOTIFY_MAX_ATTEMPTS):
+    """("retry", delay) or ("failed", None) for a delivery attempt that raised error"""
+    if getattr(error, "retryable", True) and attempts < max_attempts:
+        return "retry", backoff_delay(attempts)
+    return "failed", None
+
+
+def claim_notifications(limit=NOTIFY_BATCH_SIZE, connection_factory=db_connection, lead_id=None):
+    """Claim due jobs (only lead_id's if given) and load what their emails need (lead row + transcript)"""
+    jobs = []
+    with connection_factory() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        if lead_id is None:
+            cur.execute(EXPIRE_ABANDONED_SQL, (NOTIFY_LEASE, NOTIFY_MAX_ATTEMPTS))
+            cur.execute(CLAIM_SQL, (NOTIFY_LEASE, NOTIFY_MAX_ATTEMPTS, limit))
+        else:
+            cur.execute(CLAIM_LEAD_SQL, (lead_id, limit))
+        for job in [dict(row) for row in cur.fetchall()]:
+            cur.execute("SELECT * FROM leads WHERE id = %s;", (job["lead_id"],))
+            row = cur.fetchone()
+            if row is None:
+                cur.execute(MARK_FAILED_SQL, ("lead no longer exists", job["id"]))
+                print(f"❌ Lead {job['lead_id']} no longer exists, notification {job['id']} dropped")
+                continue
+            lead = dict(row)
+            cur.execute(TRANSCRIPT_SQL, (lead["session_id"],))
+            lead["conversation_history"] = [dict(row) for row in cur.fetchall()] or lead.get("conversation_history")
+            job["lead"] = lead
+            jobs.append(job)
+        conn.commit()
+        cur.close()
+    return jobs
+
+
+def record_outcome(sql, params, connection_factory=db_connection):
+    """Commit one job's outcome right away, so a crash later in the batch can't re-send it"""
+    with connection_factory() as conn:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        conn.commit()
+        cur.close()
+
+
+def drain_notifications(limit=NOTIFY_BATCH_SIZE, connection_factory=db_connection, send=deliver_lead_notification,
+                        lead_id=None):
+    """Deliver one batch of due notifications (only lead_id's if given) and record the outcome of each"""
+    jobs = claim_notifications(limit, connection_factory, lead_id)
+    counts = {"claimed": len(jobs), "sent": 0, "retried": 0, "failed": 0}
+    if not jobs:
+        return counts
+
+    # No connection is held while Mailgun is being called
+    for job in jobs:
+        try:
+            message_id = send(job["lead"])
+        except Exception as e:
+            decision, delay = retry_decision(job["attempts"], e)
+            if decision == "retry":
+                record_outcome(MARK_RETRY_SQL, (delay, str(e), job["id"]), connection_factory)
+                counts["retried"] += 1
+                print(f"⚠️  Lead {job['lead_id']} notification attempt {job['attempts']} failed, retrying in {delay:.0f}s: {e}")
+            else:
+                record_outcome(MARK_FAILED_SQL, (str(e), job["id"]), connection_factory)
+                counts["failed"] += 1
+                print(f"❌ Lead {job['lead_id']} notification failed after {job['attempts']} attempt(s): {e}")
+            continue
+        record_outcome(MARK_SENT_SQL, (message_id, job["id"]), connection_factory)
+        counts["sent"] += 1
+        print(f"✅ Lead {job['lead_id']} notification sent (message {message_id})")
+    return counts
+
+
+def run_worker(poll_interval=NOTIFY_POLL_INTERVAL, once=False):
+    """Deliver notifications until interrupted (or until the outbox is empty with once=True)"""
+    print("📬 Notification worker started")
+    while True:
+        try:
+            counts = drain_notifications()
+        except Exception as e:
+            print(f"❌ Outbox error: {e}")
+            counts = {"claimed": 0}
+        if counts["claimed"]:
+            continue  # keep going while there is a backlog
+        if once:
+            return
+        time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--once", action="store_true", help="Exit once no notification is due")
+    args = parser.parse_args()
+    run_worker(once=args.once)
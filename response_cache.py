@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Semantic cache of answers to history-free (first turn) questions (see .env.example)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "true").lower() == "true"
+RESPONSE_CACHE_MAX_DISTANCE = float(os.getenv("RESPONSE_CACHE_MAX_DISTANCE", "0.05"))  # cosine distance
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "500"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))  # seconds, 0 = never expire
+
+
+class SemanticResponseCache:
+    """LRU cache of answers looked up by cosine distance between question embeddings"""
+
+    def __init__(self, max_size=500, ttl=3600, max_distance=0.05):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._entries = OrderedDict()  # key -> (unit vector, question, answer, stored_at)
+        self._matrix = None            # stacked unit vectors, rebuilt lazily after changes
+        self._keys = []
+        self._stored_at = None
+        self._next_key = 0
+        self._kb_version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_kb_version(self, kb_version):
+        """Drop everything when company_faq has been reloaded since the answers were cached"""
+        if kb_version != self._kb_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._matrix = None
+            self._kb_version = kb_version
+
+    def _rebuild(self):
+        self._keys = list(self._entries)
+        self._matrix = np.vstack([self._entries[key][0] for key in self._keys])
+        self._stored_at = np.array([self._entries[key][3] for key in self._keys])
+
+    def _drop_expired(self):
+        """Remove every entry older than ttl, so a stale nearest match can't hide a fresh one"""
+        if not self.ttl or not self._entries:
+            return
+        if self._matrix is None:
+            self._rebuild()
+        expired = np.flatnonzero(time.monotonic() - self._stored_at > self.ttl)
+        for index in expired:
+            del self._entries[self._keys[index]]
+        if expired.size:
+            self.expirations += int(expired.size)
+            self._matrix = None
+
+    def lookup(self, embedding, kb_version):
+        """Return the cached answer for the nearest fresh question within max_distance, or None"""
+        query = self._unit(embedding)
+        with self._lock:
+            self._check_kb_version(kb_version)
+            self._drop_expired()
+            if self._entries and self._matrix is None:
+                self._rebuild()
+
+            if self._entries:
+                similarities = self._matrix @ query
+                best = int(np.argmax(similarities))
+                if 1.0 - float(similarities[best]) <= self.max_distance:
+                    key = self._keys[best]
+                    _, question, answer, _ = self._entries[key]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return {"question": question, "answer": answer}
+
+            self.misses += 1
+            return None
+
+    def store(self, embedding, question, answer, kb_version):
+        with self._lock:
+            self._check_kb_version(kb_version)
+            self._entries[self._next_key] = (self._unit(embedding), question, answer, time.monotonic())
+            self._next_key += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self):
+        """Hit-rate metrics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Process-wide cache used by chatbot.chat
+response_cache = SemanticResponseCache(
+    max_size=RESPONSE_CACHE_SIZE,
+    ttl=RESPONSE_CACHE_TTL,
+    max_distance=RESPONSE_CACHE_MAX_DISTANCE,
+)
@@ -2,8 +2,19 @@ import os
 import json
 import requests
 
-def send_lead_notification(lead_data):
-    """Send email when lead is qualified using Mailgun API"""
+# Mailgun endpoint and request timeout (point MAILGUN_API_BASE at testing/mailgun_stub.py to test offline)
+DEFAULT_MAILGUN_API_BASE = "https://api.mailgun.net/v3"
+MAILGUN_TIMEOUT = float(os.getenv("MAILGUN_TIMEOUT", "10"))  # seconds
+
+class NotificationError(Exception):
+    """Mailgun could not be reached or rejected the message"""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+def build_lead_notification(lead_data):
+    """Mailgun request (url, auth, form data) for a qualified lead, or None if not configured"""
 
     # Mailgun configuration
     mailgun_domain = os.getenv("MAILGUN_DOMAIN")
@@ -13,8 +24,7 @@ def send_lead_notification(lead_data):
 
     # Validate configuration
     if not mailgun_domain or not mailgun_api_key:
-        print("❌ Mailgun configuration missing. Please set MAILGUN_DOMAIN and MAILGUN_API_KEY")
-        return
+        return None
 
     lead_name = lead_data.get('name', 'Unknown')
     subject = f"🎯 New Qualified Lead: {lead_name}"
@@ -75,7 +85,8 @@ Score: {lead_data.get('qualification_score')}/100
     """
 
     # Mailgun API endpoint
-    url = f"https://api.mailgun.net/v3/{mailgun_domain}/messages"
+    api_base = os.getenv("MAILGUN_API_BASE", DEFAULT_MAILGUN_API_BASE).rstrip("/")
+    url = f"{api_base}/{mailgun_domain}/messages"
 
     # Prepare the request
     data = {
@@ -85,18 +96,33 @@ Score: {lead_data.get('qualification_score')}/100
         "text": body
     }
 
-    try:
-        response = requests.post(
-            url,
-            auth=("api", mailgun_api_key),
-            data=data
+    return url, ("api", mailgun_api_key), data
+
+def deliver_lead_notification(lead_data, timeout=MAILGUN_TIMEOUT):
+    """POST the notification to Mailgun and return its message id (raises NotificationError)"""
+    request = build_lead_notification(lead_data)
+    if request is None:
+        raise NotificationError(
+            "Mailgun configuration missing. Please set MAILGUN_DOMAIN and MAILGUN_API_KEY", retryable=False
         )
+    url, auth, data = request
 
-        if response.status_code == 200:
-            print("✅ Email notification sent successfully!")
-            print(f"📧 Message ID: {response.json().get('id')}")
-        else:
-            print(f"❌ Email failed with status {response.status_code}")
-            print(f"Response: {response.text}")
-    except Exception as e:
-        print(f"❌ Email failed: {e}")
\ No newline at end of file
+    try:
+        response = requests.post(url, auth=auth, data=data, timeout=timeout)
+    except requests.RequestException as e:
+        raise NotificationError(f"Mailgun unreachable: {e}")
+
+    if response.status_code != 200:
+        # Client errors other than rate limiting won't succeed on retry
+        retryable = response.status_code == 429 or response.status_code >= 500
+        raise NotificationError(f"status {response.status_code}: {response.text[:500]}", retryable=retryable)
+    return response.json().get("id")
+
+def send_lead_notification(lead_data):
+    """Send email when lead is qualified using Mailgun API"""
+    try:
+        message_id = deliver_lead_notification(lead_data)
+        print("✅ Email notification sent successfully!")
+        print(f"📧 Message ID: {message_id}")
+    except NotificationError as e:
+        print(f"❌ Email failed: {e}")
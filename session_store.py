@@ -0,0 +1,259 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Bounds on the API's in-process sessions (all optional, see .env.example)
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "10000"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))  # seconds, 0 = never expire
+SESSION_HISTORY_LIMIT = int(os.getenv("SESSION_HISTORY_LIMIT", "40"))  # messages kept per session, 0 = all
+
+# "memory" keeps sessions in the worker only; "postgres" shares them through chat_sessions
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+# Check the cached copy against chat_sessions.version before each turn (needed without sticky routing)
+SESSION_REVALIDATE = os.getenv("SESSION_REVALIDATE", "true").lower() == "true"
+
+CREATE_SESSIONS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS chat_sessions (
+        session_id TEXT PRIMARY KEY,
+        history JSONB NOT NULL DEFAULT '[]'::jsonb,
+        lead JSONB NOT NULL DEFAULT '{}'::jsonb,
+        version INT NOT NULL DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+# Payload columns only come back when the caller's cached version is missing or stale
+LOAD_SESSION_SQL = """
+    SELECT version,
+           CASE WHEN version IS DISTINCT FROM $2 THEN history END AS history,
+           CASE WHEN version IS DISTINCT FROM $2 THEN lead END AS lead
+    FROM chat_sessions
+    WHERE session_id = $1;
+"""
+
+# A turn appends its messages and merges known lead fields: one statement, and
+# concurrent writers from other workers never overwrite each other. The stored history
+# is trimmed to the same window as SessionStore ($4 messages, whole exchanges, 0 = all),
+# so each append rewrites a bounded JSONB value instead of the ever-growing transcript
+APPEND_SESSION_SQL = """
+    INSERT INTO chat_sessions (session_id, history, lead)
+    VALUES ($1, $2::jsonb, $3::jsonb)
+    ON CONFLICT (session_id) DO UPDATE SET
+        history = (
+            SELECT COALESCE(jsonb_agg(t.message ORDER BY t.idx), '[]'::jsonb)
+            FROM (SELECT chat_sessions.history || EXCLUDED.history AS messages) AS merged
+            CROSS JOIN LATERAL (
+                SELECT GREATEST(jsonb_array_length(merged.messages) - $4::int, 0) AS excess
+            ) AS cut
+            CROSS JOIN LATERAL jsonb_array_elements(merged.messages) WITH ORDINALITY AS t(message, idx)
+            WHERE $4::int = 0 OR t.idx > cut.excess + cut.excess % 2
+        ),
+        lead = chat_sessions.lead || EXCLUDED.lead,
+        version = chat_sessions.version + 1,
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING version;
+"""
+
+
+def session_bytes(session):
+    """Approximate resident size of a session: message and lead strings plus container overhead"""
+    size = sys.getsizeof(session["history"]) + sys.getsizeof(session["lead"])
+    for message in session["history"]:
+        size += sys.getsizeof(message)
+        size += sum(sys.getsizeof(value) for value in message.values())
+    size += sum(sys.getsizeof(value) for value in session["lead"].values() if value is not None)
+    return size
+
+
+class SessionStore:
+    """LRU + idle-TTL bounded session_id -> {"history": [...], "lead": {...}} map.
+
+    Sessions are kept in least-recently-used order, so both the oldest idle session
+    and the LRU victim sit at the front: every operation evicts in O(1) amortized.
+    """
+
+    def __init__(self, new_lead, max_sessions=10000, idle_ttl=1800, history_limit=40):
+        self.new_lead = new_lead
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.history_limit = history_limit
+        self._sessions = OrderedDict()  # session_id -> [session, last_used_at, bytes]
+        self._lock = threading.Lock()
+        self.resident_bytes = 0
+        self.created = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.trimmed_messages = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def _expire(self, now):
+        """Drop idle sessions from the front of the LRU order"""
+        if not self.idle_ttl:
+            return
+        while self._sessions:
+            entry = next(iter(self._sessions.values()))
+            if now - entry[1] <= self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.resident_bytes -= entry[2]
+            self.expirations += 1
+
+    def _evict_overflow(self):
+        while len(self._sessions) > self.max_sessions:
+            _, entry = self._sessions.popitem(last=False)
+            self.resident_bytes -= entry[2]
+            self.evictions += 1
+
+    def get(self, session_id):
+        """Return the session and mark it as used, or None if unknown or expired"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            entry[1] = now
+            self._sessions.move_to_end(session_id)
+            return entry[0]
+
+    def get_or_create(self, session_id=None):
+        """Return (session_id, session), starting a new session when needed"""
+        session_id = session_id or str(uuid.uuid4())
+        session = self.get(session_id)
+        if session is None:
+            session = {"history": [], "lead": self.new_lead()}
+            self.save(session_id, session)
+            with self._lock:
+                self.created += 1
+        return session_id, session
+
+    def save(self, session_id, session):
+        """Store a session after a turn: trim its history and update the byte accounting"""
+        history = session["history"]
+        excess = 0
+        if self.history_limit and len(history) > self.history_limit:
+            # Drop whole user/assistant exchanges from the front
+            excess = len(history) - self.history_limit
+            excess += excess % 2
+            del history[:excess]
+
+        size = session_bytes(session)
+        now = time.monotonic()
+        with self._lock:
+            self.trimmed_messages += excess
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self.resident_bytes -= entry[2]
+            self._sessions[session_id] = [session, now, size]
+            self._sessions.move_to_end(session_id)
+            self.resident_bytes += size
+            self._expire(now)
+            self._evict_overflow()
+
+    def delete(self, session_id):
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is not None:
+                self.resident_bytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self.resident_bytes = 0
+
+    def stats(self):
+        """Session counts, evictions and approximate memory use"""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "created": self.created,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "trimmed_messages": self.trimmed_messages,
+                "resident_bytes": self.resident_bytes,
+            }
+
+
+class PostgresSessionStore:
+    """Sessions persisted in chat_sessions, with a SessionStore as read-through cache.
+
+    Any worker or serverless instance can pick up a conversation. Each cached session
+    carries the chat_sessions.version it reflects; a turn costs one small version check
+    (skipped with SESSION_REVALIDATE=false under sticky routing) and one append.
+    """
+
+    def __init__(self, cache, pool_factory, revalidate=True):
+        self.cache = cache
+        self.pool_factory = pool_factory
+        self.revalidate = revalidate
+        self.loads = 0
+        self.reloads = 0
+        self.writes = 0
+        self.stale_writes = 0
+
+    async def get_or_create(self, session_id=None):
+        """Return (session_id, session), loading it from chat_sessions when not cached or stale"""
+        session_id = session_id or str(uuid.uuid4())
+        session = self.cache.get(session_id)
+        if session is not None and not self.revalidate and session.get("version") is not None:
+            return session_id, session
+
+        cached_version = session.get("version") if session is not None else None
+        pool = await self.pool_factory()
+        row = await pool.fetchrow(LOAD_SESSION_SQL, session_id, cached_version)
+        self.loads += 1
+
+        if row is None:
+            if session is None:
+                _, session = self.cache.get_or_create(session_id)
+                session["version"] = 0
+            return session_id, session
+
+        if session is None or row["history"] is not None:
+            if session is not None:
+                self.reloads += 1
+            lead = self.cache.new_lead()
+            lead.update({k: v for k, v in json.loads(row["lead"]).items() if k in lead})
+            session = {"history": json.loads(row["history"]), "lead": lead, "version": row["version"]}
+            self.cache.save(session_id, session)
+        return session_id, session
+
+    async def save(self, session_id, session, new_messages):
+        """Append a turn's messages and the current lead fields, then refresh the cache"""
+        lead = {k: v for k, v in session["lead"].items() if v is not None}
+        pool = await self.pool_factory()
+        version = await pool.fetchval(
+            APPEND_SESSION_SQL, session_id, json.dumps(new_messages), json.dumps(lead),
+            self.cache.history_limit or 0,
+        )
+        self.writes += 1
+        expected = (session.get("version") or 0) + 1
+        if version != expected:
+            # Another worker wrote in between: our copy lacks its messages, reload next turn
+            self.stale_writes += 1
+            session["version"] = None
+        else:
+            session["version"] = version
+        self.cache.save(session_id, session)
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats.update({
+            "backend": "postgres",
+            "loads": self.loads,
+            "reloads": self.reloads,
+            "writes": self.writes,
+            "stale_writes": self.stale_writes,
+        })
+        return stats
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Mailgun messages API, for testing notifications offline
+Usage: python testing/mailgun_stub.py [--port 8025] [--fail-first 2] [--status 503]
+Then set MAILGUN_API_BASE=http://localhost:8025/v3 (any MAILGUN_DOMAIN / MAILGUN_API_KEY)
+"""
+
+import argparse
+import itertools
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class MailgunStub:
+    """Records POST /v3/<domain>/messages requests; the first fail_first ones get fail_status"""
+
+    def __init__(self, host="127.0.0.1", port=0, fail_first=0, fail_status=503):
+        self.messages = []
+        self.requests = 0
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def api_base(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v3"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                form = parse_qs(self.rfile.read(length).decode("utf-8"))
+                parts = self.path.strip("/").split("/")
+                with stub._lock:
+                    stub.requests += 1
+                    failing = stub.requests <= stub.fail_first
+                    if not failing and len(parts) == 3 and parts[2] == "messages":
+                        message_id = f"<stub-{next(stub._ids)}@{parts[1]}>"
+                        stub.messages.append({"domain": parts[1], "id": message_id, "form": form})
+
+                if failing:
+                    self._reply(stub.fail_status, {"message": "Stub failure"})
+                elif len(parts) != 3 or parts[2] != "messages":
+                    self._reply(404, {"message": "Not found"})
+                elif not self.headers.get("Authorization", "").startswith("Basic "):
+                    self._reply(401, {"message": "Forbidden"})
+                else:
+                    self._reply(200, {"id": message_id, "message": "Queued. Thank you."})
+
+            def _reply(self, status, body):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--fail-first", type=int, default=0, help="Fail this many requests before accepting")
+    parser.add_argument("--status", type=int, default=503, help="Status code returned for failures")
+    args = parser.parse_args()
+
+    stub = MailgunStub(port=args.port, fail_first=args.fail_first, fail_status=args.status)
+    print(f"📮 Mailgun stub listening on {stub.api_base}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
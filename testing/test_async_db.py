@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Tests for translating psycopg2 SQL to asyncpg
+Usage: python -m pytest testing/test_async_db.py
+"""
+
+from async_db import to_asyncpg_sql
+
+def test_placeholders_are_numbered_in_order():
+    assert to_asyncpg_sql("SELECT * FROM leads WHERE id = %s AND email = %s;") == \
+        "SELECT * FROM leads WHERE id = $1 AND email = $2;"
+
+def test_repeated_parameters_get_their_own_numbers():
+    # psycopg2 passes the value once per %s, so asyncpg gets one argument per placeholder too
+    assert to_asyncpg_sql("VALUES (%s, %s) ON CONFLICT DO UPDATE SET score = GREATEST(score, %s)") == \
+        "VALUES ($1, $2) ON CONFLICT DO UPDATE SET score = GREATEST(score, $3)"
+
+def test_escaped_percent_signs_become_literals():
+    assert to_asyncpg_sql("SELECT * FROM company_faq WHERE title LIKE '%%warranty%%' AND id > %s") == \
+        "SELECT * FROM company_faq WHERE title LIKE '%warranty%' AND id > $1"
+    assert to_asyncpg_sql("SELECT '100%%s' || %s") == "SELECT '100%s' || $1"
+
+def test_sql_without_parameters_is_unchanged():
+    assert to_asyncpg_sql("SELECT COUNT(*) FROM company_faq;") == "SELECT COUNT(*) FROM company_faq;"
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming, token-bounded chunker
+Usage: python -m pytest testing/test_chunker.py
+"""
+
+import json
+import os
+
+from chunker import PROJECT_DIR, chunk_document, iter_chunks, iter_pieces, source_key, split_pieces
+
+def count_words(text):
+    return len(text.split())
+
+SENTENCES = [f"Sentence {i} covers the warranty terms in detail." for i in range(40)]
+
+def test_chunks_respect_the_token_budget_and_overlap():
+    chunks = list(split_pieces(iter_pieces([" ".join(SENTENCES)]), 50, 10, count_words))
+    assert len(chunks) > 1
+    assert all(count_words(chunk) <= 50 for chunk in chunks)
+    assert all(any(sentence in chunk for chunk in chunks) for sentence in SENTENCES)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous.split()[-1] in chunk.split()[:10]  # tail of one chunk opens the next
+
+def test_lines_split_mid_word_are_rejoined():
+    assert list(iter_pieces(["Extended war", "ranty plans\n", "\n", "Financing"])) == \
+        ["Extended", " warranty", " plans", "\n\nFinancing"]
+
+def test_short_documents_pass_through_unchanged():
+    document = {"title": "Hours", "content": "Open 9-7.", "url": "https://example.com/hours", "category": "visit"}
+    assert list(chunk_document(document, count_tokens=count_words)) == [document]
+
+def test_sources_are_streamed_with_stable_keys(tmp_path):
+    brochure = tmp_path / "ev_brochure.txt"
+    brochure.write_text("\n".join(SENTENCES))
+    catalog = tmp_path / "catalog.jsonl"
+    catalog.write_text(json.dumps({"title": "F-150", "content": "Tows 13,000 lb.", "url": "u", "category": "trucks"}) + "\n")
+
+    chunks = list(iter_chunks([str(brochure), str(catalog)], max_tokens=60, overlap=10))
+    key = source_key(str(brochure))
+    assert [chunk["chunk_key"] for chunk in chunks[:2]] == [f"{key}#0", f"{key}#1"]
+    assert chunks[0]["title"] == "Ev Brochure"
+    assert chunks[-1]["title"] == "F-150" and "chunk_key" not in chunks[-1]
+
+def test_text_sources_with_the_same_name_get_distinct_keys(tmp_path):
+    for brand in ("ford", "kia"):
+        (tmp_path / brand).mkdir()
+        (tmp_path / brand / "warranty.txt").write_text(f"{brand} warranty terms.")
+    keys = [chunk["chunk_key"] for chunk in iter_chunks([str(tmp_path / "ford" / "warranty.txt"),
+                                                        str(tmp_path / "kia" / "warranty.txt")])]
+    assert len(set(keys)) == 2
+    assert source_key(os.path.join(PROJECT_DIR, "docs", "ford", "warranty.txt")) == "docs/ford/warranty.txt"
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Tests for the async crawler against a local HTTP fixture site
+Usage: python -m pytest testing/test_crawler.py
+"""
+
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawler import Crawler, PageCache
+
+PAGES = {
+    "/": '<html><head><title>Mendieta Auto</title></head><body><nav><a href="/financing">Menu</a></nav>'
+         '<main><h1>Welcome</h1><p>New and used cars.</p>'
+         '<a href="/financing">Financing</a> <a href="/service#hours">Service</a> '
+         '<a href="/private/admin">Admin</a> <a href="https://elsewhere.example.com/">Other site</a></main></body></html>',
+    "/financing": "<html><head><title>Financing</title></head><body><p>Rates from 3.9% APR.</p>"
+                  '<a href="/">Home</a></body></html>',
+    "/service": "<html><head><title>Service</title></head><body><p>Open 7am to 6pm.</p></body></html>",
+    "/robots.txt": "User-agent: *\nDisallow: /private\n",
+}
+
+class FixtureSite:
+    """Serves PAGES with ETags, answers If-None-Match with 304 and records concurrency"""
+
+    def __init__(self, latency=0.02):
+        self.pages = dict(PAGES)
+        self.latency = latency
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def base(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with site._lock:
+                    site.in_flight += 1
+                    site.max_in_flight = max(site.max_in_flight, site.in_flight)
+                    site.requests.append((self.path, self.headers.get("If-None-Match")))
+                try:
+                    time.sleep(site.latency)
+                    body = site.pages.get(self.path)
+                    if body is None:
+                        self.send_response(404)
+                        self.end_headers()
+                        return
+                    etag = f'"{hash(body) & 0xffffffff:x}"'
+                    if self.headers.get("If-None-Match") == etag:
+                        self.send_response(304)
+                        self.end_headers()
+                        return
+                    payload = body.encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain" if self.path.endswith(".txt") else "text/html")
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                finally:
+                    with site._lock:
+                        site.in_flight -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def site():
+    fixture = FixtureSite()
+    yield fixture
+    fixture.stop()
+
+def crawl(crawler, url):
+    async def run():
+        return [document async for document in crawler.crawl([url])]
+    return asyncio.run(run())
+
+def test_crawl_follows_same_host_links_and_robots(site, tmp_path):
+    crawler = Crawler(cache=PageCache(tmp_path), delay=0)
+    documents = crawl(crawler, site.base + "/")
+    assert sorted(d["url"] for d in documents) == [site.base + "/", site.base + "/financing", site.base + "/service"]
+    home = next(d for d in documents if d["url"] == site.base + "/")
+    assert home["title"] == "Mendieta Auto" and "New and used cars." in home["content"]
+    assert "Menu" not in home["content"]  # navigation is followed but not indexed
+    assert crawler.stats["skipped"] == 1  # /private/admin is disallowed by robots.txt
+
+def test_refresh_sends_conditional_requests_and_reparses_only_changes(site, tmp_path):
+    crawl(Crawler(cache=PageCache(tmp_path), delay=0), site.base + "/")
+    site.pages["/service"] = "<html><head><title>Service</title></head><body><p>Open 7am to 8pm.</p></body></html>"
+    site.requests.clear()
+
+    crawler = Crawler(cache=PageCache(tmp_path), delay=0)
+    documents = crawl(crawler, site.base + "/")
+    assert crawler.stats["not_modified"] == 2 and crawler.stats["parsed"] == 1
+    assert all(etag for path, etag in site.requests if path != "/robots.txt")
+    assert "8pm" in next(d for d in documents if d["url"].endswith("/service"))["content"]
+    assert len(documents) == 3  # unchanged pages still come back from the cache
+
+def test_per_host_concurrency_is_bounded(site, tmp_path):
+    for i in range(12):
+        site.pages[f"/car-{i}"] = f"<html><body><p>Car {i}</p></body></html>"
+    site.pages["/"] = "<html><body><p>Inventory</p>" + "".join(f'<a href="/car-{i}">{i}</a>' for i in range(12)) + "</body></html>"
+    site.latency = 0.05
+
+    crawler = Crawler(cache=PageCache(tmp_path), concurrency=16, per_host=3, delay=0, respect_robots=False)
+    assert len(crawl(crawler, site.base + "/")) == 13
+    assert site.max_in_flight <= 3
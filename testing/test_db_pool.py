@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tests for the psycopg2 connection pool (no database needed)
+Usage: python -m pytest testing/test_db_pool.py
+"""
+
+import threading
+import time
+
+from db_pool import ConnectionPool
+
+class FakeConnection:
+    """Answers SELECT 1 once `ready` is set, so a health check can be held mid round trip"""
+
+    def __init__(self, ready=None):
+        self.closed = False
+        self.ready = ready
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        if self.ready is not None:
+            self.ready.wait(5)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+def test_slow_health_check_does_not_block_other_borrowers():
+    pool = ConnectionPool("postgresql://unused", min_size=0, max_size=2, max_idle_check=0)
+    pool._connect = FakeConnection
+    ready = threading.Event()
+    stale = FakeConnection(ready)
+    pool._idle.append((stale, time.monotonic(), time.monotonic() - 60))
+    pool._size = 1
+
+    borrowed = {}
+    checker = threading.Thread(target=lambda: borrowed.setdefault("stale", pool.getconn()))
+    checker.start()
+    time.sleep(0.05)  # the first borrower is now waiting on SELECT 1
+
+    started = time.monotonic()
+    fresh = pool.getconn()
+    assert time.monotonic() - started < 1
+    assert fresh is not stale and pool.stats()["size"] == 2
+
+    ready.set()
+    checker.join(5)
+    assert borrowed["stale"] is stale
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Tests for the query embedding cache and bulk embedding batches
+Usage: python -m pytest testing/test_embedding_cache.py
+"""
+
+import time
+
+from embedding_cache import EmbeddingCache, embedding_batches, estimate_tokens
+
+def test_least_recently_used_embedding_is_evicted():
+    cache = EmbeddingCache(max_size=2, ttl=0)
+    cache.put("What are your hours?", [1.0])
+    cache.put("Do you take trade-ins?", [2.0])
+    assert cache.get("what are your hours") == [1.0]  # trade-ins is now the least recently used
+    cache.put("Do you offer financing?", [3.0])
+    assert cache.get("Do you take trade-ins?") is None
+    assert cache.get("What are your hours?") == [1.0]
+    assert cache.stats()["evictions"] == 1 and cache.stats()["size"] == 2
+
+def test_expired_embeddings_are_dropped():
+    cache = EmbeddingCache(max_size=10, ttl=0.01)
+    cache.put("What are your hours?", [1.0])
+    time.sleep(0.02)
+    assert cache.get("What are your hours?") is None
+    assert cache.stats()["size"] == 0
+
+def test_hits_and_misses_are_counted():
+    cache = EmbeddingCache(max_size=10, ttl=0)
+    assert cache.get("What are your hours?") is None
+    cache.put("What are your hours?", [1.0])
+    assert cache.get("  WHAT are your   hours?? ") == [1.0]  # normalized to the same key
+    assert cache.get("What are your hours?", model="other-model") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 2, 1 / 3)
+
+def test_batches_respect_the_input_count_limit():
+    assert list(embedding_batches(["a"] * 5, max_inputs=2, max_tokens=1000)) == [(0, 2), (2, 4), (4, 5)]
+    assert list(embedding_batches([], max_inputs=2, max_tokens=1000)) == []
+
+def test_batches_respect_the_token_limit():
+    texts = ["x" * 30] * 4  # 11 estimated tokens each
+    assert estimate_tokens(texts[0]) == 11
+    assert list(embedding_batches(texts, max_inputs=100, max_tokens=22)) == [(0, 2), (2, 4)]
+    assert list(embedding_batches(texts, max_inputs=100, max_tokens=21)) == [(0, 1), (1, 2), (2, 3), (3, 4)]
+
+def test_text_over_the_token_limit_gets_a_batch_of_its_own():
+    texts = ["short", "x" * 300, "short"]
+    assert list(embedding_batches(texts, max_inputs=100, max_tokens=50)) == [(0, 1), (1, 2), (2, 3)]
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Tests for reduced-dimension and halfvec embedding storage settings
+Usage: python -m pytest testing/test_embedding_storage.py
+"""
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from embedding_cache import request_options, shorten_embedding
+from index_settings import cosine_ops, create_index_sql, embedding_column_type, match_function_sql
+
+def test_column_type_and_index_ops_follow_the_storage_mode():
+    assert embedding_column_type("vector", 1536) == "vector(1536)"
+    assert embedding_column_type("halfvec", 512) == "halfvec(512)"
+    assert cosine_ops("halfvec(512)") == "halfvec_cosine_ops"
+    assert "halfvec_cosine_ops" in create_index_sql({"index_type": "ivfflat", "lists": 10}, cosine_ops("halfvec(512)"))
+    with pytest.raises(ValueError):
+        embedding_column_type("float8", 512)
+
+def test_match_function_casts_the_query_to_the_column_type():
+    sql = match_function_sql("halfvec(512)")
+    assert "query_embedding vector," in sql
+    assert sql.count("query_embedding::halfvec(512)") == 3
+
+def test_shortened_embeddings_are_unit_length_prefixes():
+    full = np.random.default_rng(0).normal(size=1536)
+    short = shorten_embedding(full, 512)
+    assert short.shape == (512,)
+    assert np.isclose(np.linalg.norm(short), 1.0)
+    assert np.allclose(short * np.linalg.norm(full[:512]), full[:512])
+
+def test_dimensions_are_only_requested_from_models_that_support_them():
+    assert request_options("text-embedding-3-small", 512) == {"dimensions": 512}
+    assert request_options("text-embedding-ada-002", 1536) == {}
+
+def test_storage_settings_are_read_from_dotenv(tmp_path):
+    (tmp_path / ".env").write_text("EMBEDDING_DIMENSIONS=512\nEMBEDDING_STORAGE=halfvec\n")
+    env = {key: value for key, value in os.environ.items() if not key.startswith("EMBEDDING_")}
+    env["PYTHONPATH"] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = "import index_settings; print(index_settings.embedding_column_type())"
+    output = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "halfvec(512)"
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Tests for the on-disk embedding store used by ingestion and benchmarks
+Usage: python -m pytest testing/test_embedding_store.py
+"""
+
+import numpy as np
+
+from embedding_store import EmbeddingStore, embed_with_store
+
+def fake_embed(calls):
+    def embed(texts):
+        calls.append(list(texts))
+        return [[float(len(text)), 1.0, 0.5] for text in texts]
+    return embed
+
+def test_second_run_is_served_from_disk(tmp_path):
+    calls = []
+    store = EmbeddingStore("text-embedding-3-small", 3, directory=tmp_path)
+    first = embed_with_store(["alpha", "beta"], fake_embed(calls), store)
+
+    reopened = EmbeddingStore("text-embedding-3-small", 3, directory=tmp_path)
+    second = embed_with_store(["beta", "gamma", "alpha"], fake_embed(calls), reopened)
+    assert calls == [["alpha", "beta"], ["gamma"]]
+    assert second == [first[1], [5.0, 1.0, 0.5], first[0]]
+    assert reopened.stats()["hits"] == 2 and len(reopened) == 3
+
+def test_models_and_dimensions_are_kept_apart(tmp_path):
+    EmbeddingStore("model-a", 3, directory=tmp_path).put_many(["x"], [[1.0, 2.0, 3.0]])
+    assert EmbeddingStore("model-b", 3, directory=tmp_path).get_many(["x"]) == [None]
+    assert EmbeddingStore("model-a", 2, directory=tmp_path).get_many(["x"]) == [None]
+    np.testing.assert_array_equal(EmbeddingStore("model-a", 3, directory=tmp_path).get_many(["x"])[0], [1, 2, 3])
+
+def test_interrupted_append_is_dropped_on_open(tmp_path):
+    store = EmbeddingStore("m", 3, directory=tmp_path)
+    store.put_many(["x"], [[1.0, 2.0, 3.0]])
+    with open(store.vectors_path, "ab") as f:
+        f.write(np.ones(3, dtype=np.float32).tobytes())  # vector written, digest never was
+
+    reopened = EmbeddingStore("m", 3, directory=tmp_path)
+    assert len(reopened) == 1
+    reopened.put_many(["y"], [[4.0, 5.0, 6.0]])
+    np.testing.assert_array_equal(reopened.get_many(["y"])[0], [4, 5, 6])
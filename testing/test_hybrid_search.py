@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for reciprocal rank fusion and keyword confidence in hybrid retrieval
+Usage: python -m pytest testing/test_hybrid_search.py
+"""
+
+import time
+
+import chatbot
+from hybrid_search import fuse_hybrid, is_confident_lexical, rrf_fuse
+
+def vector_row(id, similarity):
+    return {"id": id, "title": f"doc {id}", "similarity": similarity}
+
+def keyword_row(id, rank, matches_all=True):
+    return {"id": id, "title": f"doc {id}", "similarity": None, "lexical_rank": rank, "matches_all": matches_all}
+
+def test_rrf_ranks_documents_found_by_both_lists_first():
+    fused = rrf_fuse([[vector_row(1, 0.8), vector_row(2, 0.7)],
+                      [keyword_row(2, 0.9), keyword_row(3, 0.4)]], limit=3, k=60)
+    assert [row["id"] for row in fused] == [2, 1, 3]
+    assert fused[0]["rrf_score"] == 1 / 61 + 1 / 62
+    assert fused[0]["similarity"] == 0.7  # the vector similarity is kept for keyword-first rows
+
+def test_rrf_respects_the_limit():
+    assert len(rrf_fuse([[vector_row(i, 0.9) for i in range(10)]], limit=3)) == 3
+
+def test_confident_keyword_match_needs_every_term_and_a_high_rank():
+    assert is_confident_lexical([keyword_row(1, 0.8)], threshold=0.5)
+    assert not is_confident_lexical([keyword_row(1, 0.3)], threshold=0.5)
+    assert not is_confident_lexical([keyword_row(1, 0.9, matches_all=False)], threshold=0.5)
+    assert not is_confident_lexical([], threshold=0.5)
+
+def test_off_topic_questions_get_no_partial_keyword_context():
+    """No vector row passed the threshold: one-word keyword hits must not become context"""
+    assert fuse_hybrid([], [keyword_row(1, 0.1, matches_all=False)]) == []
+    assert [row["id"] for row in fuse_hybrid([], [keyword_row(1, 0.1, matches_all=False),
+                                                   keyword_row(2, 0.2)])] == [2]
+
+def test_partial_keyword_hits_still_fuse_with_vector_hits():
+    fused = fuse_hybrid([vector_row(1, 0.6)], [keyword_row(2, 0.1, matches_all=False)])
+    assert [row["id"] for row in fused] == [1, 2]
+
+def use_retrieval_fakes(monkeypatch, lexical_results, lexical_delay=0.0):
+    """Fake keyword search and vector search; returns the list of embedded questions"""
+    embedded = []
+    def fake_lexical(question):
+        time.sleep(lexical_delay)
+        return lexical_results
+    monkeypatch.setattr(chatbot, "HYBRID_SEARCH", True)
+    monkeypatch.setattr(chatbot, "RETRIEVAL_BACKEND", "postgres")
+    monkeypatch.setattr(chatbot, "lexical_search", fake_lexical)
+    monkeypatch.setattr(chatbot, "embed_query", lambda client, question: embedded.append(question) or [0.0])
+    monkeypatch.setattr(chatbot, "_search_postgres", lambda embedding, threshold, limit: [vector_row(9, 0.6)])
+    return embedded
+
+def test_confident_keyword_match_skips_the_embedding_call(monkeypatch):
+    embedded = use_retrieval_fakes(monkeypatch, [keyword_row(1, 0.9)])
+    assert [row["id"] for row in chatbot.get_relevant_context("F-150 towing")] == [1]
+    assert embedded == []
+
+def test_slow_keyword_search_overlaps_the_embedding_call(monkeypatch):
+    monkeypatch.setattr(chatbot, "HYBRID_LEXICAL_WAIT", 0.01)
+    embedded = use_retrieval_fakes(monkeypatch, [keyword_row(1, 0.9)], lexical_delay=0.2)
+    assert [row["id"] for row in chatbot.get_relevant_context("F-150 towing")] == [1]
+    assert embedded == ["F-150 towing"]  # sent while waiting, but the vector search is skipped
+
+def test_weak_keyword_match_is_fused_with_vector_results(monkeypatch):
+    embedded = use_retrieval_fakes(monkeypatch, [keyword_row(1, 0.1, matches_all=False)])
+    assert [row["id"] for row in chatbot.get_relevant_context("hours")] == [9, 1]
+    assert embedded == ["hours"]
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Tests for vector index selection settings read from the environment and .env
+Usage: python -m pytest testing/test_index_settings.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETTINGS = {
+    "VECTOR_INDEX_TYPE": "hnsw",
+    "EXACT_SCAN_MAX_ROWS": "10",
+    "HNSW_M": "32",
+    "HNSW_EF_CONSTRUCTION": "128",
+    "HNSW_EF_SEARCH": "80",
+}
+
+def import_settings(cwd, env):
+    """Import index_settings in a fresh interpreter and return the settings it picks for 20,000 rows"""
+    env = {key: value for key, value in os.environ.items() if key not in SETTINGS} | env
+    env["PYTHONPATH"] = PROJECT_DIR
+    script = ("import json, index_settings as s; "
+              "print(json.dumps([s.EXACT_SCAN_MAX_ROWS, s.choose_index_settings(20000)]))")
+    output = subprocess.run([sys.executable, "-c", script], cwd=cwd, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+def test_index_settings_come_from_the_environment(tmp_path):
+    exact_max, settings = import_settings(tmp_path, SETTINGS)
+    assert exact_max == 10
+    assert settings == {"index_type": "hnsw", "m": 32, "ef_construction": 128, "ef_search": 80, "row_count": 20000}
+
+def test_index_settings_come_from_dotenv_before_import(tmp_path):
+    (tmp_path / ".env").write_text("".join(f"{key}={value}\n" for key, value in SETTINGS.items()))
+    exact_max, settings = import_settings(tmp_path, {})
+    assert exact_max == 10
+    assert settings["index_type"] == "hnsw" and settings["m"] == 32 and settings["ef_search"] == 80
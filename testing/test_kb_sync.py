@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Tests for incremental knowledge base sync planning
+Usage: python -m pytest testing/test_kb_sync.py
+"""
+
+import pytest
+
+from kb_sync import DELETE_REMOVED_SQL, chunk_key, content_hash, embedding_text, plan_sync, sync_chunks
+
+CHUNKS = [
+    {"title": "Hours", "content": "Open 9-7 Monday to Saturday.", "url": "https://example.com/hours", "category": "visit"},
+    {"title": "Financing", "content": "Rates from 3.9% APR.", "url": "https://example.com/finance", "category": "finance"},
+]
+
+def stored(chunks):
+    return {chunk_key(chunk): content_hash(embedding_text(chunk)) for chunk in chunks}
+
+def test_unchanged_catalog_needs_no_embeddings():
+    assert plan_sync(CHUNKS, stored(CHUNKS)) == []
+
+def test_only_new_and_edited_chunks_are_embedded():
+    edited = dict(CHUNKS[1], content="Rates from 2.9% APR.")
+    new = {"title": "Trade-ins", "content": "Free appraisal.", "url": "https://example.com/trade", "category": "trade"}
+    assert plan_sync([CHUNKS[0], edited, new], stored(CHUNKS)) == [1, 2]
+
+def test_full_re_embeds_everything():
+    assert plan_sync(CHUNKS, stored(CHUNKS), full=True) == [0, 1]
+
+def test_metadata_only_changes_do_not_re_embed():
+    recategorized = dict(CHUNKS[0], category="hours")
+    assert plan_sync([recategorized, CHUNKS[1]], stored(CHUNKS)) == []
+
+def test_duplicate_keys_are_rejected():
+    with pytest.raises(ValueError):
+        plan_sync([CHUNKS[0], dict(CHUNKS[0])], {})
+
+class FakeCursor:
+    """Records executed statements; every DELETE reports 3 rows"""
+
+    def __init__(self):
+        self.executed = []
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+        self.rowcount = 3 if sql == DELETE_REMOVED_SQL else 0
+
+def test_rows_missing_from_the_sources_are_only_deleted_with_prune():
+    cur = FakeCursor()
+    assert sync_chunks(cur, [], embed=None)["deleted"] == 0
+    assert DELETE_REMOVED_SQL not in cur.executed
+
+    cur = FakeCursor()
+    assert sync_chunks(cur, [], embed=None, prune=True)["deleted"] == 3
+    assert cur.executed[-1] == DELETE_REMOVED_SQL
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Tests for rule-based lead extraction
+Usage: python -m pytest testing/test_lead_rules.py
+"""
+
+from lead_rules import extract_with_rules, merge_rule_fields
+
+def test_contact_details_and_name():
+    """Email, phone and a capitalized name are resolved without the LLM"""
+    fields, needs_llm = extract_with_rules("Hi, I'm John Smith, email john@example.com, 555-123-4567")
+    assert fields == {
+        "email": "john@example.com",
+        "phone_number": "555-123-4567",
+        "name": "John Smith",
+    }
+    assert not needs_llm
+
+def test_vehicle_preferences_and_budget():
+    fields, needs_llm = extract_with_rules("Looking for a used SUV under $30k, maybe a RAV4")
+    assert fields["budget_range"] == "$20k-$35k"
+    assert fields["new_or_used"] == "used"
+    assert fields["vehicle_type"] == "SUV"
+    assert fields["make_model_preference"] == "Toyota RAV4"
+    assert not needs_llm
+
+def test_trade_in_and_payment():
+    fields, _ = extract_with_rules("No trade-in, paying cash, budget 45 grand")
+    assert fields["trade_in"] == "no"
+    assert fields["financing_needed"] == "cash"
+    assert fields["budget_range"] == "$35k-$50k"
+
+def test_model_years_and_monthly_payments_are_not_budgets():
+    fields, _ = extract_with_rules("I have a 2019 Camry to trade in")
+    assert "budget_range" not in fields
+    fields, needs_llm = extract_with_rules("I can pay around $400 a month")
+    assert "budget_range" not in fields
+    assert needs_llm
+
+def test_unresolved_signal_needs_llm():
+    """Lowercase names and bare answers to the assistant's question go to the LLM"""
+    assert extract_with_rules("my name is bob")[1]
+    assert extract_with_rules("yes", "Do you have a vehicle to trade in?")[1]
+    assert not extract_with_rules("Where are you located?")[1]
+
+def test_negated_preferences_are_left_to_the_llm():
+    """A negated or contradicted value is never recorded as the opposite answer"""
+    for message, field in [
+        ("I'm not interested in leasing", "financing_needed"),
+        ("I dont need financing", "financing_needed"),
+        ("I don't want a used car", "new_or_used"),
+        ("no trucks, I want a sedan", "vehicle_type"),
+        ("Safety matters, towing doesn't matter", "priorities"),
+    ]:
+        fields, needs_llm = extract_with_rules(message)
+        assert field not in fields, message
+        assert needs_llm, message
+
+def test_competing_values_are_left_to_the_llm():
+    fields, needs_llm = extract_with_rules("Thinking about a lease or a loan")
+    assert "financing_needed" not in fields and needs_llm
+    fields, needs_llm = extract_with_rules("A certified pre-owned electric SUV")
+    assert fields["new_or_used"] == "certified pre-owned" and fields["vehicle_type"] == "EV"
+    assert not needs_llm
+
+def test_negations_stay_in_their_clause():
+    fields, _ = extract_with_rules("No trade-in, but I want a used truck")
+    assert fields["trade_in"] == "no"
+    assert fields["new_or_used"] == "used" and fields["vehicle_type"] == "truck"
+
+def test_common_words_are_not_names():
+    assert "name" not in extract_with_rules("This is Great")[0]
+    assert "name" not in extract_with_rules("I'm Looking for a new SUV")[0]
+    assert extract_with_rules("My name is Great")[0]["name"] == "Great"
+
+def test_income_is_not_a_budget():
+    fields, needs_llm = extract_with_rules("I make 60k a year")
+    assert "budget_range" not in fields and needs_llm
+    fields, _ = extract_with_rules("I make $60,000 a year so my budget is around $25k")
+    assert fields["budget_range"] == "$20k-$35k"
+
+def test_numbers_without_a_budget_cue_are_not_budgets():
+    for message in [
+        "my zip is 90210",
+        "F-150 with 5000 lbs towing",
+        "I can put $5,000 down",
+        "Is the $2,000 rebate still available?",
+        "I have a 2015 Civic with 80,000 miles",
+    ]:
+        assert "budget_range" not in extract_with_rules(message)[0], message
+    assert extract_with_rules("30k is my budget")[0]["budget_range"] == "$20k-$35k"
+
+def test_questions_are_not_preferences():
+    for message, field in [
+        ("Do you offer financing?", "financing_needed"),
+        ("How does trade-in work?", "trade_in"),
+        ("Do you have used cars?", "new_or_used"),
+    ]:
+        fields, needs_llm = extract_with_rules(message)
+        assert field not in fields, message
+        assert not needs_llm, message
+    fields, _ = extract_with_rules("Do you have used cars? I want a used truck.")
+    assert fields["new_or_used"] == "used" and fields["vehicle_type"] == "truck"
+
+def test_the_customers_current_car_is_not_a_preference():
+    fields, _ = extract_with_rules("I have a 2015 Civic with 80,000 miles")
+    assert "make_model_preference" not in fields
+    fields, _ = extract_with_rules("I have a 2015 Civic, but I want a RAV4")
+    assert fields["make_model_preference"] == "Toyota RAV4"
+
+def test_rule_values_never_overwrite_known_fields():
+    lead = {"name": "Jane", "budget_range": "$35k-$50k", "vehicle_type": None}
+    assert merge_rule_fields(lead, {"budget_range": "Under $20k", "vehicle_type": "SUV"})
+    assert lead == {"name": "Jane", "budget_range": "$35k-$50k", "vehicle_type": "SUV"}
+    assert not merge_rule_fields(lead, {"name": "Jane"})
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-session record of persisted lead state
+Usage: python -m pytest testing/test_lead_writes.py
+"""
+
+from lead_writes import LeadWriteTracker
+
+def test_unknown_session_needs_a_full_write():
+    assert LeadWriteTracker().get("new-session") == (None, -1)
+
+def test_tracker_is_bounded_lru():
+    tracker = LeadWriteTracker(max_size=2)
+    tracker.put("a", ("a", "Jane"), 3)
+    tracker.put("b", ("b", "John"), 1)
+    tracker.get("a")
+    tracker.put("c", ("c", None), 5)
+    assert tracker.get("b") == (None, -1)
+    assert tracker.get("a") == (("a", "Jane"), 3)
+
+def test_skipped_writes_are_counted():
+    tracker = LeadWriteTracker()
+    tracker.record(upserted=True, appended=True)
+    tracker.record(upserted=False, appended=True)
+    tracker.record(upserted=False, appended=False)
+    stats = tracker.stats()
+    assert stats["upserts"] == 1
+    assert stats["skipped_upserts"] == 2
+    assert stats["skipped_writes"] == 1
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Tests for outbox delivery against the local Mailgun stub
+Usage: python -m pytest testing/test_notification_worker.py
+"""
+
+from contextlib import contextmanager
+
+import pytest
+
+from mailgun_stub import MailgunStub
+from notification_worker import (
+    CLAIM_LEAD_SQL,
+    CLAIM_SQL,
+    EXPIRE_ABANDONED_SQL,
+    MARK_FAILED_SQL,
+    MARK_RETRY_SQL,
+    MARK_SENT_SQL,
+    backoff_delay,
+    drain_notifications,
+    retry_decision,
+)
+from send_email import NotificationError, deliver_lead_notification
+
+LEAD = {"id": 7, "session_id": "s-1", "name": "Jane Doe", "email": "jane@example.com", "qualification_score": 80}
+
+@pytest.fixture
+def mailgun(monkeypatch):
+    stub = MailgunStub().start()
+    monkeypatch.setenv("MAILGUN_API_BASE", stub.api_base)
+    monkeypatch.setenv("MAILGUN_DOMAIN", "mg.example.com")
+    monkeypatch.setenv("MAILGUN_API_KEY", "key-test")
+    monkeypatch.setenv("EMAIL_FROM", "bot@example.com")
+    yield stub
+    stub.stop()
+
+class FakeCursor:
+    """Answers the outbox queries for a single claimed job and records status updates"""
+
+    def __init__(self, db):
+        self.db = db
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        if sql == CLAIM_SQL:
+            self.db["claims"].append(params)
+            self._rows = self.db["due"]
+            self.db["due"] = []
+        elif sql == CLAIM_LEAD_SQL:
+            self.db["lead_claims"].append(params)
+            self._rows = [job for job in self.db["due"] if job["lead_id"] == params[0]][:params[1]]
+            self.db["due"] = [job for job in self.db["due"] if job not in self._rows]
+        elif sql == EXPIRE_ABANDONED_SQL:
+            self.db["expired"].append(params)
+        elif "FROM leads" in sql:
+            self._rows = [LEAD] if params[0] == LEAD["id"] else []
+        elif "FROM conversation_messages" in sql:
+            self._rows = [{"role": "user", "content": "Hi", "timestamp": "2025-01-01T00:00:00"}]
+        else:
+            self.db["updates"].append((sql, params))
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def close(self):
+        pass
+
+def fake_database(jobs):
+    db = {"due": jobs, "updates": [], "committed": 0, "claims": [], "lead_claims": [], "expired": []}
+
+    class Conn:
+        def cursor(self, cursor_factory=None):
+            return FakeCursor(db)
+
+        def commit(self):
+            db["committed"] = len(db["updates"])
+
+    @contextmanager
+    def connection_factory():
+        yield Conn()
+
+    return db, connection_factory
+
+def test_delivery_returns_message_id(mailgun):
+    message_id = deliver_lead_notification(LEAD)
+    assert message_id.startswith("<stub-")
+    form = mailgun.messages[0]["form"]
+    assert form["subject"] == ["🎯 New Qualified Lead: Jane Doe"]
+
+def test_server_errors_are_retryable_client_errors_are_not(mailgun):
+    mailgun.fail_first, mailgun.fail_status = 1, 503
+    with pytest.raises(NotificationError) as error:
+        deliver_lead_notification(LEAD)
+    assert error.value.retryable
+
+    mailgun.requests, mailgun.fail_status = 0, 400
+    with pytest.raises(NotificationError) as error:
+        deliver_lead_notification(LEAD)
+    assert not error.value.retryable
+
+def test_backoff_grows_exponentially_and_is_capped():
+    assert 15 <= backoff_delay(1, base=30, maximum=3600) <= 30
+    assert 120 <= backoff_delay(4, base=30, maximum=3600) <= 240
+    assert backoff_delay(20, base=30, maximum=3600) <= 3600
+    assert retry_decision(6, NotificationError("down"), max_attempts=6) == ("failed", None)
+    assert retry_decision(1, NotificationError("bad request", retryable=False))[0] == "failed"
+
+def test_drain_records_sent_and_retry(mailgun):
+    db, connection_factory = fake_database([{"id": 1, "lead_id": 7, "attempts": 1}])
+    counts = drain_notifications(connection_factory=connection_factory)
+    assert counts == {"claimed": 1, "sent": 1, "retried": 0, "failed": 0}
+    sql, params = db["updates"][0]
+    assert sql == MARK_SENT_SQL and params[0].startswith("<stub-")
+    assert "Hi" in mailgun.messages[0]["form"]["text"][0]  # transcript assembled from conversation_messages
+
+    mailgun.fail_first = mailgun.requests + 1
+    db["due"] = [{"id": 2, "lead_id": 7, "attempts": 2}]
+    counts = drain_notifications(connection_factory=connection_factory)
+    assert counts["retried"] == 1
+    assert db["updates"][1][0] == MARK_RETRY_SQL
+
+    mailgun.fail_first = mailgun.requests + 1
+    db["due"] = [{"id": 3, "lead_id": 7, "attempts": 99}]
+    assert drain_notifications(connection_factory=connection_factory)["failed"] == 1
+    assert db["updates"][2][0] == MARK_FAILED_SQL
+
+def test_each_outcome_is_committed_before_the_next_delivery():
+    db, connection_factory = fake_database([{"id": 1, "lead_id": 7, "attempts": 1},
+                                            {"id": 2, "lead_id": 7, "attempts": 1}])
+    committed_before_send = []
+
+    def send(lead):
+        committed_before_send.append(db["committed"])
+        return "<id>"
+
+    assert drain_notifications(connection_factory=connection_factory, send=send)["sent"] == 2
+    assert committed_before_send == [0, 1]  # a crash during the second send can't re-send the first
+
+def test_deleted_leads_fail_their_job_and_stale_claims_respect_max_attempts():
+    db, connection_factory = fake_database([{"id": 1, "lead_id": 404, "attempts": 1}])
+    sent = []
+    counts = drain_notifications(connection_factory=connection_factory, send=sent.append)
+    assert counts["claimed"] == 0 and not sent
+    assert db["updates"] == [(MARK_FAILED_SQL, ("lead no longer exists", 1))]
+    lease, max_attempts, _ = db["claims"][0]
+    assert db["expired"] == [(lease, max_attempts)]  # exhausted abandoned jobs are failed, not reclaimed
+
+def test_inline_delivery_sends_only_the_new_leads_job():
+    other_retry = {"id": 1, "lead_id": 8, "attempts": 3}
+    db, connection_factory = fake_database([other_retry, {"id": 2, "lead_id": 7, "attempts": 0}])
+    sent = []
+    counts = drain_notifications(limit=1, connection_factory=connection_factory,
+                                 send=lambda lead: sent.append(lead["id"]) or "<id>", lead_id=7)
+    assert counts["sent"] == 1 and sent == [7]
+    assert db["lead_claims"] == [(7, 1)] and not db["claims"] and not db["expired"]
+    assert db["due"] == [other_retry]  # left to the worker
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Tests for the semantic response cache (distance threshold, TTL, invalidation, LRU eviction)
+Usage: python -m pytest testing/test_response_cache.py
+"""
+
+import time
+
+from response_cache import SemanticResponseCache
+
+# Embeddings at known cosine distances (1 - cos) from NEAR_A
+NEAR_A = [1.0, 0.0, 0.0]
+CLOSE_TO_A = [0.999, 0.0447, 0.0]  # distance ~0.001
+FAR_FROM_A = [0.8, 0.6, 0.0]       # distance 0.2
+OTHER = [0.0, 0.0, 1.0]
+
+def test_only_questions_within_max_distance_hit():
+    cache = SemanticResponseCache(max_size=10, ttl=0, max_distance=0.05)
+    cache.store(NEAR_A, "What are your hours?", "9 to 6", kb_version=1)
+    assert cache.lookup(CLOSE_TO_A, kb_version=1)["answer"] == "9 to 6"
+    assert cache.lookup(FAR_FROM_A, kb_version=1) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_expired_answers_are_not_served():
+    cache = SemanticResponseCache(max_size=10, ttl=0.01, max_distance=0.05)
+    cache.store(NEAR_A, "What are your hours?", "9 to 6", kb_version=1)
+    time.sleep(0.02)
+    assert cache.lookup(NEAR_A, kb_version=1) is None
+    assert cache.stats()["size"] == 0 and cache.stats()["expirations"] == 1
+
+def test_expired_nearest_entry_does_not_hide_a_fresh_match():
+    cache = SemanticResponseCache(max_size=10, ttl=0.05, max_distance=0.05)
+    cache.store(NEAR_A, "What are your hours?", "old answer", kb_version=1)
+    time.sleep(0.06)
+    cache.store(CLOSE_TO_A, "When are you open?", "fresh answer", kb_version=1)
+    assert cache.lookup(NEAR_A, kb_version=1)["answer"] == "fresh answer"
+
+def test_knowledge_base_change_invalidates_every_answer():
+    cache = SemanticResponseCache(max_size=10, ttl=0, max_distance=0.05)
+    cache.store(NEAR_A, "What are your hours?", "9 to 6", kb_version=1)
+    cache.store(OTHER, "Do you take trade-ins?", "Yes", kb_version=1)
+    assert cache.lookup(NEAR_A, kb_version=2) is None
+    assert cache.stats()["size"] == 0 and cache.stats()["invalidations"] == 1
+
+def test_least_recently_used_answer_is_evicted():
+    cache = SemanticResponseCache(max_size=2, ttl=0, max_distance=0.05)
+    cache.store(NEAR_A, "hours?", "9 to 6", kb_version=1)
+    cache.store(OTHER, "trade-ins?", "Yes", kb_version=1)
+    assert cache.lookup(NEAR_A, kb_version=1)  # "trade-ins?" is now the least recently used
+    cache.store(FAR_FROM_A, "financing?", "Through our partners", kb_version=1)
+    assert cache.lookup(OTHER, kb_version=1) is None
+    assert cache.lookup(NEAR_A, kb_version=1)["answer"] == "9 to 6"
+    assert cache.stats()["evictions"] == 1
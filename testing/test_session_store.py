@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for the bounded session store and its Postgres backend
+Usage: python -m pytest testing/test_session_store.py
+"""
+
+import asyncio
+import time
+
+from session_store import PostgresSessionStore, SessionStore, session_bytes
+
+def new_lead():
+    return {"name": None, "email": None}
+
+def test_least_recently_used_session_is_evicted():
+    store = SessionStore(new_lead, max_sessions=2, idle_ttl=0)
+    store.get_or_create("a")
+    store.get_or_create("b")
+    store.get("a")  # "b" is now the least recently used
+    store.get_or_create("c")
+    assert "a" in store and "c" in store and "b" not in store
+    assert store.stats()["evictions"] == 1
+
+def test_idle_sessions_expire():
+    store = SessionStore(new_lead, max_sessions=10, idle_ttl=0.01)
+    store.get_or_create("a")
+    time.sleep(0.02)
+    assert store.get("a") is None
+    assert store.stats()["expirations"] == 1
+    assert store.stats()["resident_bytes"] == 0
+
+def test_history_is_capped_by_whole_exchanges():
+    store = SessionStore(new_lead, history_limit=4, idle_ttl=0)
+    session_id, session = store.get_or_create()
+    session["history"].extend({"role": role, "content": str(i)} for i, role in enumerate(["user", "assistant"] * 3))
+    store.save(session_id, session)
+    assert [m["content"] for m in session["history"]] == ["2", "3", "4", "5"]
+    assert store.stats()["trimmed_messages"] == 2
+
+def test_resident_bytes_track_saved_sessions():
+    store = SessionStore(new_lead, idle_ttl=0)
+    session_id, session = store.get_or_create()
+    session["history"].append({"role": "user", "content": "x" * 1000})
+    session["lead"]["email"] = "john@example.com"
+    store.save(session_id, session)
+    assert store.stats()["resident_bytes"] == session_bytes(session)
+    store.delete(session_id)
+    assert store.stats()["resident_bytes"] == 0
+
+class FakePool:
+    """Stands in for the asyncpg pool: chat_sessions has no row, appends return canned versions"""
+
+    def __init__(self, versions):
+        self.versions = iter(versions)
+        self.appends = []
+
+    async def fetchrow(self, sql, *args):
+        return None
+
+    async def fetchval(self, sql, *args):
+        self.appends.append(args)
+        return next(self.versions)
+
+def test_postgres_store_detects_writes_from_other_workers():
+    async def run():
+        pool = FakePool([1, 3])  # another worker appended between our two turns
+
+        async def pool_factory():
+            return pool
+
+        store = PostgresSessionStore(SessionStore(new_lead, idle_ttl=0), pool_factory)
+        session_id, session = await store.get_or_create("a")
+        await store.save(session_id, session, [{"role": "user", "content": "hi"}])
+        assert session["version"] == 1
+        await store.save(session_id, session, [{"role": "user", "content": "again"}])
+        assert session["version"] is None  # reloaded from chat_sessions next turn
+        assert store.stats()["stale_writes"] == 1
+
+    asyncio.run(run())
+
+def test_postgres_history_is_trimmed_to_the_cache_window():
+    async def run():
+        pool = FakePool([1])
+
+        async def pool_factory():
+            return pool
+
+        store = PostgresSessionStore(SessionStore(new_lead, idle_ttl=0, history_limit=4), pool_factory)
+        session_id, session = await store.get_or_create("a")
+        await store.save(session_id, session, [{"role": "user", "content": "hi"}])
+        assert pool.appends[0][-1] == 4  # chat_sessions.history is capped in the same statement
+
+    asyncio.run(run())
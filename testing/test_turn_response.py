@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests for single-call replies: parsing the structured completion and the two-call fallback
+Usage: python -m pytest testing/test_turn_response.py
+"""
+
+import json
+from types import SimpleNamespace
+
+import chatbot
+from chatbot import new_lead_data, parse_turn_response
+
+def message(content, refusal=None):
+    return SimpleNamespace(content=content, refusal=refusal)
+
+def test_reply_and_lead_fields_are_split():
+    lead_data = new_lead_data()
+    content = json.dumps({"reply": "Happy to help, Sam!", "lead": {"name": "Sam", "email": None, "color": "red"}})
+    assert parse_turn_response(message(content), lead_data) == "Happy to help, Sam!"
+    assert lead_data["name"] == "Sam" and lead_data["email"] is None and "color" not in lead_data
+
+def test_refusals_and_empty_content_are_unusable():
+    assert parse_turn_response(message(None, refusal="I can't help with that."), new_lead_data()) is None
+    assert parse_turn_response(message(None), new_lead_data()) is None
+    assert parse_turn_response(message(""), new_lead_data()) is None
+
+def test_truncated_or_malformed_json_is_unusable():
+    lead_data = new_lead_data()
+    assert parse_turn_response(message('{"reply": "We have three RAV4s in st'), lead_data) is None
+    assert parse_turn_response(message('{"lead": {"name": "Sam"}}'), lead_data) is None
+    assert parse_turn_response(message('{"reply": null, "lead": {"name": "Sam"}}'), lead_data) is None
+    assert parse_turn_response(message('["not", "an", "object"]'), lead_data) is None
+    assert lead_data == new_lead_data()  # nothing merged from a reply that was thrown away
+
+class FakeCompletions:
+    """Returns the queued message contents in order and records each request"""
+
+    def __init__(self, contents):
+        self.contents = list(contents)
+        self.requests = []
+
+    def create(self, **request):
+        self.requests.append(request)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message(self.contents.pop(0)))])
+
+def test_unusable_single_call_reply_falls_back_to_two_calls(monkeypatch):
+    completions = FakeCompletions([
+        '{"reply": "Sure, Sam',  # cut off at max_tokens
+        json.dumps({"name": "Sam"}),  # separate extraction
+        "Nice to meet you, Sam!",  # plain reply
+    ])
+    monkeypatch.setattr(chatbot, "openai_client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    monkeypatch.setattr(chatbot, "SINGLE_CALL_EXTRACTION", True)
+    monkeypatch.setattr(chatbot, "_cached_response", lambda *args: (None, None))
+    monkeypatch.setattr(chatbot, "get_relevant_context", lambda question: [])
+    monkeypatch.setattr(chatbot, "_finish_turn", lambda *args: None)
+
+    lead_data = new_lead_data()
+    reply, _ = chatbot.chat("hi, my name is sam", [], lead_data=lead_data)
+    assert reply == "Nice to meet you, Sam!"
+    assert lead_data["name"] == "Sam"
+    assert "response_format" not in completions.requests[-1]
+    assert "RESPONSE FORMAT" not in completions.requests[-1]["messages"][0]["content"]
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-memory vector index (no database needed)
+Usage: python -m pytest testing/test_vector_index.py
+"""
+
+from contextlib import contextmanager
+
+from vector_index import KB_VERSION_SQL, InMemoryVectorIndex
+
+def faq_row(id, embedding):
+    return {"id": id, "title": f"doc {id}", "content": "", "excerpt": "", "url": None, "metadata": {},
+            "embedding": embedding}
+
+class FakeCursor:
+    """Answers the version fingerprint and the company_faq load from a dict-backed table"""
+
+    def __init__(self, db):
+        self.db = db
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        if sql == KB_VERSION_SQL:
+            self.db["version_checks"] += 1
+            self._rows = [{"count": len(self.db["rows"]), "max_id": self.db["version"], "created": None, "updated": None}]
+        else:
+            self.db["loads"] += 1
+            self._rows = [dict(row) for row in self.db["rows"]]
+
+    def fetchone(self):
+        return self._rows[0]
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+def fake_database(rows):
+    db = {"rows": rows, "version": 1, "version_checks": 0, "loads": 0}
+
+    class Conn:
+        def cursor(self, cursor_factory=None):
+            return FakeCursor(db)
+
+        def rollback(self):
+            pass
+
+    @contextmanager
+    def connection_factory():
+        yield Conn()
+
+    return db, connection_factory
+
+def test_results_are_ordered_by_similarity():
+    db, connection_factory = fake_database([faq_row(1, [0.0, 1.0]), faq_row(2, [1.0, 0.0]), faq_row(3, [1.0, 1.0])])
+    index = InMemoryVectorIndex(refresh_interval=60, connection_factory=connection_factory)
+    index.load()
+    results = index.search([1.0, 0.1], limit=3)
+    assert [row["id"] for row in results] == [2, 3, 1]
+    assert results[0]["similarity"] > results[1]["similarity"] > results[2]["similarity"]
+    assert "embedding" not in results[0]
+    assert [row["id"] for row in index.search([1.0, 0.1], limit=2)] == [2, 3]
+
+def test_rows_below_the_threshold_are_dropped():
+    db, connection_factory = fake_database([faq_row(1, [1.0, 0.0]), faq_row(2, [0.6, 0.8])])
+    index = InMemoryVectorIndex(refresh_interval=60, connection_factory=connection_factory)
+    index.load()
+    assert [row["id"] for row in index.search([1.0, 0.0], threshold=0.5)] == [1, 2]  # cosine 0.6 passes
+    assert [row["id"] for row in index.search([1.0, 0.0], threshold=0.7)] == [1]
+    assert index.search([0.0, 0.0], threshold=0.5) == []
+
+def test_index_reloads_only_when_the_version_changes():
+    db, connection_factory = fake_database([faq_row(1, [1.0, 0.0])])
+    index = InMemoryVectorIndex(refresh_interval=0, connection_factory=connection_factory)
+    index.load()
+    assert not index.refresh_if_stale()
+    assert db["loads"] == 1
+
+    db["rows"], db["version"] = [faq_row(1, [1.0, 0.0]), faq_row(2, [0.0, 1.0])], 2
+    assert [row["id"] for row in index.search([0.0, 1.0], limit=1)] == [2]  # search refreshes the stale index
+    assert db["loads"] == 2 and len(index) == 2
+
+def test_version_is_not_rechecked_within_the_refresh_interval():
+    db, connection_factory = fake_database([faq_row(1, [1.0, 0.0])])
+    index = InMemoryVectorIndex(refresh_interval=60, connection_factory=connection_factory)
+    index.load()
+    checks = db["version_checks"]
+    db["version"] = 2
+    index.search([1.0, 0.0])
+    assert db["version_checks"] == checks and db["loads"] == 1
+    assert index.refresh_if_stale(force=True) and db["loads"] == 2
@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+
+import numpy as np
+from psycopg2.extras import RealDictCursor
+
+from db_pool import db_connection
+
+# "postgres" (default) runs similarity search in pgvector, "memory" uses InMemoryVectorIndex
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "postgres").lower()
+VECTOR_INDEX_REFRESH_INTERVAL = float(os.getenv("VECTOR_INDEX_REFRESH_INTERVAL", "60"))  # seconds
+KB_VERSION_CHECK_INTERVAL = float(os.getenv("KB_VERSION_CHECK_INTERVAL", "60"))  # seconds
+
+
+# updated_at catches chunks edited in place by an incremental load (see kb_sync.py)
+KB_VERSION_SQL = "SELECT COUNT(*), MAX(id), MAX(created_at), MAX(updated_at) FROM company_faq;"
+
+
+def format_kb_version(values):
+    return "|".join("" if v is None else str(v) for v in values)
+
+
+def fetch_kb_version(cur):
+    """Cheap fingerprint of company_faq that changes whenever content is reloaded"""
+    cur.execute(KB_VERSION_SQL)
+    row = cur.fetchone()
+    return format_kb_version(list(row.values()) if isinstance(row, dict) else list(row))
+
+
+_kb_version = None
+_kb_version_checked_at = 0.0
+
+
+def get_kb_version(max_age=KB_VERSION_CHECK_INTERVAL):
+    """Knowledge base version, re-read from the database at most every max_age seconds"""
+    global _kb_version, _kb_version_checked_at
+    if _kb_version is None or time.monotonic() - _kb_version_checked_at >= max_age:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            _kb_version = fetch_kb_version(cur)
+            cur.close()
+            conn.rollback()
+        _kb_version_checked_at = time.monotonic()
+    return _kb_version
+
+
+class InMemoryVectorIndex:
+    """company_faq embeddings held in a contiguous, pre-normalized float32 matrix"""
+
+    def __init__(self, refresh_interval=60, connection_factory=db_connection):
+        self.refresh_interval = refresh_interval
+        self.connection_factory = connection_factory
+        # (matrix, rows, version) is swapped as a whole so readers never see a partial load
+        self._snapshot = (np.zeros((0, 0), dtype=np.float32), [], None)
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self._snapshot[2]
+
+    def __len__(self):
+        return len(self._snapshot[1])
+
+    def load(self):
+        """Load every row of company_faq into memory"""
+        with self.connection_factory() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            version = fetch_kb_version(cur)
+            cur.execute("""
+                SELECT id, title, content, excerpt, url, metadata, embedding::vector AS embedding
+                FROM company_faq
+                WHERE embedding IS NOT NULL
+                ORDER BY id;
+            """)
+            records = cur.fetchall()
+            cur.close()
+            conn.rollback()
+        self.set_rows(records, version)
+
+    def set_rows(self, records, version):
+        """Replace the index contents; each record carries its own embedding"""
+        rows = []
+        vectors = []
+        for record in records:
+            record = dict(record)
+            vectors.append(np.asarray(record.pop("embedding"), dtype=np.float32))
+            rows.append(record)
+
+        if vectors:
+            matrix = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix /= norms
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+
+        self._snapshot = (matrix, rows, version)
+        self._last_check = time.monotonic()
+        print(f"🧮 In-memory vector index loaded: {len(rows)} rows (version {version})")
+
+    def refresh_if_stale(self, force=False):
+        """Reload when the knowledge base version changed (checked at most once per interval)"""
+        now = time.monotonic()
+        if not force and self.version is not None and now - self._last_check < self.refresh_interval:
+            return False
+        with self._lock:
+            if not force and self.version is not None and time.monotonic() - self._last_check < self.refresh_interval:
+                return False
+            with self.connection_factory() as conn:
+                cur = conn.cursor()
+                version = fetch_kb_version(cur)
+                cur.close()
+                conn.rollback()
+            self._last_check = time.monotonic()
+            if force or version != self.version:
+                self.load()
+                return True
+        return False
+
+    def search(self, query_embedding, threshold=None, limit=3):
+        """Top-k cosine search returning the same row shape as get_relevant_context"""
+        self.refresh_if_stale()
+        matrix, rows, _ = self._snapshot
+        if not rows or limit <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        scores = matrix @ (query / norm)
+
+        k = min(limit, len(rows))
+        if k < len(rows):
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+        else:
+            top = np.argsort(-scores)
+
+        results = []
+        for i in top:
+            similarity = float(scores[i])
+            if threshold is not None and similarity <= threshold:
+                break
+            results.append(dict(rows[i], similarity=similarity))
+        return results
+
+
+_memory_index = None
+_memory_index_lock = threading.Lock()
+
+
+def get_memory_index():
+    """Process-wide in-memory index, loaded on first use"""
+    global _memory_index
+    if _memory_index is None:
+        with _memory_index_lock:
+            if _memory_index is None:
+                index = InMemoryVectorIndex(refresh_interval=VECTOR_INDEX_REFRESH_INTERVAL)
+                index.load()
+                _memory_index = index
+    return _memory_index